@@ -0,0 +1,304 @@
+# actions/action_pool.py
+
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Text, Tuple
+
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+from .instrumentation import Histogram, captured, metrics, render_histograms
+from .predict import rank_cards
+
+logger = logging.getLogger(__name__)
+
+# Where the actions' CPU work runs: "thread" (default), "process", or
+# "inline" to run it on the action server's event loop as before. Process
+# workers send their calls' timings back with each result, so /metrics in
+# the server process covers all three.
+POOL_KIND = os.environ.get("CARD_ACTION_POOL", "thread").lower()
+WORKERS = int(os.environ.get("CARD_ACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Calls running at once; further calls wait their turn.
+MAX_IN_FLIGHT = int(os.environ.get("CARD_ACTION_MAX_IN_FLIGHT", str(WORKERS * 2)))
+# Calls allowed to wait; past this a call is turned away immediately.
+MAX_WAITING = int(os.environ.get("CARD_ACTION_MAX_WAITING", "64"))
+# Seconds a call may spend waiting plus running before the user is told to retry.
+CALL_TIMEOUT = float(os.environ.get("CARD_ACTION_TIMEOUT", "10"))
+# Collect concurrent rank_cards calls for this long and run them as one pool
+# job; 0 turns micro-batching off.
+BATCH_WINDOW = float(os.environ.get("CARD_RANK_BATCH_MS", "0")) / 1000
+BATCH_MAX = int(os.environ.get("CARD_RANK_BATCH_MAX", "32"))
+
+BUSY_MESSAGE = "Sorry, I'm taking longer than usual to respond. Please try again in a moment."
+
+
+class PoolBusy(Exception):
+    """Raised instead of queueing when MAX_WAITING calls are already waiting."""
+
+
+POOL_UNAVAILABLE = (PoolBusy, asyncio.TimeoutError)
+
+
+def _init_worker() -> None:
+    from . import predict
+    predict.warm_up()
+
+
+def run_action(action, tracker: Tracker, domain: Dict[Text, Any]) -> Tuple[List[Dict[Text, Any]], List[Dict[Text, Any]]]:
+    """Run an action's blocking body in a worker; returns (events, messages)."""
+    dispatcher = CollectingDispatcher()
+    events = action.run_sync(dispatcher, tracker, domain)
+    return events, dispatcher.messages
+
+
+def rank_many(requests: Sequence[Tuple[Dict[str, float], int]]) -> List[Any]:
+    """
+    One pool job for a micro-batch; exceptions are returned in place of
+    that caller's result. Each request still goes through rank_cards rather
+    than the vectorized rank_cards_batch, because the action needs the
+    ranked frames and the same caches and shadow scoring.
+    """
+    results = []
+    for user_dict, top_n in requests:
+        try:
+            results.append(rank_cards(user_dict, top_n=top_n))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class ActionPool:
+    """
+    Runs blocking action work off the event loop, with at most
+    max_in_flight calls submitted at once, at most max_waiting queued
+    behind them, and a deadline per call covering both.
+
+    A call that times out stops being awaited but keeps its slot until the
+    worker actually finishes, so a backlog of slow calls can't pile up
+    unbounded work behind the limit.
+    """
+
+    def __init__(self, kind: str = POOL_KIND, workers: int = WORKERS, max_in_flight: int = MAX_IN_FLIGHT,
+                 max_waiting: int = MAX_WAITING, timeout: float = CALL_TIMEOUT):
+        if kind not in ("thread", "process", "inline"):
+            logger.warning(f"Unknown CARD_ACTION_POOL '{kind}'; using threads.")
+            kind = "thread"
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds: Dict[str, Histogram] = {}
+        self.call_seconds: Dict[str, Histogram] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.kind != "inline"
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="card-action")
+            logger.info(f"Started {self.kind} pool with {self.workers} workers for card actions.")
+        return self._executor
+
+    def _get_semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        # Semaphores belong to one event loop; the action server has one, tests may have several.
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._loop = loop
+        return self._semaphore
+
+    async def call(self, label: str, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + (self.timeout if timeout is None else timeout)
+        semaphore = self._get_semaphore(loop)
+
+        if semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise PoolBusy(f"{self.waiting} calls already waiting for the {self.kind} pool")
+
+        self.waiting += 1
+        acquire = asyncio.ensure_future(semaphore.acquire())
+        try:
+            await asyncio.wait_for(asyncio.shield(acquire), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            if acquire.done() and not acquire.cancelled():
+                semaphore.release()
+            else:
+                acquire.cancel()
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+        _observe(self.wait_seconds, label, loop.time() - start)
+
+        self.in_flight += 1
+        forward_metrics = self.kind == "process"
+        try:
+            if forward_metrics:
+                future = loop.run_in_executor(self._get_executor(), captured, fn, *args)
+            else:
+                future = loop.run_in_executor(self._get_executor(), fn, *args)
+        except BaseException:
+            self.in_flight -= 1
+            semaphore.release()
+            raise
+
+        def _release(done):
+            self.in_flight -= 1
+            semaphore.release()
+            if forward_metrics and not done.cancelled() and done.exception() is None:
+                # Also for calls that timed out: the worker did the work.
+                metrics.replay(done.result()[2])
+        future.add_done_callback(_release)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            _observe(self.call_seconds, label, loop.time() - start)
+        if forward_metrics:
+            result, error, _ = result
+            if error is not None:
+                raise error
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "workers": self.workers, "in_flight": self.in_flight,
+                "waiting": self.waiting, "rejected": self.rejected, "timeouts": self.timeouts}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def _observe(table: Dict[str, Histogram], label: str, seconds: float) -> None:
+    histogram = table.get(label)
+    if histogram is None:
+        histogram = table.setdefault(label, Histogram())
+    histogram.observe(seconds)
+
+
+class RankBatcher:
+    """
+    Merges rank_cards calls that arrive within `window` seconds of each
+    other (up to max_batch) into a single pool job, so a burst of users
+    costs one hand-off to the pool instead of one each.
+    """
+
+    def __init__(self, pool: ActionPool, window: float = BATCH_WINDOW, max_batch: int = BATCH_MAX):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[Dict[str, float], int, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.batched_calls = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.pool.enabled
+
+    async def rank(self, user_dict: Dict[str, float], top_n: int = 3, timeout: Optional[float] = None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Don't warn about results nobody is waiting for after a timeout.
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending.append((dict(user_dict), top_n, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        timeout = self.pool.timeout if timeout is None else timeout
+        result = await asyncio.wait_for(asyncio.shield(future), timeout)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch) -> None:
+        self.batches += 1
+        self.batched_calls += len(batch)
+        try:
+            results = await self.pool.call("rank_many", rank_many, [(u, n) for u, n, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+action_pool = ActionPool()
+rank_batcher = RankBatcher(action_pool)
+
+
+class PooledAction:
+    """
+    Mixin giving an Action an async run() that executes its blocking
+    run_sync() on action_pool, so a slow turn doesn't stall the event loop
+    for every other conversation.
+    """
+
+    async def run(self, dispatcher: CollectingDispatcher, tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+        if not action_pool.enabled:
+            return self.run_sync(dispatcher, tracker, domain)
+        try:
+            events, messages = await action_pool.call(self.name(), run_action, self, tracker, domain)
+        except POOL_UNAVAILABLE as e:
+            return self.pool_unavailable(dispatcher, e)
+        dispatcher.messages.extend(messages)
+        return events
+
+    def pool_unavailable(self, dispatcher: CollectingDispatcher, e: Exception) -> List[Dict[Text, Any]]:
+        reason = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+        logger.warning(f"{self.name()} not answered: {reason} ({action_pool.stats()})")
+        dispatcher.utter_message(text=BUSY_MESSAGE)
+        return []
+
+
+def _pool_metrics() -> List[str]:
+    lines = []
+    for name, help_text, value in (("card_pool_in_flight", "Calls running in the action pool.", action_pool.in_flight),
+                                   ("card_pool_waiting", "Calls waiting for an action pool slot.", action_pool.waiting)):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    for name, help_text, value in (("card_pool_rejected_total", "Calls turned away with the pool full.", action_pool.rejected),
+                                   ("card_pool_timeouts_total", "Calls that missed CARD_ACTION_TIMEOUT.", action_pool.timeouts),
+                                   ("card_rank_batches_total", "Micro-batches of rank_cards calls run.", rank_batcher.batches),
+                                   ("card_rank_batched_calls_total", "rank_cards calls run in micro-batches.", rank_batcher.batched_calls)):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+    render_histograms(lines, "card_pool_wait_seconds", "Time from call to pool slot.",
+                      {(label,): h for label, h in list(action_pool.wait_seconds.items())}, ("call",))
+    render_histograms(lines, "card_pool_call_seconds", "Time from call to result, including the wait.",
+                      {(label,): h for label, h in list(action_pool.call_seconds.items())}, ("call",))
+    return lines
+
+
+metrics.add_collector(_pool_metrics)
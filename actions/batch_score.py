@@ -0,0 +1,269 @@
+# actions/batch_score.py
+"""
+Offline recommendation run over a large applicant file, using the same model,
+catalogue and utility ranking as action_recommend_card.
+
+    python -m actions.batch_score applicants.csv recommendations.csv \\
+        --top-n 3 --chunk-size 50000 --workers 4 --id-column applicant_id
+
+The input (CSV, or Parquet with pyarrow installed) is streamed in chunks and
+only the needed columns are read. Chunks are scored on a process pool with
+a bounded number in flight, and results are appended to the output CSV in
+input order. Progress is checkpointed after every chunk, so an interrupted
+run continues where it stopped with --resume.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Slot columns the recommendation form collects, in the order the action
+# reads them. Each maps to the input file column of the same name unless
+# overridden with --column.
+SLOT_COLUMNS = ["annual_inc", "fico_high", "dti", "emp_length_num"]
+# Indicator features the action always sets to 0.0: every applicant it
+# scores has supplied both income and credit score.
+MISSING_INDICATORS = {"inc_missing": 0.0, "fico_missing": 0.0}
+# Bytes at the start of the input hashed into the resume checkpoint.
+FINGERPRINT_BYTES = 1 << 20
+
+
+def read_chunks(path: Path, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    if path.suffix.lower() in (".parquet", ".pq"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Reading Parquet input requires pyarrow (pip install pyarrow).")
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+
+
+def build_features(chunk: pd.DataFrame, column_map: Dict[str, str], input_cols: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Feature matrix in input_cols order, plus a mask of rows the action would
+    accept (every slot present and numeric).
+    """
+    features = pd.DataFrame(index=chunk.index)
+    for slot in SLOT_COLUMNS:
+        features[slot] = pd.to_numeric(chunk[column_map[slot]], errors="coerce")
+    valid = features.notna().all(axis=1).to_numpy()
+    for col, value in MISSING_INDICATORS.items():
+        features[col] = value
+    X = features.reindex(columns=input_cols).to_numpy(dtype=float)
+    return np.where(valid[:, None], X, 0.0), valid
+
+
+def input_fingerprint(path: Path) -> Dict[str, object]:
+    """Size, mtime and a hash of the first FINGERPRINT_BYTES, to tell whether a resumed run reads the same file."""
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        head = hashlib.sha256(f.read(FINGERPRINT_BYTES)).hexdigest()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "head_sha256": head}
+
+
+def _init_worker(log_level: int) -> None:
+    logging.basicConfig(level=log_level)
+    from . import predict
+    predict.warm_up()
+
+
+def score_chunk(chunk_no: int, ids: np.ndarray, chunk: pd.DataFrame, column_map: Dict[str, str],
+                top_n: int) -> Tuple[int, str, int, float, int]:
+    """Runs in a worker; returns (chunk_no, csv_text, rows, seconds, pid)."""
+    from .predict import get_input_cols, rank_cards_batch
+
+    start = time.perf_counter()
+    X, valid = build_features(chunk, column_map, get_input_cols())
+    ranking = rank_cards_batch(X, top_n=top_n)
+
+    out = pd.DataFrame({"applicant_id": ids})
+    out["p_approve"] = np.where(valid, ranking.p_approve, np.nan)
+    names = np.append(ranking.card_names, [None]).astype(object)
+    for k in range(top_n):
+        index = np.where(valid, ranking.card_index[:, k], -1)
+        out[f"card_{k + 1}"] = names[index]
+        out[f"utility_{k + 1}"] = np.where(valid, ranking.utility[:, k], np.nan)
+    text = out.to_csv(index=False, header=False, float_format="%.6g")
+    return chunk_no, text, len(chunk), time.perf_counter() - start, os.getpid()
+
+
+class Progress:
+    """
+    Checkpoint of how many chunks are safely in the output, and where they
+    end. It is only resumed with the same settings and the same input file
+    (settings["input_file"], see input_fingerprint).
+    """
+
+    def __init__(self, path: Path, settings: Dict[str, object]):
+        self.path = path
+        self.settings = settings
+        self.chunks_done = 0
+        self.rows_done = 0
+        self.output_bytes = 0
+
+    def load(self) -> bool:
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        recorded = state.get("settings") or {}
+        if recorded.get("input_file") != self.settings.get("input_file"):
+            raise SystemExit(f"{self.settings.get('input')} is not the file {self.path} was written for "
+                             f"(its size, mtime or contents differ); delete the checkpoint "
+                             f"(and the output) to start over.")
+        if recorded != self.settings:
+            raise SystemExit(f"{self.path} was written with different settings; "
+                             f"delete it (and the output) to start over.")
+        self.chunks_done = state["chunks_done"]
+        self.rows_done = state["rows_done"]
+        self.output_bytes = state["output_bytes"]
+        return True
+
+    def save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"settings": self.settings, "chunks_done": self.chunks_done,
+                       "rows_done": self.rows_done, "output_bytes": self.output_bytes}, f)
+        os.replace(tmp, self.path)
+
+
+def run(input_path: Path, output_path: Path, top_n: int = 3, chunk_size: int = 50_000,
+        workers: Optional[int] = None, column_map: Optional[Dict[str, str]] = None,
+        id_column: Optional[str] = None, resume: bool = False) -> Dict[str, object]:
+    workers = workers or os.cpu_count() or 1
+    column_map = {**{slot: slot for slot in SLOT_COLUMNS}, **(column_map or {})}
+    read_cols = list(dict.fromkeys([column_map[slot] for slot in SLOT_COLUMNS] + ([id_column] if id_column else [])))
+
+    progress = Progress(output_path.with_name(output_path.name + ".progress.json"), {
+        "input": str(input_path.resolve()), "input_file": input_fingerprint(input_path),
+        "top_n": top_n, "chunk_size": chunk_size, "columns": column_map, "id_column": id_column,
+    })
+    if resume and progress.load():
+        written = output_path.stat().st_size if output_path.exists() else -1
+        if written < progress.output_bytes:
+            raise SystemExit(f"{output_path} is missing or shorter than {progress.path} records; "
+                             f"delete the checkpoint to start over.")
+        logger.info(f"Resuming after {progress.chunks_done} chunks ({progress.rows_done} rows).")
+        out = open(output_path, "r+b")
+        out.truncate(progress.output_bytes)
+        out.seek(progress.output_bytes)
+    else:
+        out = open(output_path, "wb")
+        header = ["applicant_id", "p_approve"]
+        for k in range(1, top_n + 1):
+            header += [f"card_{k}", f"utility_{k}"]
+        out.write((",".join(header) + "\n").encode())
+        progress.output_bytes = out.tell()
+        progress.save()
+
+    per_worker: Dict[int, List[float]] = {}
+    start = time.perf_counter()
+    rows_this_run = 0
+    max_in_flight = workers * 2
+    pending = {}
+    ready: Dict[int, Tuple[str, int]] = {}
+    next_to_write = progress.chunks_done
+
+    def _drain(block_until: int) -> None:
+        nonlocal next_to_write, rows_this_run
+        while len(pending) > block_until:
+            chunk_no = min(pending)
+            chunk_no, text, rows, seconds, pid = pending.pop(chunk_no).result()
+            stats = per_worker.setdefault(pid, [0, 0.0])
+            stats[0] += rows
+            stats[1] += seconds
+            ready[chunk_no] = (text, rows)
+            while next_to_write in ready:
+                text, rows = ready.pop(next_to_write)
+                out.write(text.encode())
+                out.flush()
+                progress.chunks_done = next_to_write + 1
+                progress.rows_done += rows
+                progress.output_bytes = out.tell()
+                progress.save()
+                rows_this_run += rows
+                next_to_write += 1
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(logging.getLogger().level,)) as pool:
+            row_offset = 0
+            for chunk_no, chunk in enumerate(read_chunks(input_path, read_cols, chunk_size)):
+                if chunk_no < progress.chunks_done:
+                    row_offset += len(chunk)
+                    continue
+                ids = chunk[id_column].to_numpy() if id_column else np.arange(row_offset, row_offset + len(chunk))
+                row_offset += len(chunk)
+                pending[chunk_no] = pool.submit(score_chunk, chunk_no, ids, chunk, column_map, top_n)
+                _drain(max_in_flight)
+            _drain(0)
+    finally:
+        out.close()
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "rows": rows_this_run,
+        "total_rows": progress.rows_done,
+        "seconds": elapsed,
+        "rows_per_second": rows_this_run / elapsed if elapsed else 0.0,
+        "workers": {pid: {"rows": int(rows), "busy_seconds": busy, "rows_per_second": rows / busy if busy else 0.0}
+                    for pid, (rows, busy) in per_worker.items()},
+    }
+    return report
+
+
+def format_report(report: Dict[str, object]) -> str:
+    lines = [f"Scored {report['rows']} applicants in {report['seconds']:.1f}s "
+             f"({report['rows_per_second']:.0f} rows/s overall, {report['total_rows']} in output)."]
+    for pid, stats in sorted(report["workers"].items()):
+        lines.append(f"  worker {pid}: {stats['rows']} rows, {stats['busy_seconds']:.1f}s busy, "
+                     f"{stats['rows_per_second']:.0f} rows/s")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Score an applicant file with the card recommendation model.")
+    parser.add_argument("input", type=Path, help="applicant CSV or Parquet file")
+    parser.add_argument("output", type=Path, help="recommendations CSV to write")
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--id-column", default=None, help="column to copy into applicant_id (default: row number)")
+    parser.add_argument("--column", action="append", default=[], metavar="SLOT=COLUMN",
+                        help=f"read SLOT from COLUMN; slots are {', '.join(SLOT_COLUMNS)}")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted run")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    column_map = {}
+    for item in args.column:
+        slot, _, column = item.partition("=")
+        if slot not in SLOT_COLUMNS or not column:
+            parser.error(f"--column expects SLOT=COLUMN with SLOT in {SLOT_COLUMNS}, got '{item}'")
+        column_map[slot] = column
+
+    report = run(args.input, args.output, top_n=args.top_n, chunk_size=args.chunk_size,
+                 workers=args.workers, column_map=column_map, id_column=args.id_column, resume=args.resume)
+    print(format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# actions/card_responses.py
+
+import logging
+import os
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+import pandas as pd
+
+from .feature_resolver import FEATURE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Catalogue columns a card_feature can resolve to; each gets a rendered reply per card.
+FEATURE_RESPONSE_COLUMNS: List[str] = list(dict.fromkeys(FEATURE_COLUMNS.values()))
+# Catalogues up to this many cards have every reply rendered by prerender()
+# (on background reloads and warm-up); otherwise, and until then, a card's
+# replies are rendered the first time someone asks about it.
+PRERENDER_MAX_CARDS = int(os.environ.get("CARD_PRERENDER_MAX_CARDS", "5000"))
+
+
+class CardReply:
+    """
+    A rendered details reply. Replies that quote the user's own feature
+    phrase are stored as the text before and after it; `missing` marks the
+    "don't have details" reply for a column with no value.
+    """
+
+    __slots__ = ("head", "tail", "missing")
+
+    def __init__(self, head: str, tail: Optional[str] = None, missing: bool = False):
+        self.head = head
+        self.tail = tail
+        self.missing = missing
+
+    def text(self, feature_entity: Any) -> str:
+        if self.tail is None:
+            return self.head
+        return f"{self.head}{feature_entity}{self.tail}"
+
+
+def render_feature(card_info: Mapping[str, Any], column_name: str, display_name: Any) -> CardReply:
+    """The reply to a question about `column_name` of one card, worded as action_provide_card_details always has."""
+    if column_name and column_name in card_info and pd.notna(card_info[column_name]):
+        feature_value = card_info[column_name]
+
+        if column_name == 'annual_fee':
+            fee_text = f"${feature_value:.0f}" if feature_value != 0 else "No Annual Fee"
+            return CardReply(f"The annual fee for the {display_name} is: {fee_text}.")
+        elif column_name in ['apr_min', 'apr_max']:
+            apr_min_val = card_info.get('apr_min', None)
+            apr_max_val = card_info.get('apr_max', None)
+            if pd.notna(apr_min_val) and pd.notna(apr_max_val) and apr_min_val != apr_max_val:
+                apr_text = f"{apr_min_val:.1f}% - {apr_max_val:.1f}%"
+            elif pd.notna(apr_min_val) or pd.notna(apr_max_val):
+                apr_text = f"{apr_min_val or apr_max_val:.1f}%"
+            else:
+                apr_text = "Not Available"
+            return CardReply(f"The Purchase APR for the {display_name} is: {apr_text}.")
+        elif column_name == 'min_credit_score':
+            score_text = f"{int(float(feature_value))}+" if feature_value > 0 else "No minimum specified (may be for building credit)"
+            return CardReply(f"The recommended minimum credit score for the {display_name} is typically {score_text}.")
+        elif column_name == 'foreign_transaction_fee':
+            ftf_text = f"{feature_value}%" if pd.notna(feature_value) and feature_value > 0 else ("No Foreign Transaction Fee" if pd.notna(feature_value) and feature_value == 0 else "Not specified")
+            return CardReply(f"For the {display_name}, the Foreign Transaction Fee is: {ftf_text}.")
+        return CardReply("Regarding the ", f" for the {display_name}: {feature_value}")
+
+    return CardReply("I don't have specific details readily available for '", f"' for the {display_name}.", missing=True)
+
+
+def render_overview(card_info: Mapping[str, Any], display_name: Any) -> str:
+    """The general overview given when no feature is asked about."""
+    issuer = card_info.get('issuer', 'N/A')
+    fee = card_info.get('annual_fee', 'N/A')
+    apr_min = card_info.get('apr_min', 'N/A')
+    apr_max = card_info.get('apr_max', 'N/A')
+    min_score = card_info.get('min_credit_score', 'N/A')
+    rewards_summary = card_info.get('rewards_details', None)
+
+    fee_text = f"${fee:.0f}" if pd.notna(fee) and fee != 0 else ("No Annual Fee" if pd.notna(fee) and fee == 0 else 'N/A')
+    apr_text = f"{apr_min:.1f}% - {apr_max:.1f}%" if pd.notna(apr_min) and pd.notna(apr_max) and apr_min != apr_max else ('N/A' if pd.isna(apr_min) and pd.isna(apr_max) else f"{apr_min or apr_max:.1f}%")
+    score_text = ""
+    try:
+        score_num = int(float(min_score)) if pd.notna(min_score) else 0
+        if score_num > 0: score_text = f" (Recommended Score: {score_num}+)"
+    except (ValueError, TypeError): score_text = ""
+
+    message = (
+        f"Okay, here's a general overview of the {display_name} from {issuer}{score_text}:\n"
+        f"- Annual Fee: {fee_text}\n"
+        f"- Purchase APR: {apr_text}"
+    )
+    if pd.notna(rewards_summary):
+        message += f"\n- Key Feature: {rewards_summary}"
+    return message
+
+
+OVERVIEW = None
+# A reply, or the exception rendering it raised; lookups re-raise it so the
+# action reports the error exactly as it did when rendering per turn.
+Rendered = Union[CardReply, str, Exception]
+
+
+class CardResponses:
+    """
+    The card-details replies for one catalogue snapshot, keyed by (card
+    position, column) with column None for the overview. A card's replies
+    are rendered on first use and memoised; prerender() renders them all
+    ahead of time. Each snapshot has its own, so a catalogue reload brings
+    fresh replies.
+    """
+
+    def __init__(self, snapshot, columns: List[str] = FEATURE_RESPONSE_COLUMNS,
+                 prerender_max: int = PRERENDER_MAX_CARDS):
+        self._snapshot = snapshot
+        self.columns = columns
+        self.prerender_max = prerender_max
+        self._cards: Dict[int, Dict[Optional[str], Rendered]] = {}
+
+    def prerender(self) -> None:
+        """Render every card's replies now, unless the catalogue has more than prerender_max cards."""
+        snapshot = self._snapshot
+        n_cards = 0 if snapshot.empty else len(snapshot)
+        if n_cards > self.prerender_max:
+            logger.info(f"Catalogue has {n_cards} cards (over {self.prerender_max}); rendering details replies on first use.")
+            return
+        # Whole columns at once: a Series per row would dominate the build.
+        names = snapshot.columns
+        for pos, values in enumerate(zip(*(snapshot.column(name).tolist() for name in names))):
+            if pos not in self._cards:
+                self._cards[pos] = self._render_card(dict(zip(names, values)))
+
+    def _render_card(self, card_info: Mapping[str, Any]) -> Dict[Optional[str], Rendered]:
+        display_name = card_info.get('card_name')
+        replies: Dict[Optional[str], Rendered] = {}
+        for column in [OVERVIEW] + self.columns:
+            try:
+                replies[column] = (render_overview(card_info, display_name) if column is OVERVIEW
+                                   else render_feature(card_info, column, display_name))
+            except Exception as e:
+                replies[column] = e
+        return replies
+
+    def _replies(self, pos: int) -> Dict[Optional[str], Rendered]:
+        replies = self._cards.get(pos)
+        if replies is None:
+            replies = self._cards[pos] = self._render_card(self._snapshot.row(pos))
+        return replies
+
+    def _get(self, pos: int, column: Optional[str]) -> Rendered:
+        replies = self._replies(pos)
+        reply = replies.get(column)
+        if reply is None:
+            card_info = self._snapshot.row(pos)
+            reply = render_feature(card_info, column, card_info.get('card_name'))
+        elif isinstance(reply, Exception):
+            raise reply.with_traceback(None)
+        return reply
+
+    def overview(self, pos: int) -> str:
+        return self._get(pos, OVERVIEW)
+
+    def feature(self, pos: int, column: str) -> CardReply:
+        return self._get(pos, column)
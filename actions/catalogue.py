@@ -0,0 +1,330 @@
+# actions/catalogue.py
+
+import errno
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .card_responses import CardResponses
+from .compiled_catalogue import CompiledCatalogue, StaleCatalogue, compiled_path_for, read_catalogue_csv
+from .eligibility import EligibilityIndex
+
+logger = logging.getLogger(__name__)
+
+ACTIONS_DIR = Path(__file__).parent
+PROJECT_DIR = ACTIONS_DIR.parent
+DATADIR = PROJECT_DIR / "data"
+CATALOGUE_PATH = DATADIR / "cards_catalogue.csv"
+
+# How often (seconds) the store re-stats the CSV to pick up edits.
+CHECK_INTERVAL = float(os.environ.get("CARD_CATALOGUE_CHECK_INTERVAL", "2.0"))
+
+NGRAM = 3
+CONTAINS_MEMO_SIZE = 4096
+
+
+class CatalogueSnapshot:
+    """
+    One immutable load of the card catalogue together with its name indexes.
+    Readers grab a snapshot once and use it for the whole turn; reloads build
+    a new snapshot and swap the reference, so nobody sees a half-built index.
+
+    A snapshot holds either a parsed DataFrame or a memory-mapped
+    CompiledCatalogue. Hot paths go through columns/column/take/row, which
+    on a compiled catalogue decode text only for the rows they return;
+    `cards` builds the full DataFrame on first use. `responses` holds the
+    card-details replies rendered from this load.
+    """
+
+    def __init__(self, cards: Optional[pd.DataFrame], version=None,
+                 load_error: Optional[Exception] = None, compiled: Optional[CompiledCatalogue] = None):
+        self._cards = cards
+        self.compiled = compiled
+        self.version = version
+        self.load_error = load_error
+
+        if "card_name" in self.columns:
+            self._display_names = self.column("card_name").tolist()
+        else:
+            self._display_names = []
+        self._names = [str(n).lower() if pd.notna(n) else None for n in self._display_names]
+
+        # Lowercase name -> first row position, same as taking iloc[0] of an
+        # exact-match mask.
+        self._exact: Dict[str, int] = {}
+        # Trigram -> ascending row positions, for substring lookups.
+        self._grams: Dict[str, List[int]] = {}
+        for pos, name in enumerate(self._names):
+            if name is None:
+                continue
+            self._exact.setdefault(name, pos)
+            for gram in {name[i:i + NGRAM] for i in range(len(name) - NGRAM + 1)}:
+                self._grams.setdefault(gram, []).append(pos)
+
+        self._contains_memo: Dict[str, List[int]] = {}
+
+        # Score/income thresholds and utility inputs as sorted arrays, for
+        # rank_cards; None if the columns are missing or not numeric.
+        if compiled is not None:
+            self.eligibility = compiled.eligibility_index()
+        else:
+            self.eligibility = EligibilityIndex.build(cards) if not cards.empty else None
+
+        # Details replies per card, rendered once, so action_provide_card_details
+        # answers with a lookup instead of formatting the row each turn.
+        self.responses = CardResponses(self)
+
+    @property
+    def cards(self) -> pd.DataFrame:
+        if self._cards is None:
+            self._cards = self.compiled.to_frame()
+        return self._cards
+
+    @property
+    def columns(self) -> List[str]:
+        if self._cards is None:
+            return self.compiled.columns
+        return list(self._cards.columns)
+
+    def __len__(self) -> int:
+        if self._cards is None:
+            return len(self.compiled)
+        return len(self._cards)
+
+    @property
+    def empty(self) -> bool:
+        if self._cards is None:
+            return len(self.compiled) == 0 or not self.compiled.columns
+        return self._cards.empty
+
+    def column(self, name: str) -> pd.Series:
+        if self._cards is None:
+            return self.compiled.column(name)
+        return self._cards[name]
+
+    def take(self, positions: Sequence[int]) -> pd.DataFrame:
+        """Rows by position, as DataFrame.take on the full catalogue gives them."""
+        if self._cards is None:
+            return self.compiled.take(positions)
+        return self._cards.take(positions)
+
+    def card_name(self, pos: int):
+        return self._display_names[pos]
+
+    def find_exact(self, name: str) -> Optional[int]:
+        return self._exact.get(name.lower())
+
+    def find_containing(self, name: str) -> List[int]:
+        """Row positions (in file order) whose card_name contains `name`, case-insensitively."""
+        query = name.lower()
+        cached = self._contains_memo.get(query)
+        if cached is not None:
+            return cached
+
+        if len(query) < NGRAM:
+            candidates = range(len(self._names))
+        else:
+            postings = []
+            for gram in {query[i:i + NGRAM] for i in range(len(query) - NGRAM + 1)}:
+                posting = self._grams.get(gram)
+                if posting is None:
+                    postings = []
+                    break
+                postings.append(posting)
+            if not postings:
+                candidates = []
+            else:
+                postings.sort(key=len)
+                candidates = set(postings[0])
+                for posting in postings[1:]:
+                    candidates.intersection_update(posting)
+                candidates = sorted(candidates)
+
+        matches = [pos for pos in candidates if self._names[pos] is not None and query in self._names[pos]]
+
+        if len(self._contains_memo) >= CONTAINS_MEMO_SIZE:
+            self._contains_memo.clear()
+        self._contains_memo[query] = matches
+        return matches
+
+    def row(self, pos: int) -> pd.Series:
+        if self._cards is None:
+            return self.compiled.row(pos)
+        return self._cards.iloc[pos]
+
+
+class CatalogueStore:
+    """
+    Process-wide holder of the current CatalogueSnapshot. The catalogue is
+    loaded once and again only when the CSV's or the compiled file's mtime
+    or size changes; the files themselves are checked at most every
+    CHECK_INTERVAL seconds.
+
+    Only the first load happens on the calling thread. Later changes are
+    read and indexed on a background thread while the current snapshot
+    keeps serving, and the reference is swapped when the new one is ready.
+    A changed file is reloaded only once it has looked the same on two
+    checks in a row, and a load is thrown away if the file changed again
+    while it was being read, so a copy still being written is never served.
+
+    A compiled catalogue next to the CSV (see compiled_catalogue.py) is
+    memory-mapped in preference to parsing the CSV. If it is missing, or
+    was compiled from an older CSV, the CSV is parsed as before.
+    """
+
+    def __init__(self, path: Path = CATALOGUE_PATH, check_interval: float = CHECK_INTERVAL):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._snapshot: Optional[CatalogueSnapshot] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        # Version seen at the last check that differed from the snapshot's;
+        # it is loaded once a check sees it unchanged.
+        self._pending = None
+        self._reloader: Optional[threading.Thread] = None
+        # Wall time of the most recent successful parse, for startup reports.
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def compiled_path(self) -> Path:
+        return compiled_path_for(self.path)
+
+    def get(self) -> CatalogueSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._next_check:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None:
+                # Nothing to serve yet, so the first load can't be deferred.
+                self._snapshot = self._load(self._version(), None)
+                self._next_check = time.monotonic() + self.check_interval
+            elif time.monotonic() >= self._next_check:
+                self._next_check = time.monotonic() + self.check_interval
+                self._check()
+            return self._snapshot
+
+    def reload(self) -> CatalogueSnapshot:
+        """Re-read the catalogue now, regardless of mtime, and wait for it."""
+        snapshot = self._load(self._version(), self._snapshot)
+        with self._lock:
+            if snapshot is not None:
+                self._snapshot = snapshot
+            self._pending = None
+            self._next_check = time.monotonic() + self.check_interval
+            return self._snapshot
+
+    def wait_for_reload(self, timeout: Optional[float] = None) -> None:
+        """Block until a background reload in progress (if any) has finished."""
+        reloader = self._reloader
+        if reloader is not None:
+            reloader.join(timeout)
+
+    def _version(self):
+        return _signature(self.path), _signature(self.compiled_path)
+
+    def _check(self) -> None:
+        """Start a background reload if the files changed and have settled. Called with the lock held."""
+        version = self._version()
+        if version == self._snapshot.version or version == (None, None):
+            # Unchanged, or gone: keep serving the last good copy.
+            self._pending = None
+            return
+        if self._reloader is not None and self._reloader.is_alive():
+            return
+        if version != self._pending:
+            logger.debug("Card catalogue changed on disk; reloading once it stops changing.")
+            self._pending = version
+            return
+        self._pending = None
+        self._reloader = threading.Thread(target=self._reload_in_background, args=(version,),
+                                          name="card-catalogue-reload", daemon=True)
+        self._reloader.start()
+
+    def _reload_in_background(self, version) -> None:
+        try:
+            snapshot = self._load(version, self._snapshot)
+            if snapshot is None:
+                return
+            # This thread has time to spare; requests only look replies up.
+            snapshot.responses.prerender()
+            if self._version() != version:
+                logger.info(f"Card catalogue at {self.path} changed while it was being read; "
+                            f"keeping the current copy until it settles.")
+                return
+            with self._lock:
+                self._snapshot = snapshot
+        except Exception as e:
+            logger.error(f"Error reloading card catalogue from {self.path}: {e}", exc_info=True)
+
+    def _load(self, version, current: Optional[CatalogueSnapshot]) -> Optional[CatalogueSnapshot]:
+        """
+        A new snapshot for the files as of `version`, or None to keep
+        serving `current` (when a file is missing or fails to parse).
+        """
+        csv_version, compiled_version = version
+        if csv_version is None and compiled_version is None:
+            if current is None:
+                logger.error(f"Card catalogue file not found at {self.path}. Ranking/details will likely fail.")
+                return CatalogueSnapshot(pd.DataFrame(), None, _missing(self.path))
+            return None
+
+        start = time.perf_counter()
+        if compiled_version is not None:
+            try:
+                compiled = CompiledCatalogue.open(self.compiled_path, self.path)
+                snapshot = CatalogueSnapshot(None, version, compiled=compiled)
+                self.load_seconds = time.perf_counter() - start
+                logger.info(f"Successfully mapped compiled card catalogue from {self.compiled_path} ({len(compiled)} cards)")
+                return snapshot
+            except StaleCatalogue as e:
+                logger.warning(f"Not using {self.compiled_path}: {e}. Rebuild it with "
+                               f"`python -m actions.compiled_catalogue`; reading the CSV instead.")
+            except Exception as e:
+                logger.error(f"Error opening compiled card catalogue {self.compiled_path}: {e}; reading the CSV instead.",
+                             exc_info=True)
+            if csv_version is None:
+                if current is None:
+                    logger.error(f"Card catalogue file not found at {self.path}. Ranking/details will likely fail.")
+                    return CatalogueSnapshot(pd.DataFrame(), None, _missing(self.path))
+                return None
+
+        try:
+            cards = read_catalogue_csv(self.path)
+        except Exception as e:
+            logger.error(f"Error loading card catalogue from {self.path}: {e}", exc_info=True)
+            if current is None:
+                return CatalogueSnapshot(pd.DataFrame(), None, e)
+            return None
+
+        if cards.empty:
+            logger.warning(f"Card catalogue loaded from {self.path} is empty.")
+        else:
+            logger.info(f"Successfully loaded card catalogue from {self.path} ({len(cards)} cards)")
+        snapshot = CatalogueSnapshot(cards, version)
+        self.load_seconds = time.perf_counter() - start
+        return snapshot
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _missing(path: Path) -> OSError:
+    return FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), str(path))
+
+
+catalogue_store = CatalogueStore()
+
+
+def get_catalogue() -> CatalogueSnapshot:
+    return catalogue_store.get()
@@ -0,0 +1,319 @@
+# actions/compiled_catalogue.py
+"""
+Binary columnar form of data/cards_catalogue.csv that every action-server
+process can memory-map instead of parsing the CSV into its own DataFrame.
+
+    python -m actions.compiled_catalogue [data/cards_catalogue.csv] [-o data/cards_catalogue.bin]
+
+Layout: a fixed preamble (magic, format version, header length, CRC32),
+a JSON header describing the columns and where their sections live, then
+64-byte aligned sections. Numeric columns are stored as little-endian
+typed arrays; text columns as int64 offsets into a UTF-8 blob plus a
+validity byte per row. The eligibility index used by rank_cards is stored
+pre-sorted, so ranking reads straight from the page cache.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import pandas_dtype
+
+from .eligibility import EligibilityIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CARDCAT\0"
+FORMAT_VERSION = 1
+ALIGN = 64
+COMPILED_SUFFIX = ".bin"
+# magic, format version, header length, CRC32 of everything after the preamble
+_PREAMBLE = struct.Struct("<8sIII4x")
+
+INDEX_ARRAYS = ("positions", "min_score", "min_income", "rewards", "fee_penalty")
+
+
+class StaleCatalogue(Exception):
+    """The compiled file can't be used: wrong format, corrupt, or built from a different CSV."""
+
+
+def compiled_path_for(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(COMPILED_SUFFIX)
+
+
+def read_catalogue_csv(path: Path) -> pd.DataFrame:
+    cards = pd.read_csv(path)
+    cards.columns = cards.columns.str.strip()
+    return cards
+
+
+def _fingerprint(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_info(path: Path) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {"sha256": _fingerprint(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class _Writer:
+    """Collects aligned sections and remembers where each one lands."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def add(self, data: bytes) -> Dict[str, int]:
+        padding = -self.size % ALIGN
+        if padding:
+            self.chunks.append(b"\0" * padding)
+            self.size += padding
+        section = {"offset": self.size, "length": len(data)}
+        self.chunks.append(data)
+        self.size += len(data)
+        return section
+
+    def add_array(self, array: np.ndarray) -> Dict[str, Any]:
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+        return dict(self.add(array.tobytes()), dtype=array.dtype.str)
+
+
+def compile_catalogue(source: Path, output: Optional[Path] = None) -> Path:
+    """Compile the catalogue CSV at `source`; returns the path written."""
+    source = Path(source)
+    output = Path(output) if output is not None else compiled_path_for(source)
+    cards = read_catalogue_csv(source)
+    writer = _Writer()
+
+    columns = []
+    for name in cards.columns:
+        series = cards[name]
+        dtype = series.dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+            columns.append({"name": name, "kind": "numeric", "data": writer.add_array(series.to_numpy())})
+            continue
+        values = series.to_numpy(dtype=object)
+        valid = pd.notna(values)
+        encoded = [str(v).encode("utf-8") if ok else b"" for v, ok in zip(values, valid)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        columns.append({
+            "name": name,
+            "kind": "text",
+            "pandas_dtype": str(dtype),
+            "offsets": writer.add_array(offsets),
+            "valid": writer.add_array(valid.astype(np.uint8)),
+            "blob": writer.add(b"".join(encoded)),
+        })
+
+    index = EligibilityIndex.build(cards) if not cards.empty else None
+    eligibility = None
+    if index is not None:
+        eligibility = {name: writer.add_array(getattr(index, name)) for name in INDEX_ARRAYS}
+
+    header = json.dumps({
+        "rows": len(cards),
+        "columns": columns,
+        "eligibility": eligibility,
+        "source": _source_info(source),
+    }).encode("utf-8")
+    header_end = _PREAMBLE.size + len(header)
+    header_padding = b"\0" * (-header_end % ALIGN)
+
+    checksum = zlib.crc32(header)
+    checksum = zlib.crc32(header_padding, checksum)
+    for chunk in writer.chunks:
+        checksum = zlib.crc32(chunk, checksum)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=output.parent, prefix=f".{output.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header), checksum))
+            f.write(header)
+            f.write(header_padding)
+            for chunk in writer.chunks:
+                f.write(chunk)
+        os.replace(tmp, output)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    logger.info(f"Compiled {len(cards)} cards from {source} into {output} ({os.path.getsize(output)} bytes)")
+    return output
+
+
+class CompiledCatalogue:
+    """
+    Read-only view of a compiled catalogue file. Numeric columns and the
+    eligibility arrays are NumPy views straight into the mapping, so every
+    process shares one copy through the page cache; text is decoded only
+    for the rows asked for.
+    """
+
+    def __init__(self, path: Path, mm: mmap.mmap, header: Dict[str, Any], payload_start: int):
+        self.path = path
+        self._mm = mm
+        self.header = header
+        self._payload_start = payload_start
+        self.n_rows: int = header["rows"]
+        self._columns = {column["name"]: column for column in header["columns"]}
+        self.columns: List[str] = [column["name"] for column in header["columns"]]
+        self._column_index = pd.Index(self.columns)
+        self._numeric: Dict[str, np.ndarray] = {}
+        # Resolved once: looking a dtype up by name costs more than decoding a few rows.
+        self._text_dtypes = {column["name"]: pandas_dtype(column["pandas_dtype"])
+                             for column in header["columns"] if column["kind"] == "text"}
+
+    @classmethod
+    def open(cls, path: Path, source: Optional[Path] = None) -> "CompiledCatalogue":
+        """
+        Map and validate `path`. With `source`, also check the file was
+        compiled from that CSV's current contents. Raises StaleCatalogue if
+        the file can't be trusted.
+        """
+        path = Path(path)
+        with open(path, "rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise StaleCatalogue(f"{path} is empty") from e
+        try:
+            if len(mm) < _PREAMBLE.size:
+                raise StaleCatalogue(f"{path} is truncated")
+            magic, version, header_length, checksum = _PREAMBLE.unpack_from(mm)
+            if magic != MAGIC:
+                raise StaleCatalogue(f"{path} is not a compiled card catalogue")
+            if version != FORMAT_VERSION:
+                raise StaleCatalogue(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+            view = memoryview(mm)
+            try:
+                actual = zlib.crc32(view[_PREAMBLE.size:])
+            finally:
+                view.release()
+            if actual != checksum:
+                raise StaleCatalogue(f"{path} failed its checksum (corrupt or partly written)")
+            header = json.loads(mm[_PREAMBLE.size:_PREAMBLE.size + header_length].decode("utf-8"))
+            if source is not None:
+                _check_source(header.get("source", {}), Path(source))
+        except BaseException:
+            mm.close()
+            raise
+        header_end = _PREAMBLE.size + header_length
+        return cls(path, mm, header, header_end + (-header_end % ALIGN))
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def _array(self, section: Dict[str, Any]) -> np.ndarray:
+        dtype = np.dtype(section["dtype"])
+        return np.frombuffer(self._mm, dtype=dtype, count=section["length"] // dtype.itemsize,
+                             offset=self._payload_start + section["offset"])
+
+    def numeric(self, name: str) -> np.ndarray:
+        array = self._numeric.get(name)
+        if array is None:
+            array = self._numeric[name] = self._array(self._columns[name]["data"])
+        return array
+
+    def _text(self, name: str, positions: Sequence[int]) -> np.ndarray:
+        column = self._columns[name]
+        offsets = self._array(column["offsets"])
+        valid = self._array(column["valid"])
+        base = self._payload_start + column["blob"]["offset"]
+        mm = self._mm
+        values = np.empty(len(positions), dtype=object)
+        for i, pos in enumerate(positions):
+            if valid[pos]:
+                values[i] = mm[base + offsets[pos]:base + offsets[pos + 1]].decode("utf-8")
+            else:
+                values[i] = np.nan
+        return values
+
+    def _values(self, name: str, positions: Optional[np.ndarray]):
+        column = self._columns.get(name)
+        if column is None:
+            raise KeyError(name)
+        if column["kind"] == "numeric":
+            array = self.numeric(name)
+            return array if positions is None else array[positions]
+        values = self._text(name, range(self.n_rows) if positions is None else positions)
+        return pd.array(values, dtype=self._text_dtypes[name])
+
+    def column(self, name: str, positions: Optional[Sequence[int]] = None) -> pd.Series:
+        """One column as a Series, for all rows or just `positions`, with the dtype read_csv gives."""
+        if positions is not None:
+            positions = np.asarray(positions, dtype=np.int64)
+        return pd.Series(self._values(name, positions), name=name, copy=False)
+
+    def take(self, positions: Sequence[int]) -> pd.DataFrame:
+        """The rows at `positions` as a DataFrame indexed by those positions, like DataFrame.take."""
+        positions = np.asarray(positions, dtype=np.int64)
+        return pd.DataFrame({name: self._values(name, positions) for name in self.columns},
+                            index=pd.Index(positions), copy=False)
+
+    def row(self, pos: int) -> pd.Series:
+        """One card as DataFrame.iloc[pos] gives it: an object Series named pos."""
+        values = np.empty(len(self.columns), dtype=object)
+        for i, name in enumerate(self.columns):
+            values[i] = self.numeric(name)[pos] if name not in self._text_dtypes else self._text(name, (pos,))[0]
+        return pd.Series(values, index=self._column_index, name=pos, dtype=object)
+
+    def to_frame(self) -> pd.DataFrame:
+        """The whole catalogue; numeric columns stay views into the file."""
+        return pd.DataFrame({name: self._values(name, None) for name in self.columns}, copy=False)
+
+    def eligibility_index(self) -> Optional[EligibilityIndex]:
+        arrays = self.header.get("eligibility")
+        if arrays is None:
+            return None
+        return EligibilityIndex(**{name: self._array(arrays[name]) for name in INDEX_ARRAYS})
+
+
+def _check_source(recorded: Dict[str, Any], source: Path) -> None:
+    try:
+        stat = os.stat(source)
+    except OSError:
+        # No CSV to compare against; the compiled file is all there is.
+        return
+    if stat.st_size == recorded.get("size") and stat.st_mtime_ns == recorded.get("mtime_ns"):
+        return
+    if stat.st_size != recorded.get("size") or _fingerprint(source) != recorded.get("sha256"):
+        raise StaleCatalogue(f"it was compiled from an older version of {source}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from .catalogue import CATALOGUE_PATH
+
+    parser = argparse.ArgumentParser(description="Compile the card catalogue CSV for memory-mapped loading.")
+    parser.add_argument("source", nargs="?", type=Path, default=CATALOGUE_PATH, help="catalogue CSV")
+    parser.add_argument("-o", "--output", type=Path, help=f"compiled file (default: the CSV path with {COMPILED_SUFFIX})")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    try:
+        output = compile_catalogue(args.source, args.output)
+        CompiledCatalogue.open(output, args.source)
+    except (OSError, ValueError, StaleCatalogue) as e:
+        logger.error(f"Could not compile {args.source}: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# actions/eligibility.py
+
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ["min_credit_score", "min_income", "rewards_score", "annual_fee"]
+
+# Past this many distinct credit-score thresholds under the applicant's
+# score, one vectorised income check over the score prefix beats walking
+# the blocks one by one.
+BLOCK_SCAN_LIMIT = 64
+
+
+class EligibilityIndex:
+    """
+    The catalogue's eligibility and utility columns, laid out for ranking
+    one applicant without touching the DataFrame.
+
+    Cards are sorted by (min_credit_score, min_income, file position) into
+    contiguous float arrays. Every distinct score threshold forms a block,
+    and within a block the cards an applicant's income qualifies for are a
+    prefix. The eligible set is then a handful of slices found by binary
+    search, so work grows with the number of eligible cards rather than
+    the size of the catalogue.
+    """
+
+    def __init__(self, positions: np.ndarray, min_score: np.ndarray, min_income: np.ndarray,
+                 rewards: np.ndarray, fee_penalty: np.ndarray):
+        self.positions = positions
+        self.min_score = min_score
+        self.min_income = min_income
+        self.rewards = rewards
+        self.fee_penalty = fee_penalty
+
+        n = len(positions)
+        if n:
+            starts = np.flatnonzero(np.r_[True, min_score[1:] != min_score[:-1]])
+        else:
+            starts = np.empty(0, dtype=np.int64)
+        self.block_starts = starts
+        self.block_ends = np.r_[starts[1:], n].astype(np.int64)
+        self.block_scores = min_score[starts]
+
+    @classmethod
+    def build(cls, cards: pd.DataFrame) -> Optional["EligibilityIndex"]:
+        """None when the catalogue lacks the columns or they aren't numeric; rank_cards then filters the frame."""
+        if not all(col in cards.columns for col in REQUIRED_COLUMNS):
+            return None
+        try:
+            min_score = cards["min_credit_score"].to_numpy(dtype=float)
+            min_income = cards["min_income"].to_numpy(dtype=float)
+            rewards = cards["rewards_score"].to_numpy(dtype=float)
+            fee_penalty = cards["annual_fee"].to_numpy(dtype=float) / 100
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Card catalogue eligibility columns are not numeric ({e}); ranking without an index.")
+            return None
+
+        # A missing threshold never compares true, so such cards are never eligible.
+        positions = np.flatnonzero(~np.isnan(min_score) & ~np.isnan(min_income))
+        order = np.lexsort((positions, min_income[positions], min_score[positions]))
+        positions = positions[order]
+        return cls(
+            positions=np.ascontiguousarray(positions),
+            min_score=np.ascontiguousarray(min_score[positions]),
+            min_income=np.ascontiguousarray(min_income[positions]),
+            rewards=np.ascontiguousarray(rewards[positions]),
+            fee_penalty=np.ascontiguousarray(fee_penalty[positions]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def eligible(self, fico: float, income: float) -> np.ndarray:
+        """Offsets into the sorted arrays of cards with min_credit_score <= fico and min_income <= income."""
+        if np.isnan(fico) or np.isnan(income):
+            return np.empty(0, dtype=np.int64)
+        n_blocks = int(np.searchsorted(self.block_scores, fico, side="right"))
+        if n_blocks == 0:
+            return np.empty(0, dtype=np.int64)
+        if n_blocks > BLOCK_SCAN_LIMIT:
+            prefix = int(self.block_ends[n_blocks - 1])
+            return np.flatnonzero(self.min_income[:prefix] <= income)
+
+        pieces = []
+        for start, end in zip(self.block_starts[:n_blocks].tolist(), self.block_ends[:n_blocks].tolist()):
+            stop = start + int(np.searchsorted(self.min_income[start:end], income, side="right"))
+            if stop > start:
+                pieces.append(np.arange(start, stop))
+        if not pieces:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(pieces)
+
+    def top(self, fico: float, income: float, p_approve: float, top_n: int,
+            offsets: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Catalogue row positions of the top_n eligible cards by
+        utility = p_approve*rewards_score - annual_fee/100, best first, and
+        their utilities, in exactly the order sort_values gives on the
+        filtered frame (NaN utilities last). `offsets` is eligible(fico,
+        income) when the caller already has it.
+        """
+        if offsets is None:
+            offsets = self.eligible(fico, income)
+        if offsets.size == 0 or top_n <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        utility = p_approve * self.rewards[offsets] - self.fee_penalty[offsets]
+        positions = self.positions[offsets]
+        finite = ~np.isnan(utility)
+        n_finite = int(finite.sum())
+
+        if n_finite == utility.size:
+            finite_pos, finite_util = positions, utility
+        else:
+            finite_pos, finite_util = positions[finite], utility[finite]
+        if n_finite > top_n:
+            cutoff = np.partition(finite_util, n_finite - top_n)[n_finite - top_n]
+            keep = finite_util >= cutoff
+            best_pos, best_util = finite_pos[keep], finite_util[keep]
+        else:
+            best_pos, best_util = finite_pos, finite_util
+
+        if best_util.size == min(n_finite, top_n) and np.unique(best_util).size == best_util.size:
+            # No ties among the winners: any correct sort gives this order.
+            order = np.argsort(-best_util)
+            ranked_pos, ranked_util = best_pos[order], best_util[order]
+            if ranked_pos.size < top_n:
+                nan_pos = np.sort(positions[~finite])[:top_n - ranked_pos.size]
+                ranked_pos = np.concatenate([ranked_pos, nan_pos])
+                ranked_util = np.concatenate([ranked_util, np.full(nan_pos.size, np.nan)])
+            return ranked_pos, ranked_util
+
+        # Ties: the frame's quicksort doesn't keep them in a stable order,
+        # so reproduce it on the eligible cards in catalogue order.
+        in_file_order = np.argsort(positions, kind="stable")
+        positions, utility = positions[in_file_order], utility[in_file_order]
+        order = descending_frame_order(utility)[:top_n]
+        return positions[order], utility[order]
+
+
+def descending_frame_order(values: np.ndarray) -> np.ndarray:
+    """The indexer DataFrame.sort_values(ascending=False) uses (pandas' nargsort)."""
+    missing = np.isnan(values)
+    idx = np.arange(values.size)
+    non_nans = values[~missing][::-1]
+    non_nan_idx = idx[~missing][::-1]
+    indexer = non_nan_idx[non_nans.argsort(kind="quicksort")][::-1]
+    return np.concatenate([indexer, np.flatnonzero(missing)])
@@ -0,0 +1,226 @@
+# actions/fast_forest.py
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows evaluated per step of the batched path; bounds the (rows x trees)
+# working arrays.
+BATCH_ROWS = 8192
+PARITY_SAMPLE_SIZE = 512
+PARITY_TOLERANCE = 1e-9
+# Share of parity-sample cells left missing (NaN).
+PARITY_MISSING_SHARE = 0.1
+
+ARRAY_NAMES = ("feature", "threshold", "left", "right", "missing_left", "leaf_value", "roots")
+
+
+class CompiledForest:
+    """
+    A fitted binary RandomForestClassifier flattened into NumPy node arrays.
+
+    All trees share one set of arrays; `roots` holds each tree's first node.
+    Leaves point back at themselves, so the batched path walks every tree in
+    lock-step with a handful of fancy-indexing operations per level.
+    `leaf_value` is the tree's probability for the positive class
+    (classes_[1]) at that node, so averaging the reached leaves gives the
+    same number as clf.predict_proba(X)[:, 1]. A missing (NaN) feature
+    goes left where `missing_left` is set, as sklearn's missing_go_to_left.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray,
+                 right: np.ndarray, missing_left: np.ndarray, leaf_value: np.ndarray,
+                 roots: np.ndarray, n_features: int):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.n_features = n_features
+        self.is_leaf = left == np.arange(len(left))
+        self._nodes = None
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, clf) -> "CompiledForest":
+        estimators = getattr(clf, "estimators_", None)
+        if not estimators:
+            raise ValueError("Model is not a fitted tree ensemble (no estimators_).")
+        if getattr(clf, "n_outputs_", 1) != 1 or len(clf.classes_) != 2:
+            raise ValueError("Only single-output binary classifiers can be compiled.")
+
+        features, thresholds, lefts, rights, missing_lefts, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        for est in estimators:
+            tree = est.tree_
+            n = tree.node_count
+            node_ids = np.arange(n, dtype=np.int64) + offset
+            leaf = tree.children_left == -1
+
+            left = np.where(leaf, node_ids, tree.children_left + offset)
+            right = np.where(leaf, node_ids, tree.children_right + offset)
+            feature = np.where(leaf, 0, tree.feature).astype(np.int64)
+            missing_left = np.asarray(tree.missing_go_to_left, dtype=bool) & ~leaf
+            value = tree.value[:, 0, :]
+            totals = value.sum(axis=1)
+            totals[totals == 0] = 1.0
+
+            features.append(feature)
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(left.astype(np.int64))
+            rights.append(right.astype(np.int64))
+            missing_lefts.append(missing_left)
+            values.append(value[:, 1] / totals)
+            roots.append(offset)
+            offset += n
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            missing_left=np.concatenate(missing_lefts),
+            leaf_value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int64),
+            n_features=int(clf.n_features_in_),
+        )
+
+    def save(self, directory: Path, meta: Optional[dict] = None) -> None:
+        """
+        Write the node arrays as plain .npy files plus meta.json. The
+        directory is built under a temporary name and renamed into place, so
+        readers never see a partial copy.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=directory.name + ".", dir=directory.parent))
+        try:
+            for name in ARRAY_NAMES:
+                np.save(tmp / f"{name}.npy", getattr(self, name))
+            with open(tmp / "meta.json", "w") as f:
+                json.dump(dict(meta or {}, n_features=self.n_features), f)
+            os.rename(tmp, directory)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not directory.exists():
+                raise
+
+    @classmethod
+    def load(cls, directory: Path, mmap_mode: Optional[str] = "r") -> "CompiledForest":
+        """
+        Open arrays written by save(). With mmap_mode="r" the arrays are
+        read-only views of the page cache, shared by every process that maps
+        the same files.
+        """
+        directory = Path(directory)
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls(n_features=int(meta["n_features"]), **arrays)
+
+    def predict_one(self, x: Sequence[float]) -> float:
+        """Positive-class probability for a single row."""
+        # For one row a plain walk over Python lists beats NumPy's per-call
+        # overhead; the lists are built on first use.
+        if self._nodes is None:
+            self._nodes = (self.feature.tolist(), self.threshold.tolist(), self.left.tolist(),
+                           self.right.tolist(), self.missing_left.tolist(), self.leaf_value.tolist(),
+                           self.is_leaf.tolist())
+        feature, threshold, left, right, missing_left, leaf_value, is_leaf = self._nodes
+
+        # Like sklearn, compare in float32 so split points land the same way.
+        x = np.asarray(x, dtype=np.float32).tolist()
+        total = 0.0
+        for node in self.roots.tolist():
+            while not is_leaf[node]:
+                value = x[feature[node]]
+                if value <= threshold[node] or (value != value and missing_left[node]):
+                    node = left[node]
+                else:
+                    node = right[node]
+            total += leaf_value[node]
+        return total / len(self.roots)
+
+    def predict_batch(self, X) -> np.ndarray:
+        """Positive-class probabilities for an N x n_features array."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an N x {self.n_features} array, got shape {X.shape}")
+
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], BATCH_ROWS):
+            block = X[start:start + BATCH_ROWS]
+            rows = np.arange(block.shape[0])[:, None]
+            nodes = np.broadcast_to(self.roots, (block.shape[0], self.n_trees))
+            while not self.is_leaf[nodes].all():
+                values = block[rows, self.feature[nodes]]
+                go_left = (values <= self.threshold[nodes]) | (np.isnan(values) & self.missing_left[nodes])
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            out[start:start + block.shape[0]] = self.leaf_value[nodes].mean(axis=1)
+        return out
+
+    def parity_sample(self, n_rows: int = PARITY_SAMPLE_SIZE, seed: int = 0) -> np.ndarray:
+        """
+        Rows spread over the range of split thresholds of each feature, with
+        a share of them sitting exactly on split points and a share missing.
+        """
+        rng = np.random.default_rng(seed)
+        split = ~self.is_leaf
+        sample = np.zeros((n_rows, self.n_features), dtype=np.float64)
+        for f in range(self.n_features):
+            cuts = self.threshold[split & (self.feature == f)]
+            if cuts.size == 0:
+                continue
+            lo, hi = cuts.min(), cuts.max()
+            span = max(hi - lo, 1.0)
+            sample[:, f] = rng.uniform(lo - 0.1 * span, hi + 0.1 * span, n_rows)
+            on_split = rng.random(n_rows) < 0.25
+            sample[on_split, f] = rng.choice(cuts, on_split.sum())
+            sample[rng.random(n_rows) < PARITY_MISSING_SHARE, f] = np.nan
+        return sample
+
+    def check_parity(self, clf, sample: Optional[np.ndarray] = None,
+                     tolerance: float = PARITY_TOLERANCE) -> float:
+        """Largest absolute difference from clf.predict_proba on `sample`; raises if above tolerance."""
+        if sample is None:
+            sample = self.parity_sample()
+        expected = clf.predict_proba(sample)[:, 1]
+        worst = float(np.max(np.abs(self.predict_batch(sample) - expected))) if len(sample) else 0.0
+        if worst > tolerance:
+            raise ValueError(f"Compiled forest disagrees with sklearn by {worst:.3g} (tolerance {tolerance:.0e}).")
+        return worst
+
+
+def compile_forest(clf, n_input_cols: int, sample: Optional[np.ndarray] = None) -> Optional[CompiledForest]:
+    """
+    Compile `clf` and verify it against sklearn. Returns None (so callers
+    keep using clf.predict_proba) if the model cannot be compiled or the
+    parity check fails.
+    """
+    try:
+        engine = CompiledForest.from_sklearn(clf)
+        if engine.n_features != n_input_cols:
+            raise ValueError(f"Model expects {engine.n_features} features but schema lists {n_input_cols}.")
+        worst = engine.check_parity(clf, sample)
+    except Exception as e:
+        logger.warning(f"Falling back to sklearn predict_proba; could not compile eligibility model: {e}")
+        return None
+    logger.info(f"Compiled eligibility model: {engine.n_trees} trees, {engine.n_nodes} nodes, parity max diff {worst:.2g}")
+    return engine
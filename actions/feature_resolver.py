@@ -0,0 +1,177 @@
+# actions/feature_resolver.py
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz as rapid_fuzz
+from rapidfuzz import process as rapid_process
+from thefuzz import utils
+
+logger = logging.getLogger(__name__)
+
+# Spoken feature phrase -> cards_catalogue.csv column. Order matters: when two
+# phrases score the same, the earlier one wins (as with process.extractOne).
+FEATURE_COLUMNS = {
+    "signup bonus": "signup_bonus_details",
+    "welcome offer": "signup_bonus_details",
+    "bonus": "signup_bonus_details",
+    "rewards": "rewards_details",
+    "reward details": "rewards_details",
+    "points system": "rewards_type",
+    "reward type": "rewards_type",
+    "cashback": "rewards_details",
+    "miles": "rewards_details",
+    "points": "rewards_details",
+    "foreign transaction fee": "foreign_transaction_fee",
+    "ftf": "foreign_transaction_fee",
+    "international fee": "foreign_transaction_fee",
+    "travel insurance": "travel_insurance_details",
+    "trip insurance": "travel_insurance_details",
+    "travel protection": "travel_insurance_details",
+    "travel perks": "travel_insurance_details",
+    "intro apr": "intro_apr_purchase_details",
+    "introductory apr": "intro_apr_purchase_details",
+    "purchase apr offer": "intro_apr_purchase_details",
+    "intro apr purchase": "intro_apr_purchase_details",
+    "intro apr bt": "intro_apr_bt_details",
+    "balance transfer offer": "intro_apr_bt_details",
+    "intro balance transfer": "intro_apr_bt_details",
+    "application link": "application_link_placeholder",
+    "how to apply": "application_link_placeholder",
+    "apply": "application_link_placeholder",
+    "annual fee": "annual_fee",
+    "fee": "annual_fee",
+    "cost": "annual_fee",
+    "apr": "apr_min",
+    "interest rate": "apr_min",
+    "minimum credit score": "min_credit_score",
+    "credit score": "min_credit_score",
+    "score needed": "min_credit_score",
+    "fico": "min_credit_score",
+    "issuer": "issuer",
+    "who issues": "issuer",
+    "bank": "issuer",
+    "cell phone protection": "travel_insurance_details",
+    "phone insurance": "travel_insurance_details"
+}
+
+MATCH_THRESHOLD = 80
+MEMO_SIZE = 4096
+
+
+def sorted_tokens(phrase: str) -> str:
+    """
+    The string token_sort_ratio actually compares: the phrase run through
+    thefuzz's processors (lowercase, non-alphanumerics to spaces, ASCII
+    only) with its tokens sorted and single-space joined.
+    """
+    processed = utils.full_process(utils.full_process(phrase), force_ascii=True)
+    return " ".join(sorted(processed.split()))
+
+
+class FeatureResolver:
+    """
+    Maps a card_feature entity to a catalogue column with the same answer as
+    process.extractOne(phrase, keys, scorer=fuzz.token_sort_ratio) at the
+    given threshold, but cheaper:
+
+    - keys are reduced to their sorted-token form once, instead of being
+      re-processed by thefuzz on every call;
+    - phrases whose sorted tokens equal a key's (a score of 100) are a
+      dict lookup;
+    - every resolved phrase is memoised;
+    - the fuzzy fallback is a single rapidfuzz ratio scan over the
+      pre-sorted keys with a score cutoff, which lets rapidfuzz skip keys
+      whose length difference alone rules them out. token_sort_ratio is
+      exactly ratio() on sorted tokens, and both pick the first key on ties.
+    """
+
+    def __init__(self, mapping: Dict[str, str], threshold: int = MATCH_THRESHOLD):
+        self.mapping = mapping
+        self.threshold = threshold
+        # Scores are rounded to ints, so anything from threshold - 0.5 up can pass.
+        self._cutoff = threshold - 0.5
+        self._keys = list(mapping)
+        self._sorted_keys = [sorted_tokens(key) for key in self._keys]
+        self._exact: Dict[str, str] = {}
+        for key, tokens in zip(self._keys, self._sorted_keys):
+            self._exact.setdefault(tokens, key)
+        self._memo: Dict[str, Tuple[Optional[str], int]] = {}
+
+    def match(self, phrase: str) -> Tuple[Optional[str], int]:
+        """Best mapping key for `phrase` and its score; the key is None below threshold."""
+        phrase = phrase.lower().strip()
+        cached = self._memo.get(phrase)
+        if cached is not None:
+            return cached
+
+        result = self._match_uncached(phrase)
+        self._remember(phrase, result)
+        return result
+
+    def _remember(self, phrase: str, result: Tuple[Optional[str], int]) -> None:
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[phrase] = result
+
+    def _match_uncached(self, phrase: str) -> Tuple[Optional[str], int]:
+        query = sorted_tokens(phrase)
+        if not query:
+            return None, 0
+        key = self._exact.get(query)
+        if key is not None:
+            return key, 100
+
+        best = rapid_process.extractOne(query, self._sorted_keys, scorer=rapid_fuzz.ratio,
+                                        processor=None, score_cutoff=self._cutoff)
+        if best is None:
+            return None, 0
+        _, score, index = best
+        return self._keys[index], int(round(score))
+
+    def resolve(self, phrase: Optional[str]) -> Optional[str]:
+        if not phrase:
+            return None
+        key, score = self.match(phrase)
+        if key is None:
+            logger.warning(f"Could not confidently fuzzy match feature '{phrase}' (no mapping key scored >= {self.threshold}).")
+            return None
+        logger.debug(f"Fuzzy matched feature '{phrase}' to mapping key '{key}' with score {score}")
+        return self.mapping[key]
+
+    def resolve_many(self, phrases: Iterable[Optional[str]]) -> List[Optional[str]]:
+        """
+        Resolve a batch of phrases (e.g. every card_feature in an NLU test
+        set). Phrases not already memoised are scored against all keys in a
+        single rapidfuzz cdist call.
+        """
+        phrases = list(phrases)
+        pending = {}
+        for phrase in phrases:
+            if not phrase:
+                continue
+            normalized = phrase.lower().strip()
+            if normalized in self._memo or normalized in pending:
+                continue
+            query = sorted_tokens(normalized)
+            if not query:
+                self._remember(normalized, (None, 0))
+            elif query in self._exact:
+                self._remember(normalized, (self._exact[query], 100))
+            else:
+                pending[normalized] = query
+
+        if pending:
+            scores = rapid_process.cdist(list(pending.values()), self._sorted_keys, scorer=rapid_fuzz.ratio,
+                                         processor=None, score_cutoff=self._cutoff, dtype=np.float64)
+            # argmax keeps the first key on ties, like extractOne.
+            best = scores.argmax(axis=1)
+            for row, normalized in enumerate(pending):
+                score = scores[row, best[row]]
+                self._remember(normalized, (self._keys[best[row]], int(round(score))) if score > 0 else (None, 0))
+
+        return [self.resolve(phrase) for phrase in phrases]
+
+
+feature_resolver = FeatureResolver(FEATURE_COLUMNS)
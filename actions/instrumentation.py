@@ -0,0 +1,331 @@
+# actions/instrumentation.py
+
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# CARD_METRICS=0 turns every span into a no-op; it can also be flipped at
+# runtime with set_enabled().
+ENABLED = os.environ.get("CARD_METRICS", "1") != "0"
+# Calls slower than this are logged with their inputs and stage breakdown.
+SLOW_CALL_SECONDS = float(os.environ.get("CARD_SLOW_CALL_MS", "500")) / 1000
+# Serve /metrics on this port from the action server process when set.
+METRICS_PORT = os.environ.get("CARD_METRICS_PORT")
+SLOW_LOG_SIZE = 100
+
+# Upper bounds (seconds) of the latency histogram buckets.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram in the Prometheus layout."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Metrics:
+    """Per-action and per-stage histograms plus slow/error counters."""
+
+    def __init__(self):
+        self.calls: Dict[str, Histogram] = {}
+        self.stages: Dict[Tuple[str, str], Histogram] = {}
+        self.slow_calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.slow_log: Deque[Dict[str, Any]] = deque(maxlen=SLOW_LOG_SIZE)
+        self._collectors: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def _histogram(self, table: dict, key) -> Histogram:
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram())
+        return histogram
+
+    def record(self, trace: "Trace", seconds: float, failed: bool) -> None:
+        calls = _captured.get()
+        if calls is not None:
+            calls.append(("record", (trace, seconds, failed)))
+            return
+        self._histogram(self.calls, trace.action).observe(seconds)
+        for stage, stage_seconds in trace.stages:
+            self._histogram(self.stages, (trace.action, stage)).observe(stage_seconds)
+        if failed:
+            with self._lock:
+                self.errors[trace.action] = self.errors.get(trace.action, 0) + 1
+
+    def record_slow(self, entry: Dict[str, Any]) -> None:
+        calls = _captured.get()
+        if calls is not None:
+            calls.append(("record_slow", (entry,)))
+            return
+        with self._lock:
+            self.slow_calls[entry["action"]] = self.slow_calls.get(entry["action"], 0) + 1
+            self.slow_log.append(entry)
+
+    def replay(self, calls: List[Tuple[str, tuple]]) -> None:
+        """Record the calls collected by captured(), e.g. in a pool worker process."""
+        for method, args in calls:
+            getattr(self, method)(*args)
+
+    def add_collector(self, collector: Callable[[], List[str]]) -> None:
+        """Register a callable returning extra exposition lines (e.g. cache stats)."""
+        self._collectors.append(collector)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.stages.clear()
+            self.slow_calls.clear()
+            self.errors.clear()
+            self.slow_log.clear()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        render_histograms(lines, "card_action_duration_seconds", "Wall time of a custom action or rank_cards call.",
+                           {(action,): h for action, h in list(self.calls.items())}, ("action",))
+        render_histograms(lines, "card_action_stage_duration_seconds", "Wall time of one stage of a call.",
+                           dict(list(self.stages.items())), ("action", "stage"))
+        for name, help_text, table in (
+                ("card_action_slow_calls_total", f"Calls slower than {SLOW_CALL_SECONDS:g}s.", self.slow_calls),
+                ("card_action_errors_total", "Calls that raised.", self.errors)):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for action, value in sorted(table.items()):
+                lines.append(f'{name}{{action="{_escape(action)}"}} {value}')
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_histograms(lines: List[str], name: str, help_text: str,
+                       histograms: Dict[tuple, Histogram], label_names: Tuple[str, ...]) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for label_values, histogram in sorted(histograms.items()):
+        labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(label_names, label_values))
+        counts, total, count = histogram.snapshot()
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+
+
+metrics = Metrics()
+
+
+class Trace:
+    """
+    Lap timer for one call. Each mark(stage) records the time since the
+    previous mark (or the start) under that stage name, so stages can be
+    marked at the end of each step without re-indenting the code.
+    """
+
+    __slots__ = ("action", "start", "last", "stages")
+
+    def __init__(self, action: str):
+        self.action = action
+        self.start = self.last = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+
+class _NullTrace:
+    __slots__ = ()
+
+    def mark(self, stage: str) -> None:
+        pass
+
+
+NULL_TRACE = _NullTrace()
+_current: ContextVar = ContextVar("card_action_trace", default=NULL_TRACE)
+# Set by captured(): a list collecting what metrics would have recorded.
+_captured: ContextVar = ContextVar("card_captured_calls", default=None)
+
+
+def current_trace():
+    """The trace of the call being served, or a no-op trace outside one."""
+    return _current.get()
+
+
+def set_enabled(enabled: bool) -> None:
+    global ENABLED
+    ENABLED = enabled
+
+
+def traced(action: str, describe: Optional[Callable[..., Dict[str, Any]]] = None):
+    """
+    Time every call of the wrapped function (plain or async) as `action`.
+    Inside it, current_trace().mark(stage) splits the time into stages.
+    `describe` receives the call's arguments and returns the inputs shown
+    in the slow call log; it only runs for slow calls.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not ENABLED:
+                    return await fn(*args, **kwargs)
+                trace = Trace(action)
+                token = _current.set(trace)
+                failed = True
+                try:
+                    result = await fn(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    _current.reset(token)
+                    _finish(trace, failed, describe, args, kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            trace = Trace(action)
+            token = _current.set(trace)
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                _current.reset(token)
+                _finish(trace, failed, describe, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _finish(trace: Trace, failed: bool, describe, args, kwargs) -> None:
+    end = time.perf_counter()
+    elapsed = end - trace.start
+    if trace.stages:
+        # Whatever ran after the last mark (e.g. an early return).
+        trace.stages.append(("rest", end - trace.last))
+    metrics.record(trace, elapsed, failed)
+    if elapsed >= SLOW_CALL_SECONDS:
+        _log_slow(trace, elapsed, describe, args, kwargs)
+
+
+def captured(fn: Callable, *args) -> Tuple[Any, Optional[Exception], List[Tuple[str, tuple]]]:
+    """
+    Run fn(*args) with the metrics of its traced calls collected instead of
+    recorded. Returns (result, exception, calls); Metrics.replay(calls) then
+    records them in another process.
+    """
+    calls: List[Tuple[str, tuple]] = []
+    token = _captured.set(calls)
+    try:
+        return fn(*args), None, calls
+    except Exception as e:
+        return None, e, calls
+    finally:
+        _captured.reset(token)
+
+
+def _log_slow(trace: Trace, elapsed: float, describe, args, kwargs) -> None:
+    inputs: Dict[str, Any] = {}
+    if describe is not None:
+        try:
+            inputs = describe(*args, **kwargs)
+        except Exception as e:
+            inputs = {"error": f"could not describe inputs: {e}"}
+    entry = {
+        "action": trace.action,
+        "seconds": elapsed,
+        "stages": {stage: seconds for stage, seconds in trace.stages},
+        "inputs": inputs,
+        "time": time.time(),
+    }
+    metrics.record_slow(entry)
+    breakdown = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in trace.stages)
+    logger.warning(f"Slow call to {trace.action}: {elapsed * 1000:.1f}ms ({breakdown}); inputs: {inputs}")
+
+
+def describe_action_call(action, dispatcher, tracker, domain) -> Dict[str, Any]:
+    """Slow-log inputs for an Action.run call: its slots and latest entities."""
+    return {
+        "sender_id": tracker.sender_id,
+        "slots": {name: value for name, value in tracker.slots.items() if value is not None},
+        "entities": [(e.get("entity"), e.get("value")) for e in tracker.latest_message.get("entities", [])],
+    }
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serve GET /metrics from a daemon thread; a no-op if already running."""
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"Could not start metrics server on port {port}: {e}")
+        return None
+    threading.Thread(target=_server.serve_forever, name="card-metrics", daemon=True).start()
+    logger.info(f"Serving action metrics on http://{host}:{port}/metrics")
+    return _server
+
+
+if METRICS_PORT and ENABLED:
+    start_metrics_server(int(METRICS_PORT))
@@ -0,0 +1,499 @@
+# actions/model_registry.py
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .fast_forest import CompiledForest, compile_forest
+
+logger = logging.getLogger(__name__)
+
+ACTIONS_DIR = Path(__file__).parent
+PROJECT_DIR = ACTIONS_DIR.parent
+MODELDIR = PROJECT_DIR / "ml_models"
+
+# The unversioned model that ships with the repo; served as version "default"
+# whenever the registry has nothing live.
+MODEL_PATH = MODELDIR / "eligibility_clf.pkl"
+SCHEMA_PATH = MODELDIR / "schema.json"
+DEFAULT_VERSION = "default"
+
+# Versioned bundles live in ml_models/registry/<version>/ with their own
+# eligibility_clf.pkl and schema.json. The LIVE file names the version that
+# should be serving; editing it swaps models without a restart.
+REGISTRY_DIR = MODELDIR / "registry"
+LIVE_POINTER = REGISTRY_DIR / "LIVE"
+
+# Default home of the memory-mappable copies of compiled forests, one
+# directory per source pickle version, shared by every action-server
+# process on the host.
+COMPILED_DIR = MODELDIR / ".compiled"
+
+# Set CARD_MODEL_COMPILED=0 to always score through sklearn.
+USE_COMPILED_MODEL = os.environ.get("CARD_MODEL_COMPILED", "1") != "0"
+CHECK_INTERVAL = float(os.environ.get("CARD_MODEL_CHECK_INTERVAL", "5.0"))
+# Shadow requests waiting beyond this are dropped rather than queued.
+SHADOW_QUEUE_LIMIT = 256
+
+
+@contextmanager
+def timed(timings: Dict[str, float], name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_input_cols(schema_path: Path) -> List[str]:
+    try:
+        with open(schema_path, 'r') as f:
+            input_cols = json.load(f)["input_cols"]
+        logger.info(f"Successfully loaded schema from {schema_path}")
+        return input_cols
+    except FileNotFoundError:
+        logger.error(f"Schema file not found at {schema_path}. Using default or empty columns.")
+    except Exception as e:
+        logger.error(f"Error loading schema from {schema_path}: {e}", exc_info=True)
+    return []
+
+
+class ModelBundle:
+    """
+    One model version: its schema, the compiled forest used for scoring and
+    (loaded only when needed) the sklearn classifier it was compiled from.
+    A bundle never changes once loaded; new versions get new bundles.
+    Compiled forests are cached under `compiled_dir`.
+    """
+
+    def __init__(self, version: str, model_path: Path, schema_path: Path, compiled_dir: Path = COMPILED_DIR):
+        self.version = version
+        self.model_path = Path(model_path)
+        self.schema_path = Path(schema_path)
+        self.compiled_dir = Path(compiled_dir)
+        self.signature = _file_signature(self.model_path)
+        self.input_cols: List[str] = []
+        self.engine: Optional[CompiledForest] = None
+        self.load_timings: Dict[str, float] = {}
+        self._clf = None
+        self._clf_loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def token(self) -> Tuple[str, Optional[Tuple[int, int]]]:
+        """Identifies exactly which model file produced a prediction; used to key caches."""
+        return self.version, self.signature
+
+    @property
+    def clf(self):
+        """The sklearn classifier, unpickled on first use (None if it failed to load)."""
+        if not self._clf_loaded:
+            with self._lock:
+                if not self._clf_loaded:
+                    self._clf = self._load_clf()
+                    self._clf_loaded = True
+        return self._clf
+
+    @property
+    def available(self) -> bool:
+        return self.engine is not None or self.clf is not None
+
+    def load(self) -> "ModelBundle":
+        with timed(self.load_timings, "schema"):
+            self.input_cols = load_input_cols(self.schema_path)
+        if USE_COMPILED_MODEL and self.input_cols:
+            self.engine = self._load_engine()
+        return self
+
+    def _load_clf(self):
+        with timed(self.load_timings, "model"):
+            # Imported here: serving from the compiled copy never needs it.
+            import joblib
+            try:
+                # Any large arrays stored uncompressed in the pickle are
+                # mapped rather than copied.
+                clf = joblib.load(self.model_path, mmap_mode="r")
+                logger.info(f"Successfully loaded model from {self.model_path}")
+            except FileNotFoundError:
+                logger.error(f"Model file not found at {self.model_path}. Ranking will likely fail.")
+                return None
+            except Exception as e:
+                logger.error(f"Error loading model from {self.model_path}: {e}", exc_info=True)
+                return None
+        # A single applicant is far too small a job for joblib's thread pool;
+        # the notebook's n_jobs=-1 is only useful while training.
+        if hasattr(clf, "n_jobs"):
+            clf.n_jobs = 1
+        return clf
+
+    def _compiled_dir(self) -> Optional[Path]:
+        if self.signature is None:
+            return None
+        mtime_ns, size = self.signature
+        return self.compiled_dir / f"{self.version}-{mtime_ns}-{size}"
+
+    def _load_engine(self) -> Optional[CompiledForest]:
+        directory = self._compiled_dir()
+        if directory is None:
+            return None
+
+        if directory.exists():
+            with timed(self.load_timings, "compiled_model"):
+                try:
+                    engine = CompiledForest.load(directory)
+                    if engine.n_features == len(self.input_cols):
+                        logger.info(f"Memory-mapped compiled model from {directory}")
+                        return engine
+                    logger.warning(f"Compiled model at {directory} does not match the schema; recompiling.")
+                except Exception as e:
+                    logger.warning(f"Could not open compiled model at {directory}: {e}; recompiling.")
+
+        clf = self.clf
+        if clf is None:
+            return None
+        with timed(self.load_timings, "compile"):
+            engine = compile_forest(clf, len(self.input_cols))
+        if engine is not None:
+            try:
+                engine.save(directory, meta={"source": str(self.model_path), "version": self.version})
+                for stale in self.compiled_dir.glob(f"{self.version}-*"):
+                    if stale != directory and stale.name.rsplit("-", 2)[0] == self.version:
+                        shutil.rmtree(stale, ignore_errors=True)
+            except OSError as e:
+                logger.warning(f"Could not cache compiled model to {directory}: {e}")
+        return engine
+
+    def predict_one(self, x: Sequence[float]) -> float:
+        if self.engine is not None:
+            return self.engine.predict_one(x)
+        return float(self.clf.predict_proba(np.asarray(x, dtype=float).reshape(1, -1))[0, 1])
+
+    def predict_batch(self, X) -> np.ndarray:
+        if self.engine is not None:
+            return self.engine.predict_batch(X)
+        return self.clf.predict_proba(X)[:, 1]
+
+    def warm(self) -> None:
+        """Score a few rows so first-call costs are paid now; fails on nonsense output."""
+        with timed(self.load_timings, "warm_up"):
+            probe = np.zeros((4, len(self.input_cols)))
+            probe[1:, :] = np.linspace(1, 1e5, 3)[:, None]
+            p = self.predict_batch(probe)
+            self.predict_one(probe[0])
+        if not np.all(np.isfinite(p)) or p.min() < 0 or p.max() > 1:
+            raise ValueError(f"Model {self.version} produced invalid probabilities {p}")
+
+
+class ShadowStats:
+    """Running comparison of a candidate model against the live one on real traffic."""
+
+    def __init__(self, version: Optional[str] = None):
+        self.version = version
+        self.count = 0
+        self.dropped = 0
+        self.failures = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.diff_total = 0.0
+        self.abs_diff_total = 0.0
+        self.abs_diff_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, diff: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.diff_total += diff
+            self.abs_diff_total += abs(diff)
+            self.abs_diff_max = max(self.abs_diff_max, abs(diff))
+
+    def record_dropped(self) -> None:
+        with self._lock:
+            self.dropped += 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            n = self.count or 1
+            return {
+                "version": self.version,
+                "count": self.count,
+                "dropped": self.dropped,
+                "failures": self.failures,
+                "latency_mean_ms": self.latency_total / n * 1000,
+                "latency_max_ms": self.latency_max * 1000,
+                "p_drift_mean": self.diff_total / n,
+                "p_drift_abs_mean": self.abs_diff_total / n,
+                "p_drift_abs_max": self.abs_diff_max,
+            }
+
+
+class ModelRegistry:
+    """
+    Holds the live ModelBundle and at most one candidate.
+
+    Readers call live() once per request and keep the returned bundle for
+    the whole call, so a swap never changes the model halfway through a
+    ranking. New versions are loaded, schema-checked and warmed on a
+    background thread, then made live by replacing a single reference.
+    """
+
+    def __init__(self, registry_dir: Path = REGISTRY_DIR, check_interval: float = CHECK_INTERVAL,
+                 compiled_dir: Path = COMPILED_DIR, schema_path: Path = SCHEMA_PATH):
+        self.registry_dir = Path(registry_dir)
+        self.compiled_dir = Path(compiled_dir)
+        self.schema_path = Path(schema_path)
+        self.live_pointer = self.registry_dir / "LIVE"
+        self.check_interval = check_interval
+        self._live: Optional[ModelBundle] = None
+        self._candidate: Optional[ModelBundle] = None
+        self._candidate_state = "none"
+        self._candidate_error: Optional[str] = None
+        self._staging: Optional[str] = None
+        # (version, model file signature) of the last failed staging, so a
+        # broken file is not retried on every check.
+        self._failed: Optional[Tuple[str, Optional[Tuple[int, int]]]] = None
+        self._shadow = False
+        self.shadow_stats = ShadowStats()
+        self._shadow_pool: Optional[ThreadPoolExecutor] = None
+        self._shadow_pending = 0
+        # (schema file signature, its input_cols)
+        self._expected_cols: Optional[Tuple[Optional[Tuple[int, int]], List[str]]] = None
+        self._next_check = 0.0
+        self._lock = threading.RLock()
+
+    # -- paths ---------------------------------------------------------
+
+    def bundle_paths(self, version: str) -> Tuple[Path, Path]:
+        if version == DEFAULT_VERSION:
+            return MODEL_PATH, SCHEMA_PATH
+        directory = self.registry_dir / version
+        return directory / "eligibility_clf.pkl", directory / "schema.json"
+
+    def versions(self) -> List[str]:
+        if not self.registry_dir.is_dir():
+            return [DEFAULT_VERSION]
+        found = sorted(p.name for p in self.registry_dir.iterdir()
+                       if p.is_dir() and (p / "eligibility_clf.pkl").exists())
+        return [DEFAULT_VERSION] + found
+
+    def pointed_version(self) -> str:
+        try:
+            version = self.live_pointer.read_text().strip()
+        except OSError:
+            return DEFAULT_VERSION
+        return version or DEFAULT_VERSION
+
+    def expected_input_cols(self) -> List[str]:
+        """
+        The feature contract the actions build rows for (ml_models/schema.json),
+        re-read whenever the file changes.
+        """
+        signature = _file_signature(self.schema_path)
+        cached = self._expected_cols
+        if cached is None or cached[0] != signature:
+            cached = self._expected_cols = (signature, load_input_cols(self.schema_path))
+        return cached[1]
+
+    # -- serving -------------------------------------------------------
+
+    def live(self) -> ModelBundle:
+        bundle = self._live
+        if bundle is None:
+            with self._lock:
+                if self._live is None:
+                    self._live = self._load_initial()
+                    self._next_check = time.monotonic() + self.check_interval
+                bundle = self._live
+        elif time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.check_interval
+            self._check_for_update(bundle)
+        return bundle
+
+    def _load_initial(self) -> ModelBundle:
+        version = self.pointed_version()
+        if version != DEFAULT_VERSION:
+            try:
+                bundle = self._prepare(version)
+                logger.info(f"Serving eligibility model version {version}")
+                return bundle
+            except Exception as e:
+                logger.error(f"Could not load model version {version}: {e}. Falling back to {DEFAULT_VERSION}.", exc_info=True)
+        model_path, schema_path = self.bundle_paths(DEFAULT_VERSION)
+        return ModelBundle(DEFAULT_VERSION, model_path, schema_path, self.compiled_dir).load()
+
+    def _check_for_update(self, bundle: ModelBundle) -> None:
+        target = self.pointed_version()
+        model_path, _ = self.bundle_paths(target)
+        signature = _file_signature(model_path)
+        if target == bundle.version and signature == bundle.signature:
+            return
+        with self._lock:
+            if self._staging == target or self._failed == (target, signature):
+                return
+        logger.info(f"Model version {target} changed on disk; loading it in the background.")
+        self.stage(target, promote=True)
+
+    def _prepare(self, version: str) -> ModelBundle:
+        model_path, schema_path = self.bundle_paths(version)
+        if not model_path.exists():
+            raise FileNotFoundError(f"No model file for version {version} at {model_path}")
+        bundle = ModelBundle(version, model_path, schema_path, self.compiled_dir).load()
+        if not bundle.available:
+            raise ValueError(f"Model version {version} could not be loaded")
+        expected = self.expected_input_cols()
+        if bundle.input_cols != expected:
+            raise ValueError(f"Model version {version} expects input columns {bundle.input_cols}, "
+                             f"but the actions provide {expected}")
+        bundle.warm()
+        return bundle
+
+    # -- rollout -------------------------------------------------------
+
+    def stage(self, version: str, shadow: bool = False, promote: bool = False,
+              wait: bool = False) -> threading.Thread:
+        """
+        Load `version` in the background. With promote=True it goes live as
+        soon as it is ready; with shadow=True it instead scores live traffic
+        alongside the current model until promote() or discard().
+        """
+        with self._lock:
+            self._staging = version
+            self._candidate = None
+            self._candidate_state = "loading"
+            self._candidate_error = None
+            self._shadow = False
+
+        def _run():
+            model_path, _ = self.bundle_paths(version)
+            signature = _file_signature(model_path)
+            try:
+                bundle = self._prepare(version)
+            except Exception as e:
+                logger.error(f"Staging model version {version} failed: {e}", exc_info=True)
+                with self._lock:
+                    self._failed = (version, signature)
+                    if self._staging == version:
+                        self._candidate_state = "failed"
+                        self._candidate_error = str(e)
+                        self._staging = None
+                return
+            with self._lock:
+                if self._staging != version:
+                    return
+                self._candidate = bundle
+                self._candidate_state = "ready"
+                if shadow:
+                    self._shadow = True
+                    self.shadow_stats = ShadowStats(version)
+                    logger.info(f"Model version {version} is shadowing live traffic.")
+                elif promote:
+                    self.promote()
+
+        thread = threading.Thread(target=_run, name=f"model-stage-{version}", daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return thread
+
+    def promote(self) -> bool:
+        """Make the ready candidate live. In-flight calls finish on the bundle they started with."""
+        with self._lock:
+            if self._candidate is None or self._candidate_state != "ready":
+                return False
+            previous = self._live
+            self._live = self._candidate
+            self._candidate = None
+            self._candidate_state = "none"
+            self._staging = None
+            self._shadow = False
+        logger.info(f"Promoted eligibility model {self._live.version}"
+                    f" (was {previous.version if previous else None}).")
+        self._write_pointer(self._live.version)
+        return True
+
+    def _write_pointer(self, version: str) -> None:
+        # Keep LIVE in step with manual promotions so the update check does
+        # not swap straight back, and other workers follow.
+        if self.pointed_version() == version:
+            return
+        try:
+            self.registry_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.live_pointer.with_name(f".LIVE.{os.getpid()}")
+            tmp.write_text(version + "\n")
+            os.replace(tmp, self.live_pointer)
+        except OSError as e:
+            logger.warning(f"Could not update {self.live_pointer} to {version}: {e}")
+
+    def discard(self) -> None:
+        with self._lock:
+            self._candidate = None
+            self._candidate_state = "none"
+            self._staging = None
+            self._shadow = False
+
+    # -- shadow scoring ------------------------------------------------
+
+    def shadow_score(self, live_bundle: ModelBundle, features: Sequence[float], p_live: float) -> None:
+        """Queue the candidate on the same features; never blocks or fails the caller."""
+        candidate = self._candidate
+        if not self._shadow or candidate is None or candidate is live_bundle:
+            return
+        stats = self.shadow_stats
+        with self._lock:
+            if self._shadow_pending >= SHADOW_QUEUE_LIMIT:
+                stats.record_dropped()
+                return
+            self._shadow_pending += 1
+            if self._shadow_pool is None:
+                self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-shadow")
+
+        def _run():
+            try:
+                start = time.perf_counter()
+                p_candidate = candidate.predict_one(features)
+                stats.record(time.perf_counter() - start, p_candidate - p_live)
+            except Exception as e:
+                stats.record_failure()
+                logger.debug(f"Shadow scoring with {candidate.version} failed: {e}")
+            finally:
+                with self._lock:
+                    self._shadow_pending -= 1
+
+        self._shadow_pool.submit(_run)
+
+    def status(self) -> Dict[str, object]:
+        live = self._live
+        return {
+            "live": live.version if live else None,
+            "pointer": self.pointed_version(),
+            "candidate": self._staging,
+            "candidate_state": self._candidate_state,
+            "candidate_error": self._candidate_error,
+            "shadow": self.shadow_stats.snapshot() if self._shadow else None,
+            "versions": self.versions(),
+        }
+
+
+model_registry = ModelRegistry()
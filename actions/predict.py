@@ -1,94 +1,260 @@
 # actions/predict.py
 
-import joblib
+import time
+_IMPORT_START = time.perf_counter()
+
+import numpy as np
 import pandas as pd
-import json
 from pathlib import Path
 import logging
+import os
+from typing import Dict, List, Mapping, NamedTuple, Optional
+
+from .catalogue import catalogue_store, get_catalogue
+from .eligibility import descending_frame_order
+from .fast_forest import CompiledForest
+from .instrumentation import current_trace, metrics, traced
+from .model_registry import ModelBundle, model_registry
+from . import prediction_cache
+from .prediction_cache import PredictionCache, quantize_features
 
 logger = logging.getLogger(__name__)
 
 ACTIONS_DIR = Path(__file__).parent
 PROJECT_DIR = ACTIONS_DIR.parent
-MODELDIR = PROJECT_DIR / "ml_models"
 DATADIR = PROJECT_DIR / "data"
 
-try:
-    clf_path = MODELDIR / "eligibility_clf.pkl"
-    clf = joblib.load(clf_path)
-    logger.info(f"Successfully loaded model from {clf_path}")
-except FileNotFoundError:
-    logger.error(f"Model file not found at {clf_path}. Ranking will likely fail.")
-    clf = None 
-except Exception as e:
-    logger.error(f"Error loading model from {clf_path}: {e}", exc_info=True)
-    clf = None
-
-try:
-    schema_path = MODELDIR / "schema.json"
-    with open(schema_path, 'r') as f:
-        INPUT_COLS = json.load(f)["input_cols"]
-    logger.info(f"Successfully loaded schema from {schema_path}")
-except FileNotFoundError:
-    logger.error(f"Schema file not found at {schema_path}. Using default or empty columns.")
-    INPUT_COLS = []
-except Exception as e:
-    logger.error(f"Error loading schema from {schema_path}: {e}", exc_info=True)
-    INPUT_COLS = []
-
-try:
-    csv_path = DATADIR / "cards_catalogue.csv"
-    cards = pd.read_csv(csv_path)
-    logger.info(f"Successfully loaded card catalogue from {csv_path}")
-    if cards.empty:
-        logger.warning(f"Card catalogue loaded from {csv_path} is empty.")
-except FileNotFoundError:
-    logger.error(f"Card catalogue file not found at {csv_path}. Ranking/details will likely fail.")
-    cards = pd.DataFrame()
-except Exception as e:
-    logger.error(f"Error loading card catalogue from {csv_path}: {e}", exc_info=True)
-    cards = pd.DataFrame()
+# Set CARD_EAGER_LOAD=1 to load every artifact at import instead of on the
+# first request.
+EAGER_LOAD = os.environ.get("CARD_EAGER_LOAD", "0") == "1"
+
+# Seconds spent on import and warm-up, for startup_report(); per-artifact
+# load times live on the model bundle and the catalogue store.
+LOAD_TIMINGS: Dict[str, float] = {}
+
+
+def current_model() -> ModelBundle:
+    """
+    The live model bundle. Callers should fetch it once per request and use
+    it throughout, so a hot swap cannot mix two models in one ranking.
+    """
+    return model_registry.live()
+
+
+def get_input_cols() -> List[str]:
+    return current_model().input_cols
+
+
+def get_model():
+    """The live sklearn classifier, loaded on first use (None if it failed to load)."""
+    return current_model().clf
+
+
+def get_engine() -> Optional[CompiledForest]:
+    """The live compiled forest, or None when scoring goes through sklearn."""
+    return current_model().engine
+
+
+def model_available() -> bool:
+    return current_model().available
+
+
+def __getattr__(name):
+    # Old module globals, now resolved lazily.
+    if name == "clf":
+        return get_model()
+    if name == "INPUT_COLS":
+        return get_input_cols()
+    if name == "engine":
+        return get_engine()
+    if name == "cards":
+        return get_catalogue().cards
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def predict_approval(X) -> np.ndarray:
+    """Approval probabilities for an N x INPUT_COLS array."""
+    return current_model().predict_batch(X)
+
+
+def predict_approval_one(x) -> float:
+    """Approval probability for a single INPUT_COLS-ordered row."""
+    return current_model().predict_one(x)
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Load every artifact now and run one prediction so the first real turn
+    pays nothing. Meant for readiness probes and CARD_EAGER_LOAD.
+    """
+    start = time.perf_counter()
+    bundle = current_model()
+    get_catalogue().responses.prerender()
+    if bundle.input_cols and bundle.available:
+        first = time.perf_counter()
+        bundle.predict_one([0.0] * len(bundle.input_cols))
+        LOAD_TIMINGS["first_prediction"] = time.perf_counter() - first
+    LOAD_TIMINGS["total"] = time.perf_counter() - start
+    logger.info(startup_report())
+    return dict(LOAD_TIMINGS)
+
+
+def startup_report() -> str:
+    bundle = model_registry.live()
+    timings = {"import": LOAD_TIMINGS.get("import", 0.0)}
+    timings.update({f"{name} ({bundle.version})": seconds for name, seconds in bundle.load_timings.items()})
+    timings.update((name, seconds) for name, seconds in LOAD_TIMINGS.items() if name != "import")
+    if catalogue_store.load_seconds is not None:
+        timings.setdefault("catalogue", catalogue_store.load_seconds)
+    if "total" in timings:
+        timings["total"] = timings.pop("total")
+    width = max(map(len, timings))
+    lines = ["Action server artifact load times:"]
+    for artifact, seconds in timings.items():
+        lines.append(f"  {artifact:<{width}} {seconds * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+
+# Memoised approval probabilities (keyed on the feature vector) and ranked
+# results (see ranking_key). Entries are tagged with the model bundle's
+# token and the catalogue's version, so a model swap or catalogue edit
+# invalidates them.
+probability_cache = PredictionCache("probability")
+ranking_cache = PredictionCache("ranking")
+
+
+def cache_stats() -> dict:
+    return {cache.name: cache.stats() for cache in (probability_cache, ranking_cache)}
+
+
+def _cache_metrics() -> List[str]:
+    lines = []
+    for stat, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+        name = f"card_cache_{stat}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# TYPE {name} {kind}")
+        for cache, stats in cache_stats().items():
+            lines.append(f'{name}{{cache="{cache}"}} {stats[stat]}')
+    return lines
+
+
+metrics.add_collector(_cache_metrics)
+
+
+def approval_probability(bundle: ModelBundle, features, shadow: bool = True) -> float:
+    """
+    The bundle's approval probability for a quantized feature vector,
+    through probability_cache. With shadow=True the request is also passed
+    to a shadowing candidate model, cached or not, so the comparison sees
+    repeat applicants as often as live traffic does.
+    """
+    p = probability_cache.get(features, bundle.token)
+    if p is None:
+        p = bundle.predict_one(features)
+        probability_cache.put(features, bundle.token, p)
+    if shadow:
+        model_registry.shadow_score(bundle, features, p)
+    return p
+
 
+def ranking_key(features, user_dict, top_n: int) -> tuple:
+    """
+    ranking_cache key for a request. Cards are checked against the
+    applicant's own fico_high and annual_inc, not the quantized copies in
+    `features`, so two applicants share a ranking only if both match.
+    """
+    return features, float(user_dict["fico_high"]), float(user_dict["annual_inc"]), top_n
+
+
+def ranked_frame(catalogue, positions: np.ndarray, utility: np.ndarray, p: float) -> pd.DataFrame:
+    """The rank_cards result for an eligibility-index ranking."""
+    # Only the top_n rows are copied out of the catalogue. The final copy
+    # consolidates the added columns so cache hits copy cheaply.
+    ranked = catalogue.take(positions)
+    ranked["p_approve"] = p
+    ranked["utility"] = utility
+    return ranked.copy()
+
+
+def _describe_ranking(user_dict, top_n: int = 3) -> dict:
+    return {"user_dict": dict(user_dict), "top_n": top_n}
+
+
+@traced("rank_cards", _describe_ranking)
 def rank_cards(user_dict, top_n: int = 3) -> pd.DataFrame:
     """
     user_dict: mapping of INPUT_COLS → numeric values
     Returns top_n cards sorted by utility = p_approve*rewards_score - annual_fee/100.
     """
-    if clf is None:
+    trace = current_trace()
+    bundle = current_model()
+    input_cols = bundle.input_cols
+    if not bundle.available:
         logger.error("Eligibility model (clf) not loaded. Cannot predict probabilities.")
         return pd.DataFrame()
-    if not INPUT_COLS:
+    if not input_cols:
         logger.error("Input columns schema not loaded. Cannot create user DataFrame.")
         return pd.DataFrame()
-    if cards.empty:
+    catalogue = get_catalogue()
+    if catalogue.empty:
         logger.error("Card catalogue not loaded or empty. Cannot rank cards.")
         return pd.DataFrame()
 
-    missing_cols = [col for col in INPUT_COLS if col not in user_dict]
+    missing_cols = [col for col in input_cols if col not in user_dict]
     if missing_cols:
         logger.error(f"User dictionary missing required columns: {missing_cols}")
         return pd.DataFrame()
 
     try:
-        user_df = pd.DataFrame([user_dict], columns=INPUT_COLS)
-
-        p = clf.predict_proba(user_df.values)[0, 1]
+        # The quantized vector only feeds the model and keys the caches;
+        # eligibility is decided on the values the user gave.
+        features = quantize_features(user_dict, input_cols)
+        fico, income = float(user_dict["fico_high"]), float(user_dict["annual_inc"])
+        model_version = bundle.token
+        # Before the ranking cache, so cached rankings are shadow-scored too.
+        p = approval_probability(bundle, features)
         logger.debug(f"Predicted probability for eligibility: {p}")
+        trace.mark("predict")
+
+        rank_key = ranking_key(features, user_dict, top_n)
+        rank_generation = (model_version, catalogue.version)
+        cached = ranking_cache.get(rank_key, rank_generation)
+        trace.mark("cache_lookup")
+        if cached is not None:
+            logger.debug(f"Ranking cache hit for features {features}")
+            return cached.copy()
 
+        index = catalogue.eligibility
+        if index is not None:
+            positions, utility = index.top(fico, income, p, top_n)
+            trace.mark("eligibility_index")
+            logger.debug(f"Eligibility index returned {len(positions)} top cards.")
+            if positions.size == 0:
+                logger.warning("No cards found meeting minimum score/income requirements.")
+                ranking_cache.put(rank_key, rank_generation, pd.DataFrame())
+                return pd.DataFrame()
+
+            ranked = ranked_frame(catalogue, positions, utility, p)
+            trace.mark("build_result")
+            ranking_cache.put(rank_key, rank_generation, ranked)
+            return ranked.copy()
+
+        cards = catalogue.cards
         if not all(col in cards.columns for col in ['min_credit_score', 'min_income']):
              logger.error("Missing 'min_credit_score' or 'min_income' in cards_catalogue.csv")
              return pd.DataFrame()
 
         eligible = cards[
-            (user_dict["fico_high"] >= cards["min_credit_score"]) &
-            (user_dict["annual_inc"]  >= cards["min_income"])
+            (fico >= cards["min_credit_score"]) &
+            (income >= cards["min_income"])
         ].copy()
+        trace.mark("eligibility_filter")
 
         logger.debug(f"Found {len(eligible)} potentially eligible cards.")
         
 
         if eligible.empty:
             logger.warning("No cards found meeting minimum score/income requirements.")
+            ranking_cache.put(rank_key, rank_generation, pd.DataFrame())
             return pd.DataFrame()
 
         if not all(col in eligible.columns for col in ['rewards_score', 'annual_fee']):
@@ -97,9 +263,153 @@ def rank_cards(user_dict, top_n: int = 3) -> pd.DataFrame:
 
         eligible["p_approve"] = p
         eligible["utility"]   = eligible["p_approve"] * eligible["rewards_score"] - eligible["annual_fee"]/100
+        trace.mark("utility")
 
-        return eligible.sort_values("utility", ascending=False).head(top_n)
+        ranked = eligible.sort_values("utility", ascending=False).head(top_n)
+        trace.mark("sort")
+        ranking_cache.put(rank_key, rank_generation, ranked)
+        return ranked.copy()
 
     except Exception as e:
         logger.error(f"Error during ranking process: {e}", exc_info=True)
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+
+# Upper bound on users x cards cells scored at once by rank_cards_batch, so
+# large campaigns run in bounded memory.
+BATCH_CELL_LIMIT = 4_000_000
+
+
+class BatchRanking(NamedTuple):
+    """
+    Compact result of rank_cards_batch. Row i describes applicant i:
+    card_index holds catalogue row positions best-first (-1 pads rows with
+    fewer than top_n eligible cards) and utility the matching scores (NaN
+    where padded, and for an eligible card missing its rewards_score or
+    annual_fee, which rank_cards also lists last). The cards and their order
+    are exactly what rank_cards returns for the same applicant.
+    """
+    p_approve: np.ndarray
+    card_index: np.ndarray
+    utility: np.ndarray
+    card_names: np.ndarray
+
+    def names(self, i: int) -> List[str]:
+        return [self.card_names[j] for j in self.card_index[i] if j >= 0]
+
+
+def _empty_batch(n_users: int, top_n: int, card_names: Optional[np.ndarray] = None) -> BatchRanking:
+    return BatchRanking(
+        p_approve=np.full(n_users, np.nan),
+        card_index=np.full((n_users, top_n), -1, dtype=np.int64),
+        utility=np.full((n_users, top_n), np.nan),
+        card_names=card_names if card_names is not None else np.array([], dtype=object),
+    )
+
+
+def rank_cards_batch(users, top_n: int = 3) -> BatchRanking:
+    """
+    users: N x INPUT_COLS array, a DataFrame containing INPUT_COLS, or one
+    or a list of rank_cards-style user dicts
+    Scores every applicant with one predict_proba call and ranks the catalogue
+    by the same utility as rank_cards, without building per-user frames.
+    """
+    bundle = current_model()
+    input_cols = bundle.input_cols
+    if isinstance(users, Mapping):
+        users = [users]
+    if isinstance(users, (list, tuple)) and users and isinstance(users[0], Mapping):
+        users = pd.DataFrame(list(users))
+    if isinstance(users, pd.DataFrame):
+        missing_cols = [col for col in input_cols if col not in users.columns]
+        if missing_cols:
+            raise ValueError(f"Applicant frame missing required columns: {missing_cols}")
+        X = users[input_cols].to_numpy(dtype=float)
+    else:
+        X = np.asarray(users, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+    if X.ndim != 2 or X.shape[1] != len(input_cols):
+        raise ValueError(f"Expected an N x {len(input_cols)} array matching {input_cols}, got shape {X.shape}")
+
+    n_users = X.shape[0]
+    if not bundle.available:
+        logger.error("Eligibility model (clf) not loaded. Cannot predict probabilities.")
+        return _empty_batch(n_users, top_n)
+    catalogue = get_catalogue()
+    required = ['card_name', 'min_credit_score', 'min_income', 'rewards_score', 'annual_fee']
+    if catalogue.empty or not all(col in catalogue.columns for col in required):
+        logger.error(f"Card catalogue empty or missing one of {required}. Cannot rank cards.")
+        return _empty_batch(n_users, top_n)
+
+    card_names = catalogue.column('card_name').to_numpy()
+    n_cards = len(card_names)
+    if n_users == 0:
+        return _empty_batch(0, top_n, card_names)
+
+    min_score = catalogue.column('min_credit_score').to_numpy(dtype=float)
+    min_income = catalogue.column('min_income').to_numpy(dtype=float)
+    rewards = catalogue.column('rewards_score').to_numpy(dtype=float)
+    fee_penalty = catalogue.column('annual_fee').to_numpy(dtype=float) / 100
+
+    # Like rank_cards: the model sees the quantized features, eligibility the raw ones.
+    fico = X[:, input_cols.index("fico_high")]
+    income = X[:, input_cols.index("annual_inc")]
+    steps = prediction_cache.DEFAULT_QUANTIZATION
+    if any(col in steps for col in input_cols):
+        X = X.copy()
+        for j, col in enumerate(input_cols):
+            if col in steps:
+                X[:, j] = np.round(X[:, j] / steps[col]) * steps[col]
+    p = bundle.predict_batch(X)
+
+    k = min(top_n, n_cards)
+    result = _empty_batch(n_users, top_n, card_names)
+    result.p_approve[:] = p
+    if k <= 0:
+        return result
+
+    chunk = max(1, BATCH_CELL_LIMIT // n_cards)
+    for start in range(0, n_users, chunk):
+        stop = min(start + chunk, n_users)
+        eligible = (fico[start:stop, None] >= min_score) & (income[start:stop, None] >= min_income)
+        raw_utility = p[start:stop, None] * rewards - fee_penalty
+        utility = np.where(eligible & ~np.isnan(raw_utility), raw_utility, -np.inf)
+
+        if k < n_cards:
+            top = np.argpartition(-utility, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n_cards), utility.shape).copy()
+        top_utility = np.take_along_axis(utility, top, axis=1)
+        order = np.argsort(-top_utility, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_utility = np.take_along_axis(top_utility, order, axis=1)
+
+        found = np.isfinite(top_utility)
+        result.card_index[start:stop, :k] = np.where(found, top, -1)
+        result.utility[start:stop, :k] = np.where(found, top_utility, np.nan)
+
+        # The order above is only rank_cards' when no utilities tie among or
+        # at the edge of the top k, and no card without a utility makes the
+        # list. Other rows are redone the way rank_cards' sort_values orders
+        # them.
+        kth = top_utility[:, k - 1]
+        redo = ((found[:, 1:] & (top_utility[:, 1:] == top_utility[:, :-1])).any(axis=1)
+                | (np.isfinite(kth) & ((utility >= kth[:, None]).sum(axis=1) > k))
+                | (~found[:, -1] & (eligible & np.isnan(raw_utility)).any(axis=1)))
+        for row in np.flatnonzero(redo):
+            positions = np.flatnonzero(eligible[row])
+            ranked = descending_frame_order(raw_utility[row, positions])[:top_n]
+            result.card_index[start + row] = -1
+            result.utility[start + row] = np.nan
+            result.card_index[start + row, :ranked.size] = positions[ranked]
+            result.utility[start + row, :ranked.size] = raw_utility[row, positions[ranked]]
+
+    logger.debug(f"Ranked {n_users} applicants against {n_cards} cards in batch.")
+    return result
+
+
+LOAD_TIMINGS["import"] = time.perf_counter() - _IMPORT_START
+
+if EAGER_LOAD:
+    warm_up()
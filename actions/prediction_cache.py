@@ -0,0 +1,139 @@
+# actions/prediction_cache.py
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Mapping, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = int(os.environ.get("CARD_CACHE_SIZE", "4096"))
+DEFAULT_TTL = float(os.environ.get("CARD_CACHE_TTL", "3600"))
+
+_MISSING = object()
+
+
+def parse_quantization(spec: Optional[str]) -> Dict[str, float]:
+    """
+    Parse "annual_inc=1000,fico_high=5,dti=0.5" into {column: step}.
+    Columns not listed are used as-is.
+    """
+    steps = {}
+    if not spec:
+        return steps
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        try:
+            col, step = part.split("=", 1)
+            step = float(step)
+        except ValueError:
+            logger.warning(f"Ignoring malformed cache quantization entry '{part}'")
+            continue
+        if step > 0:
+            steps[col.strip()] = step
+    return steps
+
+
+DEFAULT_QUANTIZATION = parse_quantization(os.environ.get("CARD_CACHE_QUANTIZE"))
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache with a per-entry TTL. Every entry is stored together
+    with the generation (e.g. model and catalogue versions) it was computed
+    under; a lookup under any other generation is a miss, so results never
+    outlive the artifacts that produced them.
+    """
+
+    def __init__(self, name: str, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable, generation: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            entry_generation, expires_at, value = entry
+            if entry_generation != generation:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return default
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, generation: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+def quantize_features(user_dict: Mapping[str, Any], input_cols: Sequence[str],
+                      steps: Optional[Mapping[str, float]] = None) -> Tuple[float, ...]:
+    """
+    Feature vector in input_cols order, with each column snapped to the
+    nearest multiple of its configured step. Used both as the probability
+    cache key and as the model input, so a cached answer is exactly what the
+    model would return for the key. Card eligibility is still checked on the
+    unrounded values.
+    """
+    steps = DEFAULT_QUANTIZATION if steps is None else steps
+    values = []
+    for col in input_cols:
+        value = float(user_dict[col])
+        step = steps.get(col)
+        if step and math.isfinite(value):
+            value = round(value / step) * step
+        values.append(value)
+    return tuple(values)
+
@@ -0,0 +1,234 @@
+# actions/speculation.py
+"""
+Ranking work started while card_request_form is still collecting slots,
+so action_recommend_card mostly reads a finished result.
+
+validate_card_request_form calls schedule() after every form turn. Once
+annual_inc and fico_high are known the catalogue is pruned to the cards
+those two qualify for; once dti and emp_length_num arrive the approval
+probability is predicted and the pruned cards ranked. The ranked frame goes
+into predict.ranking_cache under the key rank_cards uses, so the final
+rank_cards call is a cache hit exactly when it would have computed the
+same ranking. Each conversation (sender_id) keeps only its slot values and
+candidate offsets; correcting a slot drops what was computed from the old
+value.
+
+The ranking cache lives in the process that computed it, so with the
+process pool the final call would rarely land where the work was done;
+speculation is off in that mode.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import zlib
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .action_pool import POOL_UNAVAILABLE, action_pool
+from .catalogue import get_catalogue
+from .instrumentation import metrics, traced
+from .prediction_cache import PredictionCache, quantize_features
+from .predict import approval_probability, current_model, ranked_frame, ranking_cache, ranking_key
+
+logger = logging.getLogger(__name__)
+
+# Set CARD_SPECULATION=0 to rank only when action_recommend_card runs.
+ENABLED = os.environ.get("CARD_SPECULATION", "1") == "1"
+MAX_CONVERSATIONS = int(os.environ.get("CARD_SPECULATION_MAX_CONVERSATIONS", "10000"))
+TTL = float(os.environ.get("CARD_SPECULATION_TTL", "1800"))
+
+FORM_SLOTS = ("annual_inc", "fico_high", "dti", "emp_length_num")
+# action_recommend_card shows the top three.
+TOP_N = 3
+_LOCK_STRIPES = 64
+
+
+def slot_values(slots: Mapping[str, Any]) -> Tuple[Optional[float], ...]:
+    """The form slots in FORM_SLOTS order as floats, None where unset or unusable."""
+    values = []
+    for name in FORM_SLOTS:
+        value = slots.get(name)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            values.append(None)
+            continue
+        try:
+            values.append(float(value))
+        except (ValueError, TypeError):
+            values.append(None)
+    return tuple(values)
+
+
+def model_features(user_dict: Dict[str, float]) -> Dict[str, float]:
+    """The form answers plus the missing-value indicators the model was trained with."""
+    user_dict["inc_missing"] = 0.0
+    user_dict["fico_missing"] = 0.0
+    return user_dict
+
+
+class Speculation:
+    """
+    What is known and worked out so far for one conversation. Candidates
+    are offsets into the catalogue's eligibility index, narrowed to 32 bits
+    when they fit; model_token is the model the ranking was last put into
+    ranking_cache for.
+    """
+
+    __slots__ = ("slots", "candidates", "model_token")
+
+    def __init__(self, slots: Tuple[Optional[float], ...]):
+        self.slots = slots
+        self.candidates: Optional[np.ndarray] = None
+        self.model_token = None
+
+    def conflicts(self, slots: Tuple[Optional[float], ...]) -> bool:
+        """True if a slot this was computed from now has a different value."""
+        return any(old is not None and new != old for old, new in zip(self.slots, slots))
+
+
+# sender_id -> Speculation, tagged with the catalogue version it was built on.
+speculations = PredictionCache("speculation", max_size=MAX_CONVERSATIONS, ttl=TTL)
+# One lock per conversation (striped), so two form turns of the same
+# conversation don't update its state at once.
+_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+_stats_lock = threading.Lock()
+_counts = {"pruned": 0, "ranked": 0, "dropped": 0, "skipped": 0, "failed": 0}
+_tasks = set()
+_logged_off = False
+
+
+def _lock_for(sender_id: str) -> threading.Lock:
+    return _locks[zlib.crc32(str(sender_id).encode("utf-8")) % _LOCK_STRIPES]
+
+
+def _count(outcome: str) -> None:
+    with _stats_lock:
+        _counts[outcome] += 1
+
+
+def _compact(offsets: np.ndarray) -> np.ndarray:
+    if offsets.size and offsets.max() > np.iinfo(np.int32).max:
+        return offsets
+    return offsets.astype(np.int32)
+
+
+def _describe_advance(sender_id: str, slots: Mapping[str, Any]) -> dict:
+    return {"sender_id": sender_id, "slots": dict(slots)}
+
+
+@traced("speculate_ranking", _describe_advance)
+def advance(sender_id: str, slots: Mapping[str, Any]) -> None:
+    """Do whatever ranking work the conversation's current form slots allow."""
+    values = slot_values(slots)
+    income, fico = values[0], values[1]
+    with _lock_for(sender_id):
+        catalogue = get_catalogue()
+        state = speculations.get(sender_id, catalogue.version)
+        if state is not None and state.conflicts(values):
+            logger.debug(f"Form slots for {sender_id} changed to {values}; dropping speculative ranking.")
+            _count("dropped")
+            state = None
+        if state is None:
+            state = Speculation(values)
+        else:
+            state.slots = values
+
+        index = catalogue.eligibility
+        if index is not None and income is not None and fico is not None:
+            # Like rank_cards, eligibility is decided on the values the user gave.
+            if state.candidates is None:
+                state.candidates = _compact(index.eligible(fico, income))
+                _count("pruned")
+                logger.debug(f"Pruned catalogue to {state.candidates.size} candidates for {sender_id}.")
+
+            bundle = current_model()
+            input_cols = bundle.input_cols
+            if (None not in values and bundle.available and input_cols and ranking_cache.enabled
+                    and state.model_token != bundle.token):
+                user_dict = model_features(dict(zip(FORM_SLOTS, values)))
+                if all(col in user_dict for col in input_cols):
+                    features = quantize_features(user_dict, input_cols)
+                    # rank_cards passes the request to a shadow model when it is served.
+                    p = approval_probability(bundle, features, shadow=False)
+                    positions, utility = index.top(fico, income, p, TOP_N, offsets=state.candidates)
+                    # Building the frame costs more than ranking; do that ahead too.
+                    ranked = ranked_frame(catalogue, positions, utility, p) if positions.size else pd.DataFrame()
+                    ranking_cache.put(ranking_key(features, user_dict, TOP_N), (bundle.token, catalogue.version), ranked)
+                    state.model_token = bundle.token
+                    _count("ranked")
+
+        speculations.put(sender_id, catalogue.version, state)
+
+
+def enabled() -> bool:
+    """Off with CARD_SPECULATION=0, and with the process pool (see the module docstring)."""
+    global _logged_off
+    if not ENABLED:
+        return False
+    if action_pool.kind == "process":
+        if not _logged_off:
+            _logged_off = True
+            logger.info("Speculative ranking is off with CARD_ACTION_POOL=process: results cached in one "
+                        "worker would rarely serve the call that needs them.")
+        return False
+    return True
+
+
+def schedule(sender_id: str, slots: Mapping[str, Any]) -> None:
+    """
+    Run advance() on the action pool without waiting for it. Speculative
+    work never queues: it is skipped while every pool slot is taken.
+    """
+    if not enabled():
+        return
+    slots = {name: slots.get(name) for name in FORM_SLOTS}
+    if not action_pool.enabled:
+        try:
+            advance(sender_id, slots)
+        except Exception as e:
+            _count("failed")
+            logger.warning(f"Speculative ranking for {sender_id} failed: {e}", exc_info=True)
+        return
+    if action_pool.in_flight + action_pool.waiting >= action_pool.max_in_flight:
+        _count("skipped")
+        return
+    task = asyncio.ensure_future(action_pool.call("speculate_ranking", advance, sender_id, slots))
+    _tasks.add(task)
+    task.add_done_callback(lambda t: _finished(sender_id, t))
+
+
+def _finished(sender_id: str, task: asyncio.Future) -> None:
+    _tasks.discard(task)
+    if task.cancelled():
+        return
+    e = task.exception()
+    if isinstance(e, POOL_UNAVAILABLE):
+        _count("skipped")
+    elif e is not None:
+        _count("failed")
+        logger.warning(f"Speculative ranking for {sender_id} failed: {e!r}")
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        counts = dict(_counts)
+    counts["conversations"] = speculations.stats()["size"]
+    return counts
+
+
+def _speculation_metrics() -> List[str]:
+    counts = stats()
+    lines = ["# HELP card_speculation_total Speculative ranking steps by outcome.",
+             "# TYPE card_speculation_total counter"]
+    for outcome in ("pruned", "ranked", "dropped", "skipped", "failed"):
+        lines.append(f'card_speculation_total{{outcome="{outcome}"}} {counts[outcome]}')
+    lines += ["# HELP card_speculation_conversations Conversations with speculative ranking state.",
+              "# TYPE card_speculation_conversations gauge",
+              f"card_speculation_conversations {counts['conversations']}"]
+    return lines
+
+
+metrics.add_collector(_speculation_metrics)
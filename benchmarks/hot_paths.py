@@ -0,0 +1,361 @@
+# benchmarks/hot_paths.py
+"""
+Latency, throughput and allocation benchmarks for the action hot paths,
+run against synthetic catalogues and models of increasing size.
+
+    python -m benchmarks.hot_paths --cards 10,1000,100000 --trees 50
+    python -m benchmarks.hot_paths --save-baseline main
+    python -m benchmarks.hot_paths --baseline main      # compare, exit 1 on regression
+
+Each benchmark is timed call by call (p50/p95/p99/max and calls per
+second), then re-run for a few calls under tracemalloc to record the peak
+and retained allocation per call. "cold" variants disable the prediction
+caches and the name/feature memos; "warm" variants leave them on and
+replay a small set of inputs, as a busy server would see.
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import sklearn
+
+from actions import predict
+from actions.actions import ActionProvideCardDetails, ActionRecommendCard
+from actions.catalogue import catalogue_store, get_catalogue
+from actions.feature_resolver import feature_resolver
+from rasa_sdk.executor import CollectingDispatcher
+
+from .synthetic import FEATURE_PHRASES, INPUT_COLS, make_applicants, make_tracker, synthetic_environment
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+DEFAULT_CARDS = [10, 100, 1000, 10_000, 100_000]
+DEFAULT_TREES = [50]
+# A p50 or p95 this much slower than the baseline counts as a regression.
+DEFAULT_THRESHOLD = 0.20
+ALLOCATION_CALLS = 20
+WARM_INPUTS = 64
+
+
+class Benchmark:
+    """
+    One timed operation. `call(i)` performs the i-th call; `setup(i)`, if
+    given, runs untimed just before it (e.g. to clear a memo). `calls` and
+    `warmup` override the run-wide counts.
+    """
+
+    def __init__(self, name: str, call: Callable[[int], Any], setup: Optional[Callable[[int], None]] = None,
+                 calls: Optional[int] = None, warmup: Optional[int] = None):
+        self.name = name
+        self.call = call
+        self.setup = setup
+        self.calls = calls
+        self.warmup = warmup
+
+
+def measure(bench: Benchmark, calls: int, warmup: int) -> Dict[str, float]:
+    call, setup = bench.call, bench.setup
+    for i in range(warmup):
+        if setup:
+            setup(i)
+        call(i)
+
+    samples = np.empty(calls)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for i in range(calls):
+            if setup:
+                setup(i)
+            start = time.perf_counter_ns()
+            call(i)
+            samples[i] = time.perf_counter_ns() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    samples /= 1000.0
+
+    n_alloc = min(calls, ALLOCATION_CALLS)
+    peaks = np.empty(n_alloc)
+    retained = np.empty(n_alloc)
+    tracemalloc.start()
+    try:
+        for i in range(n_alloc):
+            if setup:
+                setup(i)
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            call(i)
+            after, peak = tracemalloc.get_traced_memory()
+            peaks[i] = peak - before
+            retained[i] = after - before
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "calls": calls,
+        "mean_us": float(samples.mean()),
+        "p50_us": float(np.percentile(samples, 50)),
+        "p95_us": float(np.percentile(samples, 95)),
+        "p99_us": float(np.percentile(samples, 99)),
+        "max_us": float(samples.max()),
+        "ops_per_s": float(1e6 / samples.mean()),
+        "peak_kib": float(peaks.mean() / 1024),
+        "retained_kib": float(retained.mean() / 1024),
+    }
+
+
+def _users(n: int, seed: int) -> List[Dict[str, float]]:
+    return [dict(zip(INPUT_COLS, row)) for row in make_applicants(n, seed)]
+
+
+def _disable_caches() -> List[int]:
+    caches = (predict.probability_cache, predict.ranking_cache)
+    sizes = [cache.max_size for cache in caches]
+    for cache in caches:
+        cache.max_size = 0
+    return sizes
+
+
+def _restore_caches(sizes: Sequence[int]) -> None:
+    for cache, size in zip((predict.probability_cache, predict.ranking_cache), sizes):
+        cache.max_size = size
+        cache.clear()
+
+
+def _clear_memos(_i: int = 0) -> None:
+    feature_resolver._memo.clear()
+    get_catalogue()._contains_memo.clear()
+
+
+def build_benchmarks(bundle, calls: int, seed: int) -> List[Benchmark]:
+    cold_users = _users(calls * 2, seed)
+    warm_users = _users(WARM_INPUTS, seed + 1)
+    features = [tuple(u[col] for col in INPUT_COLS) for u in cold_users]
+
+    recommend = ActionRecommendCard()
+    details = ActionProvideCardDetails()
+    slot_names = ["annual_inc", "fico_high", "dti", "emp_length_num"]
+    recommend_trackers = [make_tracker({s: u[s] for s in slot_names}) for u in cold_users]
+
+    catalogue = get_catalogue()
+    names = catalogue.cards["card_name"].tolist()
+    rng = np.random.default_rng(seed)
+    recommended = [names[i] for i in rng.choice(len(names), min(3, len(names)), replace=False)]
+    slots = {"recommended_cards_list": recommended}
+    slots.update({f"recommended_card_{k + 1}": name for k, name in enumerate(recommended)})
+
+    # A mix of the ways users refer to a card: by position, by full name,
+    # by a fragment that needs a substring search, and by a name we don't have.
+    references = [
+        [{"entity": "ordinal_reference", "value": "first"}],
+        [{"entity": "ordinal_reference", "value": "last"}],
+        [{"entity": "card_name", "value": names[len(names) // 2]}],
+        [{"entity": "card_name", "value": names[-1].rsplit(" ", 1)[0].split(" ", 1)[-1]}],
+        [{"entity": "card_name", "value": "Imaginary Card"}],
+    ]
+    detail_trackers = []
+    for k in range(max(calls, len(references) * 4)):
+        reference = references[k % len(references)]
+        phrase = FEATURE_PHRASES[rng.integers(len(FEATURE_PHRASES))] if k % 4 else None
+        entities = reference + ([{"entity": "card_feature", "value": phrase}] if phrase else [])
+        detail_trackers.append(make_tracker(slots, entities))
+
+    def run_action(action, trackers):
+        def _call(i):
+            action.run_sync(CollectingDispatcher(), trackers[i % len(trackers)], {})
+        return _call
+
+    return [
+        Benchmark("model.predict_one", lambda i: bundle.predict_one(features[i % len(features)])),
+        Benchmark("rank_cards.cold", lambda i: predict.rank_cards(cold_users[i % len(cold_users)])),
+        Benchmark("rank_cards.warm", lambda i: predict.rank_cards(warm_users[i % WARM_INPUTS]), warmup=WARM_INPUTS),
+        Benchmark("recommend.run.cold", run_action(recommend, recommend_trackers)),
+        Benchmark("details.run.cold", run_action(details, detail_trackers), setup=_clear_memos),
+        Benchmark("details.run.warm", run_action(details, detail_trackers), warmup=len(detail_trackers)),
+        Benchmark("get_column_for_feature.cold",
+                  lambda i: details.get_column_for_feature(FEATURE_PHRASES[i % len(FEATURE_PHRASES)]),
+                  setup=_clear_memos),
+        Benchmark("get_column_for_feature.warm",
+                  lambda i: details.get_column_for_feature(FEATURE_PHRASES[i % len(FEATURE_PHRASES)]),
+                  warmup=len(FEATURE_PHRASES)),
+        Benchmark("catalogue.reload", lambda i: catalogue_store.reload(), calls=3, warmup=0),
+    ]
+
+
+COLD = {"rank_cards.cold", "recommend.run.cold"}
+
+
+def run(cards: Sequence[int], trees: Sequence[int], max_depth: Optional[int] = None, engine: str = "compiled",
+        calls: int = 500, warmup: int = 20, only: Optional[Sequence[str]] = None, seed: int = 0,
+        catalogue: str = "csv", progress: Callable[[str], None] = lambda msg: None) -> Dict[str, Any]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="card-bench-") as workdir:
+        for n_cards, n_trees in itertools.product(cards, trees):
+            with synthetic_environment(n_cards, n_trees, max_depth, engine, Path(workdir), seed, catalogue) as bundle:
+                nodes = int(bundle.engine.feature.shape[0]) if bundle.engine is not None else \
+                    int(sum(est.tree_.node_count for est in bundle.clf.estimators_))
+                for bench in build_benchmarks(bundle, calls, seed):
+                    if only and not any(bench.name.startswith(prefix) for prefix in only):
+                        continue
+                    progress(f"{bench.name} cards={n_cards} trees={n_trees}")
+                    n_calls = bench.calls or calls
+                    n_warmup = warmup if bench.warmup is None else bench.warmup
+                    sizes = _disable_caches() if bench.name in COLD else None
+                    try:
+                        stats = measure(bench, n_calls, n_warmup)
+                    finally:
+                        if sizes is not None:
+                            _restore_caches(sizes)
+                    results.append({"benchmark": bench.name, "cards": n_cards, "trees": n_trees,
+                                    "nodes": nodes, "engine": engine, **stats})
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "calls": calls,
+            "max_depth": max_depth,
+            "catalogue": catalogue,
+        },
+        "results": results,
+    }
+
+
+def _key(result: Dict[str, Any]):
+    return result["benchmark"], result["cards"], result["trees"], result["engine"]
+
+
+def format_table(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> str:
+    previous = {_key(r): r for r in baseline["results"]} if baseline else {}
+    header = (f"{'benchmark':<28} {'cards':>7} {'trees':>5} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} "
+              f"{'max us':>9} {'ops/s':>9} {'peak KiB':>9}")
+    if previous:
+        header += f" {'p50 vs base':>12}"
+    lines = [header, "-" * len(header)]
+    for r in report["results"]:
+        line = (f"{r['benchmark']:<28} {r['cards']:>7} {r['trees']:>5} {r['p50_us']:>9.1f} {r['p95_us']:>9.1f} "
+                f"{r['p99_us']:>9.1f} {r['max_us']:>9.1f} {r['ops_per_s']:>9.0f} {r['peak_kib']:>9.1f}")
+        if previous:
+            old = previous.get(_key(r))
+            line += f" {(r['p50_us'] / old['p50_us'] - 1) * 100:>+11.1f}%" if old else f" {'new':>12}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def format_breakdown(report: Dict[str, Any]) -> str:
+    """Share of a cold recommendation spent in the model, and of a cold details turn in fuzzy matching."""
+    by_key = {_key(r): r for r in report["results"]}
+    lines = []
+    for r in report["results"]:
+        if r["benchmark"] == "recommend.run.cold":
+            model = by_key.get(("model.predict_one", r["cards"], r["trees"], r["engine"]))
+            rank = by_key.get(("rank_cards.cold", r["cards"], r["trees"], r["engine"]))
+            if model and rank:
+                lines.append(f"recommend  cards={r['cards']:<7} trees={r['trees']:<4} model {model['p50_us'] / r['p50_us']:5.0%}"
+                             f"  catalogue filter/sort {(rank['p50_us'] - model['p50_us']) / r['p50_us']:5.0%}"
+                             f"  action overhead {(r['p50_us'] - rank['p50_us']) / r['p50_us']:5.0%}")
+        elif r["benchmark"] == "details.run.cold":
+            fuzzy = by_key.get(("get_column_for_feature.cold", r["cards"], r["trees"], r["engine"]))
+            if fuzzy:
+                # Three in four detail turns ask about a feature.
+                lines.append(f"details    cards={r['cards']:<7} trees={r['trees']:<4} "
+                             f"fuzzy matching {0.75 * fuzzy['mean_us'] / r['mean_us']:5.0%} of mean")
+    return "\n".join(lines)
+
+
+def find_regressions(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    previous = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in report["results"]:
+        old = previous.get(_key(r))
+        if old is None:
+            continue
+        for stat in ("p50_us", "p95_us"):
+            if r[stat] > old[stat] * (1 + threshold):
+                regressions.append(f"{r['benchmark']} cards={r['cards']} trees={r['trees']}: "
+                                   f"{stat} {old[stat]:.1f} -> {r[stat]:.1f}")
+    return regressions
+
+
+def _baseline_path(name: str) -> Path:
+    path = Path(name)
+    return path if path.suffix == ".json" else BASELINE_DIR / f"{name}.json"
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the card recommendation hot paths.")
+    parser.add_argument("--cards", type=_int_list, default=DEFAULT_CARDS, help="catalogue sizes, e.g. 10,1000,100000")
+    parser.add_argument("--trees", type=_int_list, default=DEFAULT_TREES, help="forest sizes, e.g. 10,50,200")
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--engine", choices=["compiled", "sklearn"], default="compiled")
+    parser.add_argument("--catalogue", choices=["csv", "compiled"], default="csv",
+                        help="load the catalogue from the CSV or a compiled file")
+    parser.add_argument("--calls", type=int, default=500, help="timed calls per benchmark")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--only", action="append", default=None, metavar="PREFIX",
+                        help="run only benchmarks whose name starts with PREFIX")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="NAME", help="store results in benchmarks/baselines/NAME.json")
+    parser.add_argument("--baseline", metavar="NAME", help="compare against a stored baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown that counts as a regression (default 0.20)")
+    parser.add_argument("--json", type=Path, help="also write the raw results here")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+
+    # The actions log every miss and fallback; keep that out of the timings.
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("actions").setLevel(logging.CRITICAL)
+    progress = (lambda msg: print(msg, file=sys.stderr)) if args.verbose else (lambda msg: None)
+
+    baseline = None
+    if args.baseline:
+        with open(_baseline_path(args.baseline)) as f:
+            baseline = json.load(f)
+
+    report = run(args.cards, args.trees, args.max_depth, args.engine, args.calls, args.warmup,
+                 args.only, args.seed, args.catalogue, progress)
+    print(format_table(report, baseline))
+    breakdown = format_breakdown(report)
+    if breakdown:
+        print()
+        print(breakdown)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=1))
+    if args.save_baseline:
+        path = _baseline_path(args.save_baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=1))
+        print(f"\nSaved baseline to {path}")
+
+    if baseline is not None:
+        regressions = find_regressions(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            print("\n".join(f"  {line}" for line in regressions))
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
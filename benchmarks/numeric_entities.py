@@ -0,0 +1,218 @@
+# benchmarks/numeric_entities.py
+"""
+Spec check and latency of the in-process numeric entity extractor
+(nlu_components/numeric_entities.py) that replaced the Duckling server.
+
+    python -m benchmarks.numeric_entities
+    python -m benchmarks.numeric_entities --duckling-url http://localhost:8000
+
+Every intent example in data/nlu.yml, plus the extra messages in
+numeric_entities_spec.yml, is parsed and checked against the entities that
+file specifies (per dimension precision and recall, and every
+disagreement). The spec is hand-written, so this is a spec test, not a
+measure of agreement with Duckling. Each message is then parsed repeatedly
+and timed. With --duckling-url the same messages also go to a running
+Duckling: its entities are checked against the spec, the in-process
+entities are scored against Duckling's, and the HTTP round trip is timed
+for comparison.
+"""
+
+import argparse
+import gc
+import json
+import re
+import sys
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import yaml
+
+from nlu_components.numeric_entities import DIMENSIONS, NumericEntityParser, to_rasa_entities
+
+ROOT = Path(__file__).resolve().parent.parent
+NLU_PATH = ROOT / "data" / "nlu.yml"
+SPEC_PATH = Path(__file__).parent / "numeric_entities_spec.yml"
+DUCKLING_LOCALE = "en_US"
+DUCKLING_TIMEOUT = 5.0
+
+# "[text](entity)" and "[text]{...}" annotations in Rasa training examples.
+_ANNOTATION_RE = re.compile(r"\[([^\]]*)\](?:\([^)]*\)|\{[^}]*\})")
+
+Entity = Tuple[str, str, Any]
+
+
+def load_messages(nlu_path: Path, spec_path: Path) -> Tuple[List[str], Dict[str, List[Entity]]]:
+    """Plain-text intent examples plus the extra messages, and the entities the spec gives each."""
+    with open(nlu_path) as f:
+        nlu = yaml.safe_load(f)
+    with open(spec_path) as f:
+        expected_doc = yaml.safe_load(f)
+
+    messages = []
+    for block in nlu.get("nlu", []):
+        if "intent" not in block:
+            continue
+        for line in block["examples"].splitlines():
+            line = line.strip()
+            if line.startswith("- "):
+                messages.append(_ANNOTATION_RE.sub(r"\1", line[2:]))
+
+    expected = {}
+    for case in expected_doc.get("examples", []) + expected_doc.get("extra", []):
+        expected[case["text"]] = [(e["entity"], e["text"], e["value"]) for e in case["entities"]]
+    messages += [text for text in expected if text not in messages]
+    messages = list(dict.fromkeys(messages))
+    return messages, {text: expected.get(text, []) for text in messages}
+
+
+def entity_key(entity: Dict[str, Any]) -> Entity:
+    value = entity["value"]
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return entity["entity"], entity["text"], value
+
+
+def score(messages: Sequence[str], expected: Dict[str, List[Entity]],
+          extract: Callable[[str], List[Dict[str, Any]]], dimensions: Sequence[str]) -> Dict[str, Any]:
+    """Per-dimension precision and recall of `extract` against the expected entities."""
+    counts = {dim: {"tp": 0, "fp": 0, "fn": 0} for dim in dimensions}
+    disagreements = []
+    for text in messages:
+        want = [e for e in expected[text] if e[0] in counts]
+        got = [entity_key(e) for e in extract(text) if e["entity"] in counts]
+        missing = [e for e in want if e not in got]
+        spurious = [e for e in got if e not in want]
+        for dim, _, _ in want:
+            counts[dim]["tp"] += 1
+        for dim, _, _ in missing:
+            counts[dim]["tp"] -= 1
+            counts[dim]["fn"] += 1
+        for dim, _, _ in spurious:
+            counts[dim]["fp"] += 1
+        if missing or spurious:
+            disagreements.append({"text": text, "missing": missing, "spurious": spurious})
+
+    per_dim = {}
+    for dim, c in counts.items():
+        found, labelled = c["tp"] + c["fp"], c["tp"] + c["fn"]
+        per_dim[dim] = {
+            **c,
+            "precision": c["tp"] / found if found else None,
+            "recall": c["tp"] / labelled if labelled else None,
+        }
+    exact = len(messages) - len(disagreements)
+    return {"messages": len(messages), "exact": exact, "dimensions": per_dim, "disagreements": disagreements}
+
+
+def measure(call: Callable[[str], Any], messages: Sequence[str], rounds: int, warmup: int) -> Dict[str, float]:
+    """Per-message latency of `call` over `rounds` passes through the messages."""
+    for text in messages[:warmup]:
+        call(text)
+    samples = np.empty(rounds * len(messages))
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        i = 0
+        for _ in range(rounds):
+            for text in messages:
+                start = time.perf_counter_ns()
+                call(text)
+                samples[i] = time.perf_counter_ns() - start
+                i += 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    samples /= 1000.0
+    return {
+        "calls": len(samples),
+        "mean_us": float(samples.mean()),
+        "p50_us": float(np.percentile(samples, 50)),
+        "p95_us": float(np.percentile(samples, 95)),
+        "p99_us": float(np.percentile(samples, 99)),
+        "max_us": float(samples.max()),
+        "messages_per_s": float(1e6 / samples.mean()),
+    }
+
+
+def duckling_extractor(url: str, dimensions: Sequence[str]) -> Callable[[str], List[Dict[str, Any]]]:
+    """Entities from a Duckling server, requested the way DucklingEntityExtractor requests them."""
+    endpoint = url.rstrip("/") + "/parse"
+
+    def extract(text: str) -> List[Dict[str, Any]]:
+        body = urllib.parse.urlencode({"text": text, "locale": DUCKLING_LOCALE, "dims": json.dumps(list(dimensions))})
+        request = urllib.request.Request(endpoint, data=body.encode(),
+                                         headers={"Content-Type": "application/x-www-form-urlencoded; charset=UTF-8"})
+        with urllib.request.urlopen(request, timeout=DUCKLING_TIMEOUT) as response:
+            matches = json.load(response)
+        return [e for e in to_rasa_entities(matches) if e["entity"] in dimensions]
+
+    return extract
+
+
+def format_score(name: str, result: Dict[str, Any]) -> str:
+    lines = [f"{name}: {result['exact']}/{result['messages']} messages agree",
+             f"  {'dimension':<18}{'tp':>5}{'fp':>5}{'fn':>5}{'precision':>11}{'recall':>9}"]
+    for dim, c in result["dimensions"].items():
+        precision = "-" if c["precision"] is None else f"{c['precision']:.3f}"
+        recall = "-" if c["recall"] is None else f"{c['recall']:.3f}"
+        lines.append(f"  {dim:<18}{c['tp']:>5}{c['fp']:>5}{c['fn']:>5}{precision:>11}{recall:>9}")
+    for d in result["disagreements"]:
+        lines.append(f"  ! {d['text']!r}")
+        for entity in d["missing"]:
+            lines.append(f"      missing  {entity}")
+        for entity in d["spurious"]:
+            lines.append(f"      spurious {entity}")
+    return "\n".join(lines)
+
+
+def format_latency(name: str, stats: Dict[str, float]) -> str:
+    return (f"{name:<12} {stats['calls']:>7} calls  p50 {stats['p50_us']:9.1f}µs  p95 {stats['p95_us']:9.1f}µs  "
+            f"p99 {stats['p99_us']:9.1f}µs  max {stats['max_us']:9.1f}µs  {stats['messages_per_s']:10.0f} msg/s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Spec check and latency of the in-process numeric entity extractor.")
+    parser.add_argument("--nlu", type=Path, default=NLU_PATH, help="Rasa NLU training data")
+    parser.add_argument("--spec", type=Path, default=SPEC_PATH, help="hand-written expected entities")
+    parser.add_argument("--dimensions", default=",".join(DIMENSIONS), help="comma-separated dimensions to score")
+    parser.add_argument("--rounds", type=int, default=200, help="timed passes through the messages")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--duckling-url", help="also score and time a running Duckling server")
+    parser.add_argument("--duckling-rounds", type=int, default=5, help="timed passes for Duckling")
+    parser.add_argument("--json", type=Path, help="also write the raw results here")
+    args = parser.parse_args(argv)
+
+    dimensions = [d for d in args.dimensions.split(",") if d]
+    messages, expected = load_messages(args.nlu, args.spec)
+    numeric = NumericEntityParser(dimensions)
+
+    def extract(text: str) -> List[Dict[str, Any]]:
+        return to_rasa_entities(numeric.parse(text))
+
+    report: Dict[str, Any] = {"messages": len(messages), "dimensions": dimensions,
+                              "scores": {"in_process vs spec": score(messages, expected, extract, dimensions)},
+                              "latency": {"in_process": measure(extract, messages, args.rounds, args.warmup)}}
+    if args.duckling_url:
+        duckling = duckling_extractor(args.duckling_url, dimensions)
+        duckling_entities = {text: [entity_key(e) for e in duckling(text)] for text in messages}
+        report["scores"]["duckling vs spec"] = score(messages, expected, duckling, dimensions)
+        report["scores"]["in_process vs duckling"] = score(messages, duckling_entities, extract, dimensions)
+        report["latency"]["duckling"] = measure(duckling, messages, args.duckling_rounds, min(args.warmup, 5))
+
+    for name, result in report["scores"].items():
+        print(format_score(name, result))
+        print()
+    for name, stats in report["latency"].items():
+        print(format_latency(name, stats))
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
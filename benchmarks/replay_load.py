@@ -0,0 +1,679 @@
+# benchmarks/replay_load.py
+"""
+Conversation replay load generator for the action server's /webhook.
+
+    python -m benchmarks.replay_load --concurrency 1,8,32,64 --duration 30
+    python -m benchmarks.replay_load --rate 20 --concurrency 64 --duration 60
+    python -m benchmarks.replay_load --start-server --concurrency 1,16
+
+It stands in for the Rasa server: the story flows in tests/test_stories.yml
+and data/stories.yml give the order of intents and actions, and the
+phrasings in InputExamples.md give the user text. Entities are extracted
+here (numbers for the form slots, ordinals, card names and card features),
+so no Rasa server, NLU model or Duckling is needed. Each conversation keeps
+its own tracker: slots set by the form and by the actions' responses carry
+into later turns, just as Rasa would send them.
+
+Only actions the action server registers (GET /actions) are sent;
+responses and form steps are handled locally. Like Rasa's form loop, each
+answer given while a form is active is sent to the form's validation
+action (validate_<form>) when the server registers one. With --concurrency N, N
+conversations run back to back for --duration seconds per level. With
+--rate R, conversations start at random (Poisson) times averaging R per
+second, at most N at once; starts that find N running are counted as
+dropped rather than queued, so a slow server can't hide its backlog.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+import yaml
+from rapidfuzz import fuzz, process
+
+from actions.feature_resolver import FEATURE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+STORY_FILES = [PROJECT_DIR / "tests" / "test_stories.yml", PROJECT_DIR / "data" / "stories.yml"]
+EXAMPLES_FILE = PROJECT_DIR / "InputExamples.md"
+DOMAIN_FILE = PROJECT_DIR / "domain.yml"
+NLU_FILE = PROJECT_DIR / "data" / "nlu.yml"
+
+DEFAULT_URL = "http://localhost:5055/webhook"
+# Sent as the tracker's Rasa version; matches requirements.txt.
+RASA_VERSION = "3.6.21"
+APPLICANT_SLOTS = ["annual_inc", "fico_high", "dti", "emp_length_num"]
+CARD_PLACEHOLDER = "[Recommended Card Name]"
+# InputExamples.md sub-headings of section 2 -> the slot they answer.
+ANSWER_HEADINGS = {"income": "annual_inc", "credit score": "fico_high",
+                   "debt-to-income ratio": "dti", "employment length": "emp_length_num"}
+ORDINAL_PATTERN = re.compile(r"\b(first|second|third|last|1st|2nd|3rd)\b", re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(k\b)?", re.IGNORECASE)
+FEATURE_MATCH_THRESHOLD = 80
+
+
+class Phrasings:
+    """
+    The user-side text of a conversation, from InputExamples.md: how
+    people ask for a recommendation, answer each form question, ask about
+    a card, and sign off.
+    """
+
+    def __init__(self, requests: List[str], answers: Dict[str, List[str]], questions: List[str],
+                 endings: List[str]):
+        self.requests = requests
+        self.answers = answers
+        self.questions = questions
+        self.endings = endings
+
+    @classmethod
+    def load(cls, path: Path = EXAMPLES_FILE) -> "Phrasings":
+        requests, questions, endings = [], [], []
+        answers: Dict[str, List[str]] = {slot: [] for slot in APPLICANT_SLOTS}
+        section, slot = None, None
+        for line in path.read_text(encoding="utf-8").splitlines():
+            heading = re.match(r"##\s+(\d+)\.", line)
+            if heading:
+                section, slot = int(heading.group(1)), None
+                continue
+            sub = re.match(r"\s*\*\s+\*\*\((.+?)\):\*\*", line)
+            if sub:
+                slot = ANSWER_HEADINGS.get(sub.group(1).lower())
+                continue
+            example = re.match(r"\s*\*\s+`([^`]+)`", line)
+            if not example:
+                continue
+            text = example.group(1)
+            if section == 1 and not re.fullmatch(r"(hi|hello)", text, re.IGNORECASE):
+                requests.append(text)
+            elif section == 2 and slot:
+                answers[slot].append(text)
+            elif section == 3:
+                questions.append(text)
+            elif section == 4:
+                endings.append(text)
+        return cls(requests, answers, questions, endings)
+
+
+def parse_number(text: str) -> Optional[float]:
+    """The first number in `text`, with a trailing k as thousands; a stand-in for Duckling."""
+    match = NUMBER_PATTERN.search(text)
+    if match is None:
+        return None
+    value = float(match.group(1).replace(",", ""))
+    return value * 1000 if match.group(2) else value
+
+
+class FeatureMatcher:
+    """Finds the card feature a question mentions, tolerating typos, as the NLU model would tag it."""
+
+    def __init__(self, vocabulary: Sequence[str]):
+        self.vocabulary = sorted({v.lower() for v in vocabulary}, key=len, reverse=True)
+        self._memo: Dict[str, Optional[Tuple[str, int, int]]] = {}
+
+    @classmethod
+    def load(cls, nlu_path: Path = NLU_FILE) -> "FeatureMatcher":
+        vocabulary = list(FEATURE_COLUMNS)
+        if nlu_path.exists():
+            vocabulary += re.findall(r'"entity": "card_feature", "value": "([^"]+)"', nlu_path.read_text(encoding="utf-8"))
+        return cls(vocabulary)
+
+    def find(self, text: str) -> Optional[Tuple[str, int, int]]:
+        """(matched text, start, end) of the best feature mention, or None."""
+        if text in self._memo:
+            return self._memo[text]
+        words = list(re.finditer(r"[\w'-]+", text))
+        best, best_key = None, (0.0, 0)
+        for size in range(4, 0, -1):
+            for i in range(len(words) - size + 1):
+                start, end = words[i].start(), words[i + size - 1].end()
+                span = text[start:end].lower()
+                match = process.extractOne(span, self.vocabulary, scorer=fuzz.ratio)
+                if match is None or match[1] < FEATURE_MATCH_THRESHOLD:
+                    continue
+                key = (match[1], end - start)
+                if key > best_key:
+                    best, best_key = (text[start:end], start, end), key
+        self._memo[text] = best
+        return best
+
+
+def _entity(name: str, value: Any, start: int, end: int, extractor: str = "replay_load") -> Dict[str, Any]:
+    return {"entity": name, "value": value, "start": start, "end": end, "confidence_entity": 1.0,
+            "extractor": extractor}
+
+
+def load_stories(paths: Sequence[Path] = STORY_FILES) -> List[Dict[str, Any]]:
+    stories = []
+    for path in paths:
+        if not path.exists():
+            logger.warning(f"Story file {path} not found; skipping it.")
+            continue
+        data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+        for story in data.get("stories", []):
+            stories.append({"story": story.get("story", "?"), "source": path.name, "steps": story.get("steps", [])})
+    return stories
+
+
+def _story_entities(step: Dict[str, Any]) -> Dict[str, Any]:
+    entities = {}
+    for entity in step.get("entities") or []:
+        if isinstance(entity, dict):
+            entities.update(entity)
+        else:
+            entities[entity] = None
+    return entities
+
+
+class Conversation:
+    """
+    Replays one story as one conversation, building the tracker Rasa
+    would send before each custom action and folding the action's
+    returned events back into it.
+    """
+
+    def __init__(self, story: Dict[str, Any], sender_id: str, domain: Dict[str, Any], server_actions: set,
+                 phrasings: Phrasings, features: FeatureMatcher, rng: np.random.Generator):
+        self.story = story
+        self.sender_id = sender_id
+        self.domain = domain
+        self.server_actions = server_actions
+        self.phrasings = phrasings
+        self.features = features
+        self.rng = rng
+        self.slots: Dict[str, Any] = {name: None for name in domain.get("slots", {})}
+        self.events: List[Dict[str, Any]] = []
+        self.latest_message: Dict[str, Any] = {"intent": {}, "entities": [], "text": None}
+        self.active_loop: Dict[str, Any] = {}
+        self.latest_action_name = "action_listen"
+        self._response_slots: set = set()
+
+    def _pick(self, options: Sequence[str], fallback: str) -> str:
+        return str(options[self.rng.integers(len(options))]) if options else fallback
+
+    def _set_slot(self, name: str, value: Any) -> None:
+        self.slots[name] = value
+        self.events.append({"event": "slot", "timestamp": time.time(), "name": name, "value": value})
+
+    def _fill_applicant_slots(self) -> None:
+        """Answers for all four form questions, as if the form ran earlier in the conversation."""
+        for slot in APPLICANT_SLOTS:
+            value = parse_number(self._pick(self.phrasings.answers.get(slot, []), "0"))
+            self._set_slot(slot, value)
+
+    def _user_message(self, step: Dict[str, Any]) -> Dict[str, Any]:
+        intent = step.get("intent", "")
+        wanted = _story_entities(step)
+        text = (step.get("user") or "").strip()
+        entities: List[Dict[str, Any]] = []
+
+        if intent == "inform":
+            slot = self.slots.get("requested_slot") or next(
+                (s for s in APPLICANT_SLOTS if self.slots.get(s) is None), APPLICANT_SLOTS[0])
+            text = self._pick(self.phrasings.answers.get(slot, []), str(next(iter(wanted.values()), "")))
+            value = parse_number(text)
+            entity = next(iter(wanted), None) or _mapped_entity(self.domain, slot)
+            if value is not None and entity:
+                entities.append(_entity(entity, value, 0, len(text), "DucklingEntityExtractor"))
+        elif intent == "card_recommendation":
+            text = self._pick(self.phrasings.requests, text or "recommend me a card")
+        elif intent in ("ask_card_details", "ask_specific_feature"):
+            text, entities = self._question(intent, wanted)
+        elif intent == "goodbye" and not text:
+            text = self._pick(self.phrasings.endings, "bye")
+        return {"text": text or intent, "intent": {"name": intent, "confidence": 1.0}, "entities": entities,
+                "intent_ranking": [{"name": intent, "confidence": 1.0}]}
+
+    def _question(self, intent: str, wanted: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+        by_name = "card_name" in wanted
+        want_feature = intent == "ask_specific_feature"
+        candidates = [q for q in self.phrasings.questions
+                      if (CARD_PLACEHOLDER in q) == by_name
+                      and (by_name or ORDINAL_PATTERN.search(q))
+                      and (self.features.find(q.replace(CARD_PLACEHOLDER, "")) is not None) == want_feature]
+        text = self._pick(candidates, "Tell me more about the first one.")
+
+        entities = []
+        if CARD_PLACEHOLDER in text:
+            names = self.slots.get("recommended_cards_list") or [wanted.get("card_name") or "Chase Sapphire Preferred®"]
+            name = str(names[self.rng.integers(len(names))])
+            start = text.index(CARD_PLACEHOLDER)
+            text = text.replace(CARD_PLACEHOLDER, name)
+            entities.append(_entity("card_name", name, start, start + len(name), "DIETClassifier"))
+        ordinal = ORDINAL_PATTERN.search(text)
+        if ordinal and not by_name:
+            entities.append(_entity("ordinal_reference", ordinal.group(1).lower(), ordinal.start(), ordinal.end(),
+                                    "DIETClassifier"))
+        feature = self.features.find(text)
+        if feature is not None and want_feature:
+            entities.append(_entity("card_feature", feature[0], feature[1], feature[2], "DIETClassifier"))
+        return text, entities
+
+    def payload(self, action: str) -> Dict[str, Any]:
+        return {
+            "next_action": action,
+            "sender_id": self.sender_id,
+            "tracker": {
+                "sender_id": self.sender_id,
+                "slots": dict(self.slots),
+                "latest_message": self.latest_message,
+                "latest_event_time": time.time(),
+                "followup_action": None,
+                "paused": False,
+                "events": self.events,
+                "latest_input_channel": "rest",
+                "active_loop": self.active_loop,
+                "latest_action": {"action_name": self.latest_action_name},
+                "latest_action_name": self.latest_action_name,
+            },
+            "domain": self.domain,
+            "version": RASA_VERSION,
+        }
+
+    def apply(self, response: Dict[str, Any]) -> None:
+        for event in response.get("events", []):
+            self.events.append(event)
+            if event.get("event") == "slot":
+                self.slots[event["name"]] = event.get("value")
+                self._response_slots.add(event["name"])
+
+    def turns(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Walks the story, yielding (action, payload) for every step the
+        action server handles. The caller sends it and passes the parsed
+        response to apply() before resuming.
+        """
+        steps = self.story["steps"]
+        uses_form = any(step.get("action") in self.domain.get("forms", {}) for step in steps)
+        if not uses_form:
+            self._fill_applicant_slots()
+        set_this_turn: set = set()
+        # An answer the active form hasn't had validated yet.
+        unvalidated = False
+
+        for step in steps:
+            if "intent" in step:
+                self.latest_message = self._user_message(step)
+                self.events.append({"event": "user", "timestamp": time.time(), "text": self.latest_message["text"],
+                                    "parse_data": self.latest_message})
+                set_this_turn = set()
+                unvalidated = step["intent"] == "inform" and bool(self.active_loop)
+                if step["intent"] == "inform":
+                    for entity in self.latest_message["entities"]:
+                        slot = self.slots.get("requested_slot")
+                        if slot:
+                            self._set_slot(slot, entity["value"])
+                            set_this_turn.add(slot)
+            elif "action" in step:
+                action = step["action"]
+                validator = f"validate_{action}"
+                if (unvalidated and action == self.active_loop.get("name")
+                        and validator in self.server_actions):
+                    # The form runs its validation action before picking the next question.
+                    unvalidated = False
+                    self._response_slots = set()
+                    yield validator, self.payload(validator)
+                    set_this_turn |= self._response_slots
+                if action in self.server_actions:
+                    self._response_slots = set()
+                    yield action, self.payload(action)
+                    set_this_turn |= self._response_slots
+                self.events.append({"event": "action", "timestamp": time.time(), "name": action})
+                self.latest_action_name = action
+            elif "active_loop" in step:
+                name = step["active_loop"]
+                self.active_loop = {"name": name} if name else {}
+                self.events.append({"event": "active_loop", "timestamp": time.time(), "name": name})
+            elif "slot_was_set" in step:
+                for item in step["slot_was_set"] or []:
+                    for name, value in (item.items() if isinstance(item, dict) else [(item, None)]):
+                        # Values the replay produced itself win over the story's examples.
+                        if name not in set_this_turn:
+                            self._set_slot(name, value)
+
+
+def _mapped_entity(domain: Dict[str, Any], slot: str) -> Optional[str]:
+    for mapping in domain.get("slots", {}).get(slot, {}).get("mappings", []):
+        if mapping.get("type") == "from_entity":
+            return mapping.get("entity")
+    return None
+
+
+class WebhookClient:
+    """Minimal keep-alive HTTP/1.1 JSON client on asyncio streams, one connection per virtual user."""
+
+    def __init__(self, host: str, port: int, path: str, timeout: float):
+        self.host, self.port, self.path, self.timeout = host, port, path, timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+            self._reader = self._writer = None
+
+    async def post(self, body: bytes) -> Tuple[int, bytes]:
+        for attempt in (0, 1):
+            if self._writer is None:
+                await self._connect()
+            try:
+                return await asyncio.wait_for(self._exchange(body), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server closed an idle keep-alive connection; retry once on a fresh one.
+                await self.close()
+                if attempt:
+                    raise
+            except BaseException:
+                await self.close()
+                raise
+        raise ConnectionError("unreachable")
+
+    async def _exchange(self, body: bytes) -> Tuple[int, bytes]:
+        head = (f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode()
+        self._writer.write(head + body)
+        await self._writer.drain()
+        status_line = await self._reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            payload = b""
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                payload += chunk[:-2]
+        else:
+            payload = await self._reader.readexactly(int(headers.get("content-length", "0")))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, payload
+
+
+class LoadRun:
+    """Latencies and outcomes of one load level."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.busy: Dict[str, int] = {}
+        self.conversations = 0
+        self.dropped = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        actions = {}
+        for action in sorted(set(self.latencies) | set(self.errors)):
+            samples = np.asarray(self.latencies.get(action, [])) * 1000
+            actions[action] = {
+                "requests": int(samples.size),
+                "errors": self.errors.get(action, 0),
+                "busy": self.busy.get(action, 0),
+                "p50_ms": float(np.percentile(samples, 50)) if samples.size else None,
+                "p95_ms": float(np.percentile(samples, 95)) if samples.size else None,
+                "p99_ms": float(np.percentile(samples, 99)) if samples.size else None,
+                "max_ms": float(samples.max()) if samples.size else None,
+            }
+        requests = sum(a["requests"] for a in actions.values())
+        return {
+            "label": self.label,
+            "seconds": self.elapsed,
+            "conversations": self.conversations,
+            "dropped": self.dropped,
+            "requests": requests,
+            "requests_per_s": requests / self.elapsed if self.elapsed else 0.0,
+            "actions": actions,
+        }
+
+
+class LoadGenerator:
+    def __init__(self, url: str, stories: List[Dict[str, Any]], domain: Dict[str, Any], server_actions: set,
+                 phrasings: Phrasings, features: FeatureMatcher, timeout: float = 30.0,
+                 think_time: float = 0.0, seed: int = 0):
+        parts = urlsplit(url)
+        self.host, self.port, self.path = parts.hostname or "localhost", parts.port or 80, parts.path or "/webhook"
+        self.domain = domain
+        self.server_actions = server_actions
+        self.phrasings = phrasings
+        self.features = features
+        self.timeout = timeout
+        self.think_time = think_time
+        self.rng = np.random.default_rng(seed)
+        self.stories = [s for s in stories if any(step.get("action") in server_actions for step in s["steps"])]
+        self.skipped = [s for s in stories if s not in self.stories]
+        self._conversation_ids = 0
+        if not self.stories:
+            raise ValueError("None of the stories calls an action the action server registers.")
+
+    def _conversation(self) -> Conversation:
+        self._conversation_ids += 1
+        story = self.stories[self.rng.integers(len(self.stories))]
+        return Conversation(story, f"load-{os.getpid()}-{self._conversation_ids}", self.domain, self.server_actions,
+                            self.phrasings, self.features, np.random.default_rng(self.rng.integers(1 << 32)))
+
+    async def _replay(self, client: WebhookClient, run: LoadRun) -> None:
+        conversation = self._conversation()
+        for action, payload in conversation.turns():
+            body = json.dumps(payload).encode("utf-8")
+            start = time.perf_counter()
+            try:
+                status, raw = await client.post(body)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                run.errors[action] = run.errors.get(action, 0) + 1
+                logger.debug(f"{action} failed: {e!r}")
+                return
+            run.latencies.setdefault(action, []).append(time.perf_counter() - start)
+            if status != 200:
+                run.errors[action] = run.errors.get(action, 0) + 1
+                logger.debug(f"{action} returned HTTP {status}: {raw[:200]!r}")
+                return
+            response = json.loads(raw)
+            if logger.isEnabledFor(logging.DEBUG):
+                texts = [r.get("text") for r in response.get("responses", [])]
+                logger.debug(f"{conversation.sender_id} {action} <- {conversation.latest_message['text']!r}: {texts}")
+            if any("longer than usual" in (r.get("text") or "") for r in response.get("responses", [])):
+                run.busy[action] = run.busy.get(action, 0) + 1
+            conversation.apply(response)
+            if self.think_time:
+                await asyncio.sleep(self.rng.exponential(self.think_time))
+        run.conversations += 1
+
+    async def closed_loop(self, concurrency: int, duration: float) -> LoadRun:
+        """`concurrency` users, each replaying conversations back to back until `duration` is up."""
+        run = LoadRun(f"concurrency={concurrency}")
+        deadline = time.perf_counter() + duration
+
+        async def user():
+            client = WebhookClient(self.host, self.port, self.path, self.timeout)
+            try:
+                while time.perf_counter() < deadline:
+                    await self._replay(client, run)
+            finally:
+                await client.close()
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        run.elapsed = time.perf_counter() - run.started
+        return run
+
+    async def open_loop(self, rate: float, max_in_flight: int, duration: float) -> LoadRun:
+        """Conversations arriving at `rate` per second on average, at most `max_in_flight` at once."""
+        run = LoadRun(f"rate={rate:g}/s max={max_in_flight}")
+        deadline = time.perf_counter() + duration
+        idle: List[WebhookClient] = []
+        tasks = set()
+
+        async def conversation():
+            client = idle.pop() if idle else WebhookClient(self.host, self.port, self.path, self.timeout)
+            try:
+                await self._replay(client, run)
+            finally:
+                idle.append(client)
+
+        next_start = time.perf_counter()
+        while next_start < deadline:
+            await asyncio.sleep(max(0.0, next_start - time.perf_counter()))
+            if len(tasks) >= max_in_flight:
+                run.dropped += 1
+            else:
+                task = asyncio.ensure_future(conversation())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_start += self.rng.exponential(1.0 / rate)
+        if tasks:
+            await asyncio.gather(*tasks)
+        for client in idle:
+            await client.close()
+        run.elapsed = time.perf_counter() - run.started
+        return run
+
+
+def fetch_server_actions(url: str) -> set:
+    """Action names the server registers, from GET /actions next to the webhook."""
+    actions_url = url.rsplit("/", 1)[0] + "/actions"
+    try:
+        with urllib.request.urlopen(actions_url, timeout=10) as response:
+            return {entry["name"] for entry in json.load(response)}
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not list actions at {actions_url} ({e}); assuming every action_* step is custom.")
+        return set()
+
+
+def wait_for_server(url: str, timeout: float) -> bool:
+    health_url = url.rsplit("/", 1)[0] + "/health"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(health_url, timeout=2):
+                return True
+        except (OSError, urllib.error.URLError):
+            time.sleep(0.5)
+    return False
+
+
+def start_action_server(port: int, show_logs: bool = False) -> subprocess.Popen:
+    """`rasa run actions` without the Rasa package: the rasa_sdk action server on this project's actions."""
+    output = None if show_logs else subprocess.DEVNULL
+    return subprocess.Popen([sys.executable, "-m", "rasa_sdk", "--actions", "actions", "--port", str(port)],
+                            cwd=PROJECT_DIR, stdout=output, stderr=output)
+
+
+def format_report(summaries: List[Dict[str, Any]]) -> str:
+    header = (f"{'level':<24} {'action':<30} {'requests':>8} {'errors':>6} {'busy':>5} {'req/s':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    lines = [header, "-" * len(header)]
+    for summary in summaries:
+        for action, stats in summary["actions"].items():
+            rate = stats["requests"] / summary["seconds"] if summary["seconds"] else 0.0
+            cells = [f"{stats[k]:>8.1f}" if stats[k] is not None else f"{'-':>8}"
+                     for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+            lines.append(f"{summary['label']:<24} {action:<30} {stats['requests']:>8} {stats['errors']:>6} "
+                         f"{stats['busy']:>5} {rate:>8.1f} " + " ".join(cells))
+        dropped = f", {summary['dropped']} dropped" if summary["dropped"] else ""
+        lines.append(f"{summary['label']:<24} {'(all)':<30} {summary['requests']:>8} "
+                     f"{'':>6} {'':>5} {summary['requests_per_s']:>8.1f}   "
+                     f"{summary['conversations']} conversations in {summary['seconds']:.1f}s{dropped}")
+    return "\n".join(lines)
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay story conversations against the action server webhook.")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"action webhook (default {DEFAULT_URL})")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16],
+                        help="concurrent conversations per level, e.g. 1,8,32; with --rate, the in-flight cap")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="open loop: new conversations per second instead of back-to-back users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    parser.add_argument("--think-time", type=float, default=0.0,
+                        help="mean pause in seconds between a conversation's turns")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--stories", type=Path, action="append", default=None,
+                        help=f"story files (default: {', '.join(str(p.relative_to(PROJECT_DIR)) for p in STORY_FILES)})")
+    parser.add_argument("--start-server", action="store_true",
+                        help="start a local action server on the webhook's port for the run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(levelname)s %(message)s")
+
+    server = None
+    if args.start_server:
+        port = urlsplit(args.url).port or 5055
+        server = start_action_server(port, args.verbose)
+        logger.info(f"Starting the action server on port {port} ...")
+    try:
+        if not wait_for_server(args.url, 90 if server else 5):
+            hint = "See its output with -v." if server else "Start one with `rasa run actions` or pass --start-server."
+            logger.error(f"No action server answering at {args.url}. {hint}")
+            return 1
+
+        domain = yaml.safe_load(DOMAIN_FILE.read_text(encoding="utf-8"))
+        server_actions = fetch_server_actions(args.url) or {
+            step["action"] for story in load_stories(args.stories or STORY_FILES) for step in story["steps"]
+            if str(step.get("action", "")).startswith(("action_", "validate_")) and step["action"] != "action_listen"
+        } | {f"validate_{form}" for form in domain.get("forms") or {}}
+        generator = LoadGenerator(args.url, load_stories(args.stories or STORY_FILES), domain, server_actions,
+                                  Phrasings.load(), FeatureMatcher.load(), args.timeout, args.think_time, args.seed)
+        for story in generator.skipped:
+            logger.info(f"Story '{story['story']}' ({story['source']}) calls no custom action; not replayed.")
+        logger.info(f"Replaying {len(generator.stories)} stories against {args.url} "
+                    f"(actions: {', '.join(sorted(server_actions))})")
+
+        summaries = []
+        for level in args.concurrency:
+            if args.rate:
+                run = asyncio.run(generator.open_loop(args.rate, level, args.duration))
+            else:
+                run = asyncio.run(generator.closed_loop(level, args.duration))
+            summaries.append(run.summary())
+            logger.info(f"{run.label}: {summaries[-1]['requests_per_s']:.1f} requests/s")
+        print(format_report(summaries))
+        if args.json:
+            args.json.write_text(json.dumps({"url": args.url, "rate": args.rate, "duration": args.duration,
+                                             "levels": summaries}, indent=1))
+        return 0 if all(not s["actions"] or s["requests"] for s in summaries) else 1
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
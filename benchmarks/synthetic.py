@@ -0,0 +1,155 @@
+# benchmarks/synthetic.py
+"""
+Synthetic fixtures for the benchmarks: card catalogues of any size with the
+cards_catalogue.csv columns, random-forest models of any size trained on
+made-up applicants, and trackers shaped like the ones Rasa sends.
+"""
+
+import json
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from rasa_sdk import Tracker
+from sklearn.ensemble import RandomForestClassifier
+
+from actions import predict
+from actions.catalogue import catalogue_store
+from actions.compiled_catalogue import compile_catalogue, compiled_path_for
+from actions.feature_resolver import FEATURE_COLUMNS
+from actions.model_registry import ModelBundle, model_registry
+
+# Column order of data/cards_catalogue.csv.
+CATALOGUE_COLUMNS = [
+    "card_name", "issuer", "annual_fee", "apr_min", "apr_max", "min_credit_score", "min_income",
+    "rewards_score", "rewards_type", "rewards_details", "signup_bonus_details", "foreign_transaction_fee",
+    "travel_insurance_details", "intro_apr_purchase_details", "intro_apr_bt_details",
+    "application_link_placeholder",
+]
+INPUT_COLS = ["annual_inc", "fico_high", "dti", "emp_length_num", "inc_missing", "fico_missing"]
+
+ISSUERS = ["Chase", "Citi", "American Express", "Capital One", "Discover", "Wells Fargo", "U.S. Bank", "Bank of America"]
+PRODUCTS = ["Sapphire", "Freedom", "Double Cash", "Quicksilver", "Venture", "Active Cash", "Altitude", "Platinum",
+            "Gold", "Customized Cash", "Savor", "Bonvoy", "SkyMiles", "Secured", "Student"]
+TIERS = ["", "Preferred", "Reserve", "Plus", "Flex", "Rewards", "Signature"]
+
+# Feature phrases as users type them: mapping keys, reorderings, typos and
+# phrases that match nothing.
+FEATURE_PHRASES = list(FEATURE_COLUMNS) + [
+    "fee annual", "forigen transaciton fee", "signup bonsu", "trvel insurance", "intro APR for purchases",
+    "what's the interest", "lounge access", "credit limit", "rewards rate on groceries", "score",
+]
+
+
+def make_catalogue(n_cards: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    issuer = rng.choice(ISSUERS, n_cards)
+    names = [f"{i} {p} {t}".replace("  ", " ").strip() + f" {n}"
+             for n, (i, p, t) in enumerate(zip(issuer, rng.choice(PRODUCTS, n_cards), rng.choice(TIERS, n_cards)))]
+    apr_min = rng.uniform(15, 22, n_cards).round(2)
+    has_bonus = rng.random(n_cards) < 0.6
+    return pd.DataFrame({
+        "card_name": names,
+        "issuer": issuer,
+        "annual_fee": rng.choice([0, 0, 0, 39, 95, 250, 550, 695], n_cards).astype(float),
+        "apr_min": apr_min,
+        "apr_max": np.where(rng.random(n_cards) < 0.1, apr_min, (apr_min + rng.uniform(0, 8, n_cards)).round(2)),
+        "min_credit_score": rng.choice([0, 580, 620, 670, 700, 740], n_cards),
+        "min_income": rng.choice([0, 15000, 20000, 40000, 60000, 100000], n_cards),
+        "rewards_score": rng.uniform(0.5, 10, n_cards).round(2),
+        "rewards_type": rng.choice(["Points", "Cash Back", "Miles", "None"], n_cards),
+        "rewards_details": [f"Earn {k}x points on dining and travel" for k in rng.integers(1, 6, n_cards)],
+        "signup_bonus_details": np.where(has_bonus, [f"{b:,} bonus points after spending $4,000" for b in
+                                                     rng.integers(1, 10, n_cards) * 10000], None),
+        "foreign_transaction_fee": rng.choice([0.0, 0.0, 3.0], n_cards),
+        "travel_insurance_details": np.where(rng.random(n_cards) < 0.5, "Trip cancellation up to $10,000", None),
+        "intro_apr_purchase_details": np.where(rng.random(n_cards) < 0.4, "0% for 15 months", None),
+        "intro_apr_bt_details": np.where(rng.random(n_cards) < 0.3, "0% for 18 months", None),
+        "application_link_placeholder": [f"https://example.com/apply/{n}" for n in range(n_cards)],
+    }, columns=CATALOGUE_COLUMNS)
+
+
+def make_applicants(n: int, seed: int = 0) -> np.ndarray:
+    """N x INPUT_COLS applicants in the ranges the form accepts."""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.lognormal(11, 0.6, n).round(-2),
+        rng.integers(520, 851, n).astype(float),
+        rng.uniform(0, 45, n).round(1),
+        rng.integers(0, 11, n).astype(float),
+        np.zeros(n),
+        np.zeros(n),
+    ])
+
+
+def make_model(n_trees: int, max_depth: Optional[int] = None, n_rows: int = 20_000,
+               seed: int = 0) -> RandomForestClassifier:
+    X = make_applicants(n_rows, seed)
+    rng = np.random.default_rng(seed + 1)
+    logit = (X[:, 1] - 680) / 40 - (X[:, 2] - 20) / 10 + np.log(X[:, 0] / 60000) + X[:, 3] / 10
+    y = (rng.random(n_rows) < 1 / (1 + np.exp(-logit))).astype(int)
+    return RandomForestClassifier(n_estimators=n_trees, max_depth=max_depth, random_state=seed).fit(X, y)
+
+
+def make_tracker(slots: Dict[str, Any], entities: Optional[List[Dict[str, Any]]] = None,
+                 text: str = "") -> Tracker:
+    latest_message = {"entities": entities or [], "intent": {}, "text": text}
+    return Tracker("bench", slots, latest_message, [], False, None, {}, "action_listen")
+
+
+@contextmanager
+def synthetic_environment(n_cards: int, n_trees: int, max_depth: Optional[int] = None,
+                          engine: str = "compiled", workdir: Optional[Path] = None,
+                          seed: int = 0, catalogue: str = "csv") -> Iterator[ModelBundle]:
+    """
+    Point the action code at a synthetic catalogue and model for the
+    duration of the block, then restore the real ones. Yields the installed
+    model bundle. catalogue="compiled" serves the catalogue from a compiled
+    file instead of the CSV.
+    """
+    with tempfile.TemporaryDirectory(prefix="card-bench-") as tmp:
+        workdir = Path(workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        catalogue_path = workdir / f"cards_{n_cards}.csv"
+        if not catalogue_path.exists():
+            make_catalogue(n_cards, seed).to_csv(catalogue_path, index=False)
+        compiled_path = compiled_path_for(catalogue_path)
+        if catalogue == "compiled" and not compiled_path.exists():
+            compile_catalogue(catalogue_path, compiled_path)
+        elif catalogue == "csv" and compiled_path.exists():
+            compiled_path.unlink()
+        depth = "none" if max_depth is None else max_depth
+        model_path = workdir / f"model_t{n_trees}_d{depth}.pkl"
+        if not model_path.exists():
+            joblib.dump(make_model(n_trees, max_depth, seed=seed), model_path)
+        schema_path = workdir / "schema.json"
+        schema_path.write_text(json.dumps({"input_cols": INPUT_COLS}))
+
+        bundle = ModelBundle(f"bench-t{n_trees}-d{depth}", model_path, schema_path,
+                             compiled_dir=workdir / ".compiled").load()
+        if engine == "sklearn":
+            bundle.engine = None
+        elif bundle.engine is None:
+            raise RuntimeError("The synthetic model could not be compiled.")
+
+        saved_store = (catalogue_store.path, catalogue_store.check_interval, catalogue_store._snapshot)
+        saved_registry = (model_registry._live, model_registry._next_check)
+        try:
+            catalogue_store.path = catalogue_path
+            catalogue_store.check_interval = float("inf")
+            catalogue_store.reload()
+            model_registry._live = bundle
+            model_registry._next_check = float("inf")
+            predict.probability_cache.clear()
+            predict.ranking_cache.clear()
+            yield bundle
+        finally:
+            catalogue_store.path, catalogue_store.check_interval, catalogue_store._snapshot = saved_store
+            catalogue_store._next_check = 0.0
+            model_registry._live, model_registry._next_check = saved_registry
+            predict.probability_cache.clear()
+            predict.ranking_cache.clear()
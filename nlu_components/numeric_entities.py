@@ -0,0 +1,220 @@
+# nlu_components/numeric_entities.py
+"""
+In-process parser for the four Duckling dimensions the card form uses:
+number, amount-of-money, percentage and duration.
+
+parse() returns matches shaped like the response of Duckling's /parse
+endpoint (dim, body, start, end, value), so they convert to Rasa entities
+exactly as DucklingEntityExtractor converts Duckling's. As in Duckling, a
+match lying inside a longer one is dropped, so "$85k" is only an amount
+of money and "4 years" only a duration.
+
+Deliberately narrower than Duckling:
+- "one" on its own is not a number; in this bot it is nearly always a
+  pronoun ("the first one").
+- "a year" or "an hour" is not a duration; only numbers with a unit are.
+- Fractional durations keep their unit ("1.5 years" is 1.5 years, not
+  18 months).
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+NUMBER = "number"
+AMOUNT_OF_MONEY = "amount-of-money"
+PERCENTAGE = "percentage"
+DURATION = "duration"
+DIMENSIONS = (NUMBER, AMOUNT_OF_MONEY, PERCENTAGE, DURATION)
+
+_UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+_TENS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90}
+_SCALES = {"hundred": 100, "thousand": 1_000, "million": 1_000_000, "billion": 1_000_000_000}
+# Magnitude suffixes written straight after the digits ("85k", "1.2m").
+_SUFFIXES = {"k": 1_000, "m": 1_000_000, "mm": 1_000_000, "b": 1_000_000_000, "bn": 1_000_000_000}
+
+_CURRENCIES = {
+    "$": "$", "dollar": "$", "dollars": "$", "buck": "$", "bucks": "$", "grand": "$",
+    "us$": "USD", "usd": "USD",
+    "€": "EUR", "eur": "EUR", "euro": "EUR", "euros": "EUR",
+    "£": "GBP", "gbp": "GBP", "pound": "GBP", "pounds": "GBP",
+}
+_PREFIX_CURRENCIES = ("us$", "$", "€", "£", "usd", "eur", "gbp")
+
+# Duckling's duration grains and the seconds it normalises each one to.
+_GRAINS = {
+    "second": 1, "minute": 60, "hour": 3_600, "day": 86_400, "week": 604_800,
+    "month": 2_592_000, "quarter": 7_776_000, "year": 31_536_000,
+}
+_GRAIN_WORDS = {
+    "second": ("seconds", "second", "secs", "sec"),
+    "minute": ("minutes", "minute", "mins", "min"),
+    "hour": ("hours", "hour", "hrs", "hr"),
+    "day": ("days", "day"),
+    "week": ("weeks", "week", "wks", "wk"),
+    "month": ("months", "month", "mos", "mo"),
+    "quarter": ("quarters", "quarter", "qtrs", "qtr"),
+    "year": ("years", "year", "yrs", "yr"),
+}
+_GRAIN_OF = {word: grain for grain, words in _GRAIN_WORDS.items() for word in words}
+
+
+def _alternation(words: Iterable[str]) -> str:
+    # Longest first, so "mins" wins over "min".
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+_WORD = _alternation(list(_UNITS) + list(_TENS) + list(_SCALES))
+_DIGITS = r"-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|-?\.\d+"
+# A quantity: digits with an optional magnitude ("85k", "1.2 million"), or number words.
+_QUANTITY = (
+    rf"(?P<digits>{_DIGITS})(?:(?P<suffix>{_alternation(_SUFFIXES)})(?![a-z])|\s*(?P<scale>{_alternation(_SCALES)})\b)?"
+    rf"|(?P<words>\b(?:{_WORD})(?:(?:\s+and\s+|\s+|-)(?:{_WORD}))*\b)"
+)
+# Numbers may not be glued to letters or other digits on either side.
+_BEFORE = r"(?<![\w.,])"
+_AFTER = r"(?![\w%])(?!\.\d)(?!,\d)"
+
+_NUMBER_RE = re.compile(rf"{_BEFORE}(?:{_QUANTITY}){_AFTER}", re.IGNORECASE)
+_PERCENT_RE = re.compile(rf"{_BEFORE}(?:{_QUANTITY})\s*(?:%|percent\b|per\s+cent\b|pct\b)", re.IGNORECASE)
+_MONEY_PREFIX_RE = re.compile(
+    rf"(?<![\w$€£])(?P<currency>{_alternation(_PREFIX_CURRENCIES)})\s*(?:{_QUANTITY}){_AFTER}", re.IGNORECASE)
+_MONEY_SUFFIX_RE = re.compile(
+    rf"{_BEFORE}(?:{_QUANTITY})\s*(?P<currency>{_alternation(c for c in _CURRENCIES if c not in ('$', '€', '£', 'us$'))})\b",
+    re.IGNORECASE)
+_DURATION_RE = re.compile(rf"{_BEFORE}(?:{_QUANTITY})(?:\s*|-)(?P<grain>{_alternation(_GRAIN_OF)})\b", re.IGNORECASE)
+
+
+def _words_value(text: str) -> Optional[float]:
+    """The value of a run of English number words, or None if they don't form one number."""
+    total, current, last = 0, 0, None
+    for word in re.split(r"\s+and\s+|\s+|-", text.lower()):
+        if word in _UNITS:
+            if last in ("unit", "tens") and not (last == "tens" and _UNITS[word] < 10):
+                return None
+            current += _UNITS[word]
+            last = "unit"
+        elif word in _TENS:
+            if last in ("unit", "tens"):
+                return None
+            current += _TENS[word]
+            last = "tens"
+        elif word == "hundred":
+            current = (current or 1) * 100
+            last = "scale"
+        else:
+            total += (current or 1) * _SCALES[word]
+            current = 0
+            last = "scale"
+    return float(total + current)
+
+
+def _quantity(match: "re.Match", standalone: bool = False) -> Optional[float]:
+    digits = match.group("digits")
+    if digits is not None:
+        value = float(digits.replace(",", ""))
+        suffix, scale = match.group("suffix"), match.group("scale")
+        if suffix:
+            value *= _SUFFIXES[suffix.lower()]
+        elif scale:
+            value *= _SCALES[scale.lower()]
+        return value
+    words = match.group("words")
+    if standalone and words.lower() == "one":
+        return None
+    return _words_value(words)
+
+
+def _json_number(value: float):
+    """Whole values as ints, the way they come back from Duckling's JSON."""
+    return int(value) if value.is_integer() else value
+
+
+class NumericEntityParser:
+    """
+    Finds numbers, amounts of money, percentages and durations in a
+    message. Patterns are compiled once at import; one parser can be
+    shared by any number of threads.
+    """
+
+    def __init__(self, dimensions: Optional[Sequence[str]] = None):
+        dimensions = DIMENSIONS if not dimensions else tuple(dimensions)
+        unknown = [d for d in dimensions if d not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unsupported dimensions {unknown}; expected some of {list(DIMENSIONS)}")
+        self.dimensions = dimensions
+
+    def parse(self, text: str) -> List[Dict[str, Any]]:
+        """Matches in Duckling's /parse format, in order of position."""
+        if not text or not any(c.isdigit() for c in text) and not _NUMBER_RE.search(text):
+            return []
+        candidates: List[Tuple[int, int, str, Dict[str, Any]]] = []
+        wanted = self.dimensions
+
+        if AMOUNT_OF_MONEY in wanted:
+            for pattern in (_MONEY_PREFIX_RE, _MONEY_SUFFIX_RE):
+                for m in pattern.finditer(text):
+                    value = _quantity(m)
+                    if value is None:
+                        continue
+                    currency = m.group("currency").lower()
+                    if currency == "grand":
+                        value *= 1_000
+                    candidates.append((m.start(), m.end(), AMOUNT_OF_MONEY,
+                                       {"value": _json_number(value), "type": "value", "unit": _CURRENCIES[currency]}))
+        if PERCENTAGE in wanted:
+            for m in _PERCENT_RE.finditer(text):
+                value = _quantity(m)
+                if value is not None:
+                    candidates.append((m.start(), m.end(), PERCENTAGE, {"value": _json_number(value), "type": "value"}))
+        if DURATION in wanted:
+            for m in _DURATION_RE.finditer(text):
+                value = _quantity(m)
+                if value is None:
+                    continue
+                grain = _GRAIN_OF[m.group("grain").lower()]
+                candidates.append((m.start(), m.end(), DURATION, {
+                    "value": _json_number(value), grain: _json_number(value), "type": "value", "unit": grain,
+                    "normalized": {"value": _json_number(value * _GRAINS[grain]), "unit": "second"},
+                }))
+        # Numbers are always found: a number inside a longer match is what
+        # keeps the digits of "$85k" from also filling a number slot.
+        for m in _NUMBER_RE.finditer(text):
+            value = _quantity(m, standalone=True)
+            if value is not None:
+                candidates.append((m.start(), m.end(), NUMBER, {"value": _json_number(value), "type": "value"}))
+
+        matches = []
+        for start, end, dim, value in candidates:
+            if dim not in wanted:
+                continue
+            if any(s <= start and end <= e and (e - s) > (end - start) for s, e, _, _ in candidates):
+                continue
+            matches.append({"dim": dim, "body": text[start:end], "start": start, "end": end,
+                            "value": value, "latent": False})
+        matches.sort(key=lambda match: (match["start"], -match["end"]))
+        return matches
+
+
+def rasa_value(match: Dict[str, Any]) -> Any:
+    """The entity value DucklingEntityExtractor takes from a match."""
+    value = match["value"]
+    if value.get("type") == "interval":
+        return {"to": value.get("to", {}).get("value"), "from": value.get("from", {}).get("value")}
+    return value.get("value")
+
+
+def to_rasa_entities(matches: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rasa entity dicts for parse() matches, with the fields DucklingEntityExtractor sets."""
+    return [{
+        "start": match["start"],
+        "end": match["end"],
+        "text": match["body"],
+        "value": rasa_value(match),
+        "confidence": 1.0,
+        "additional_info": match["value"],
+        "entity": match["dim"],
+    } for match in matches]
@@ -0,0 +1,45 @@
+# tests/conftest.py
+"""
+Shared fixtures: the synthetic catalogues and models from
+benchmarks/synthetic.py, small enough to build in a fraction of a second.
+Run from the project root with `python -m pytest tests`.
+"""
+
+import numpy as np
+import pytest
+
+from actions.catalogue import catalogue_store
+from benchmarks.synthetic import make_catalogue, synthetic_environment
+
+
+@pytest.fixture(scope="session")
+def workdir(tmp_path_factory):
+    # The model pickle is reused by every test that installs the environment.
+    return tmp_path_factory.mktemp("card-tests")
+
+
+@pytest.fixture
+def catalogue_csv(tmp_path):
+    path = tmp_path / "cards_catalogue.csv"
+    make_catalogue(60, seed=3).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def environment(workdir):
+    """Point the actions at a 300-card catalogue and a 10-tree model; yields the model bundle."""
+    with synthetic_environment(n_cards=300, n_trees=10, max_depth=8, workdir=workdir) as bundle:
+        yield bundle
+
+
+@pytest.fixture
+def tied_catalogue(environment, tmp_path, monkeypatch):
+    """Whole-number rewards and few fees, so most utilities tie; some cards lack a rewards score."""
+    cards = make_catalogue(300, seed=21)
+    cards["rewards_score"] = cards["rewards_score"].round(0)
+    cards.loc[cards.index % 17 == 0, "rewards_score"] = np.nan
+    path = tmp_path / "tied_cards.csv"
+    cards.to_csv(path, index=False)
+    monkeypatch.setattr(catalogue_store, "path", path)
+    catalogue_store.reload()
+    return cards
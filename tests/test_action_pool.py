@@ -0,0 +1,114 @@
+# tests/test_action_pool.py
+
+import asyncio
+import threading
+import time
+
+import pytest
+from rasa_sdk import Tracker
+from rasa_sdk.executor import CollectingDispatcher
+
+from actions import action_pool as pool_module
+from actions.action_pool import BUSY_MESSAGE, ActionPool, PoolBusy, RankBatcher
+from actions.actions import ActionRecommendCard
+from actions.instrumentation import current_trace, metrics, traced
+
+SLOTS = {"annual_inc": 82000.0, "fico_high": 720.0, "dti": 14.0, "emp_length_num": 6.0}
+
+
+@traced("test_worker_call")
+def _traced_job(x):
+    current_trace().mark("work")
+    return x * 2
+
+
+def _failing_job():
+    raise ValueError("bad input")
+
+
+def _tracker(sender_id="pool-test", slots=SLOTS):
+    return Tracker(sender_id, dict(slots), {"entities": []}, [], False, None, {}, None)
+
+
+def test_full_queue_turns_calls_away():
+    pool = ActionPool(kind="thread", workers=1, max_in_flight=1, max_waiting=1, timeout=10)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.call("t", release.wait))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.ensure_future(pool.call("t", lambda: "second"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolBusy):
+            await pool.call("t", lambda: "third")
+        release.set()
+        return await running, await waiting
+
+    assert asyncio.run(scenario()) == (True, "second")
+    assert pool.rejected == 1 and pool.in_flight == 0 and pool.waiting == 0
+    pool.shutdown()
+
+
+def test_timed_out_call_keeps_its_slot_until_the_worker_finishes():
+    pool = ActionPool(kind="thread", workers=1, max_in_flight=1, max_waiting=4, timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.call("slow", time.sleep, 0.3)
+        assert pool.in_flight == 1
+        # Waits for the slot the slow call still holds, and runs out of time there.
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.call("next", lambda: "late")
+        await asyncio.sleep(0.4)
+        assert pool.in_flight == 0
+        return await pool.call("next", lambda: "on time")
+
+    assert asyncio.run(scenario()) == "on time"
+    assert pool.timeouts == 2 and "next" in pool.wait_seconds
+    pool.shutdown()
+
+
+def test_process_workers_forward_metrics_and_errors():
+    pool = ActionPool(kind="process", workers=1, timeout=30)
+    before = metrics.calls["test_worker_call"].count if "test_worker_call" in metrics.calls else 0
+
+    async def scenario():
+        result = await pool.call("double", _traced_job, 21)
+        with pytest.raises(ValueError, match="bad input"):
+            await pool.call("fail", _failing_job)
+        return result
+
+    try:
+        assert asyncio.run(scenario()) == 42
+    finally:
+        pool.shutdown()
+    assert metrics.calls["test_worker_call"].count == before + 1
+    assert ("test_worker_call", "work") in metrics.stages
+
+
+def test_busy_pool_answers_with_the_busy_message(monkeypatch):
+    async def busy(*args, **kwargs):
+        raise PoolBusy("full")
+
+    monkeypatch.setattr(pool_module.action_pool, "call", busy)
+    dispatcher = CollectingDispatcher()
+    events = asyncio.run(ActionRecommendCard().run(dispatcher, _tracker(), {}))
+    assert events == [] and dispatcher.messages[0]["text"] == BUSY_MESSAGE
+
+
+def test_batched_recommendation_is_traced(environment, monkeypatch):
+    batcher = RankBatcher(pool_module.action_pool, window=0.002)
+    monkeypatch.setattr(pool_module, "rank_batcher", batcher)
+    monkeypatch.setattr("actions.actions.rank_batcher", batcher)
+    before = metrics.calls["action_recommend_card"].count if "action_recommend_card" in metrics.calls else 0
+
+    async def scenario():
+        return await asyncio.gather(*(ActionRecommendCard().run(CollectingDispatcher(), _tracker(f"b{i}"), {})
+                                      for i in range(3)))
+
+    results = asyncio.run(scenario())
+    assert all(any(e.get("name") == "recommended_cards_list" and e.get("value") for e in events)
+               for events in results)
+    assert batcher.batches == 1 and batcher.batched_calls == 3
+    assert metrics.calls["action_recommend_card"].count == before + 3
+    assert ("action_recommend_card", "rank_cards") in metrics.stages
@@ -0,0 +1,115 @@
+# tests/test_batch_score.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from actions import batch_score, predict
+from benchmarks.synthetic import INPUT_COLS, make_applicants
+
+
+@pytest.fixture
+def applicants(tmp_path):
+    path = tmp_path / "applicants.csv"
+    pd.DataFrame(make_applicants(230, seed=4)[:, :4], columns=INPUT_COLS[:4]).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def in_process_workers(monkeypatch, environment):
+    # Threads see the synthetic model and catalogue the fixture installed.
+    monkeypatch.setattr(batch_score, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+
+def _interrupt_after(monkeypatch, n_chunks):
+    real_read = batch_score.read_chunks
+
+    def read_chunks(*args):
+        for i, chunk in enumerate(real_read(*args)):
+            if i == n_chunks:
+                raise KeyboardInterrupt
+            yield chunk
+
+    monkeypatch.setattr(batch_score, "read_chunks", read_chunks)
+
+
+def test_resumed_run_writes_the_same_output(applicants, tmp_path, monkeypatch):
+    complete = tmp_path / "complete.csv"
+    batch_score.run(applicants, complete, chunk_size=50, workers=1)
+
+    resumed = tmp_path / "resumed.csv"
+    _interrupt_after(monkeypatch, 3)
+    with pytest.raises(KeyboardInterrupt):
+        batch_score.run(applicants, resumed, chunk_size=50, workers=1)
+    monkeypatch.undo()
+    monkeypatch.setattr(batch_score, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+    report = batch_score.run(applicants, resumed, chunk_size=50, workers=1, resume=True)
+    assert 0 < report["rows"] < 230 and report["total_rows"] == 230
+    assert resumed.read_bytes() == complete.read_bytes()
+
+
+def test_resume_refuses_a_changed_input(applicants, tmp_path, monkeypatch):
+    output = tmp_path / "out.csv"
+    _interrupt_after(monkeypatch, 2)
+    with pytest.raises(KeyboardInterrupt):
+        batch_score.run(applicants, output, chunk_size=50, workers=1)
+    monkeypatch.undo()
+    monkeypatch.setattr(batch_score, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+    # Same size and mtime, different rows.
+    stat = os.stat(applicants)
+    text = applicants.read_text().splitlines(keepends=True)
+    applicants.write_text(text[0] + "".join(reversed(text[1:])))
+    os.utime(applicants, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    with pytest.raises(SystemExit, match="not the file"):
+        batch_score.run(applicants, output, chunk_size=50, workers=1, resume=True)
+
+
+def test_resume_refuses_different_settings(applicants, tmp_path):
+    output = tmp_path / "out.csv"
+    batch_score.run(applicants, output, chunk_size=50, workers=1)
+    with pytest.raises(SystemExit, match="different settings"):
+        batch_score.run(applicants, output, chunk_size=60, workers=1, resume=True)
+
+
+@pytest.mark.parametrize("output_state", ["deleted", "truncated"])
+def test_resume_refuses_a_missing_output(applicants, tmp_path, monkeypatch, output_state):
+    output = tmp_path / "out.csv"
+    _interrupt_after(monkeypatch, 2)
+    with pytest.raises(KeyboardInterrupt):
+        batch_score.run(applicants, output, chunk_size=50, workers=1)
+    monkeypatch.undo()
+    monkeypatch.setattr(batch_score, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+    if output_state == "deleted":
+        output.unlink()
+    else:
+        os.truncate(output, os.path.getsize(output) // 2)
+    with pytest.raises(SystemExit, match="missing or shorter"):
+        batch_score.run(applicants, output, chunk_size=50, workers=1, resume=True)
+
+
+def test_cli_recommends_what_the_action_does(applicants, tmp_path, tied_catalogue):
+    frame = pd.read_csv(applicants)
+    frame.loc[[5, 77], "dti"] = np.nan          # the form would not accept these
+    frame.to_csv(applicants, index=False)
+    output = tmp_path / "out.csv"
+    assert batch_score.main([str(applicants), str(output), "--top-n", "4", "--chunk-size", "40",
+                             "--workers", "2"]) == 0
+
+    scored = pd.read_csv(output)
+    assert scored["applicant_id"].tolist() == list(range(len(frame)))
+    for i, applicant in frame.iterrows():
+        row = scored.iloc[i]
+        if applicant.isna().any():
+            assert row.drop("applicant_id").isna().all()
+            continue
+        expected = predict.rank_cards({**applicant.to_dict(), **batch_score.MISSING_INDICATORS}, top_n=4)
+        cards = [row[f"card_{k}"] for k in range(1, 5) if isinstance(row[f"card_{k}"], str)]
+        assert cards == expected["card_name"].tolist(), f"applicant {i}"
+        np.testing.assert_allclose(row[[f"utility_{k}" for k in range(1, len(cards) + 1)]].to_numpy(float),
+                                   expected["utility"].to_numpy(), rtol=1e-5)
@@ -0,0 +1,66 @@
+# tests/test_card_responses.py
+
+import os
+
+import pytest
+
+from actions.card_responses import FEATURE_RESPONSE_COLUMNS, CardResponses
+from actions.catalogue import CatalogueSnapshot, CatalogueStore
+from benchmarks.synthetic import make_catalogue
+
+
+def _replies(responses, n_cards):
+    return [(responses.overview(pos), [responses.feature(pos, column).text("perks")
+                                       for column in FEATURE_RESPONSE_COLUMNS])
+            for pos in range(n_cards)]
+
+
+def test_replies_are_rendered_on_first_use_and_kept():
+    snapshot = CatalogueSnapshot(make_catalogue(30, seed=2), version=1)
+    responses = snapshot.responses
+    assert responses._cards == {}
+    first = responses.feature(4, "annual_fee")
+    assert list(responses._cards) == [4]
+    assert responses.feature(4, "annual_fee") is first
+
+
+def test_prerendered_replies_match_lazy_ones():
+    cards = make_catalogue(40, seed=3)
+    cards.loc[2, "annual_fee"] = float("nan")
+    lazy = CatalogueSnapshot(cards, version=1).responses
+    eager = CardResponses(CatalogueSnapshot(cards, version=1))
+    eager.prerender()
+    assert len(eager._cards) == 40
+    assert _replies(eager, 40) == _replies(lazy, 40)
+    assert eager.feature(2, "annual_fee").missing
+
+
+def test_large_catalogues_are_not_prerendered():
+    responses = CardResponses(CatalogueSnapshot(make_catalogue(30), version=1), prerender_max=10)
+    responses.prerender()
+    assert responses._cards == {}
+    assert "Annual Fee" in responses.overview(7)
+
+
+def test_rendering_errors_are_raised_on_lookup():
+    cards = make_catalogue(5, seed=1)
+    cards["annual_fee"] = cards["annual_fee"].astype(object)
+    cards.loc[1, "annual_fee"] = "varies"
+    responses = CatalogueSnapshot(cards, version=1).responses
+    responses.prerender()
+    with pytest.raises(ValueError):
+        responses.feature(1, "annual_fee")
+    assert responses.feature(0, "annual_fee").text("fee").startswith("The annual fee")
+
+
+def test_background_reload_prerenders_before_the_swap(catalogue_csv):
+    store = CatalogueStore(catalogue_csv, check_interval=0)
+    first = store.get()
+    assert first.responses._cards == {}
+    mtime = os.stat(catalogue_csv).st_mtime_ns + 10**9
+    make_catalogue(25, seed=4).to_csv(catalogue_csv, index=False)
+    os.utime(catalogue_csv, ns=(mtime, mtime))
+    store.get()
+    store.get()
+    store.wait_for_reload(10)
+    assert len(store.get().responses._cards) == 25
@@ -0,0 +1,110 @@
+# tests/test_catalogue.py
+
+import os
+
+import pandas as pd
+import pytest
+
+from actions import catalogue as catalogue_module
+from actions.catalogue import CatalogueSnapshot, CatalogueStore
+from benchmarks.synthetic import make_catalogue
+
+
+def _rewrite(path, cards: pd.DataFrame, mtime_ns: int) -> None:
+    cards.to_csv(path, index=False)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_name_lookups_match_frame_scans():
+    cards = make_catalogue(40, seed=1)
+    snapshot = CatalogueSnapshot(cards, version=1)
+    names = cards["card_name"].str.lower()
+    for name in cards["card_name"].sample(5, random_state=0):
+        assert snapshot.find_exact(name.upper()) == names.tolist().index(name.lower())
+    for query in ("chase", "gold", "ex 1", "zz"):
+        expected = [pos for pos, name in enumerate(names) if query in name]
+        assert snapshot.find_containing(query) == expected
+
+
+def test_first_load_is_synchronous_and_cached(catalogue_csv):
+    store = CatalogueStore(catalogue_csv, check_interval=60)
+    snapshot = store.get()
+    assert len(snapshot) == 60 and snapshot.load_error is None
+    assert store.get() is snapshot
+
+
+def test_changed_file_reloads_in_background_once_settled(catalogue_csv):
+    store = CatalogueStore(catalogue_csv, check_interval=0)
+    first = store.get()
+    stat = os.stat(catalogue_csv)
+    _rewrite(catalogue_csv, make_catalogue(25, seed=4), stat.st_mtime_ns + 10**9)
+
+    # First sighting of the new version: still settling, nothing reloads.
+    assert store.get() is first
+    assert store._reloader is None
+    # Unchanged at the next check: it is read off the request path.
+    assert store.get() is first
+    store.wait_for_reload(10)
+    reloaded = store.get()
+    assert reloaded is not first
+    assert len(reloaded) == 25
+
+
+def test_file_still_being_written_is_not_reloaded(catalogue_csv):
+    store = CatalogueStore(catalogue_csv, check_interval=0)
+    first = store.get()
+    mtime = os.stat(catalogue_csv).st_mtime_ns
+    for step in range(1, 4):
+        _rewrite(catalogue_csv, make_catalogue(20 + step, seed=step), mtime + step * 10**9)
+        assert store.get() is first
+    assert store._reloader is None
+
+
+def test_load_discarded_when_file_changes_while_reading(catalogue_csv, monkeypatch):
+    store = CatalogueStore(catalogue_csv, check_interval=0)
+    first = store.get()
+    mtime = os.stat(catalogue_csv).st_mtime_ns
+    _rewrite(catalogue_csv, make_catalogue(30, seed=5), mtime + 10**9)
+
+    real_read = catalogue_module.read_catalogue_csv
+
+    def read_then_append(path):
+        cards = real_read(path)
+        _rewrite(path, make_catalogue(31, seed=6), mtime + 2 * 10**9)
+        return cards
+
+    monkeypatch.setattr(catalogue_module, "read_catalogue_csv", read_then_append)
+    store.get()
+    store.get()
+    store.wait_for_reload(10)
+    assert store.get() is first
+
+
+def test_missing_file_keeps_last_good_copy(catalogue_csv):
+    store = CatalogueStore(catalogue_csv, check_interval=0)
+    first = store.get()
+    catalogue_csv.unlink()
+    assert store.get() is first
+    assert store.get() is first
+
+
+def test_missing_file_on_first_load_reports_error(tmp_path):
+    snapshot = CatalogueStore(tmp_path / "absent.csv").get()
+    assert snapshot.empty
+    assert isinstance(snapshot.load_error, OSError)
+
+
+def test_reload_forces_a_synchronous_read(catalogue_csv):
+    store = CatalogueStore(catalogue_csv, check_interval=float("inf"))
+    first = store.get()
+    make_catalogue(10, seed=7).to_csv(catalogue_csv, index=False)
+    assert store.get() is first
+    assert len(store.reload()) == 10
+
+
+@pytest.mark.parametrize("n_cards", [0, 5])
+def test_empty_or_small_catalogue_builds(tmp_path, n_cards):
+    path = tmp_path / "cards.csv"
+    make_catalogue(n_cards).to_csv(path, index=False)
+    snapshot = CatalogueStore(path).get()
+    assert len(snapshot) == n_cards
@@ -0,0 +1,99 @@
+# tests/test_compiled_catalogue.py
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from actions.catalogue import CatalogueStore
+from actions.compiled_catalogue import (_PREAMBLE, FORMAT_VERSION, INDEX_ARRAYS, CompiledCatalogue,
+                                        StaleCatalogue, compile_catalogue, read_catalogue_csv)
+from actions.eligibility import EligibilityIndex
+
+
+@pytest.fixture
+def compiled(catalogue_csv):
+    return compile_catalogue(catalogue_csv)
+
+
+def _patch(path, offset, data):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def test_compiled_copy_reads_like_the_csv(catalogue_csv, compiled):
+    cards = read_catalogue_csv(catalogue_csv)
+    catalogue = CompiledCatalogue.open(compiled, catalogue_csv)
+    pd.testing.assert_frame_equal(catalogue.to_frame(), cards)
+    positions = [17, 3, 42]
+    pd.testing.assert_frame_equal(catalogue.take(positions), cards.take(positions))
+    pd.testing.assert_series_equal(catalogue.row(5), cards.iloc[5])
+
+    index, expected = catalogue.eligibility_index(), EligibilityIndex.build(cards)
+    for name in INDEX_ARRAYS:
+        np.testing.assert_array_equal(getattr(index, name), getattr(expected, name))
+
+
+def test_corrupt_payload_fails_the_checksum(compiled):
+    size = os.path.getsize(compiled)
+    with open(compiled, "rb") as f:
+        f.seek(size - 1)
+        last = f.read(1)
+    _patch(compiled, size - 1, bytes([last[0] ^ 0xFF]))
+    with pytest.raises(StaleCatalogue, match="checksum"):
+        CompiledCatalogue.open(compiled)
+
+
+@pytest.mark.parametrize("keep_bytes", [0, _PREAMBLE.size - 1, 200])
+def test_truncated_file_is_rejected(compiled, keep_bytes):
+    os.truncate(compiled, keep_bytes)
+    with pytest.raises(StaleCatalogue):
+        CompiledCatalogue.open(compiled)
+
+
+def test_other_format_version_is_rejected(compiled):
+    _patch(compiled, 8, (FORMAT_VERSION + 1).to_bytes(4, "little"))
+    with pytest.raises(StaleCatalogue, match="format version"):
+        CompiledCatalogue.open(compiled)
+
+
+def test_edited_csv_makes_the_compiled_copy_stale(catalogue_csv, compiled):
+    cards = read_catalogue_csv(catalogue_csv)
+    cards.loc[0, "annual_fee"] = 12345.0
+    cards.to_csv(catalogue_csv, index=False)
+    with pytest.raises(StaleCatalogue, match="older version"):
+        CompiledCatalogue.open(compiled, catalogue_csv)
+    # Without a source to check against, the file itself is still sound.
+    assert len(CompiledCatalogue.open(compiled)) == len(cards)
+
+
+def test_touched_but_unchanged_csv_is_still_current(catalogue_csv, compiled):
+    stat = os.stat(catalogue_csv)
+    os.utime(catalogue_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert len(CompiledCatalogue.open(compiled, catalogue_csv)) == 60
+
+
+def test_store_prefers_the_compiled_copy(catalogue_csv, compiled):
+    snapshot = CatalogueStore(catalogue_csv).get()
+    assert snapshot.compiled is not None and len(snapshot) == 60
+    assert snapshot.eligibility is not None
+
+
+def test_store_falls_back_to_the_csv_when_the_copy_is_stale(catalogue_csv, compiled):
+    read_catalogue_csv(catalogue_csv).head(40).to_csv(catalogue_csv, index=False)
+    snapshot = CatalogueStore(catalogue_csv).get()
+    assert snapshot.compiled is None and len(snapshot) == 40
+
+
+def test_store_falls_back_to_the_csv_when_the_copy_is_corrupt(catalogue_csv, compiled):
+    os.truncate(compiled, os.path.getsize(compiled) - 10)
+    snapshot = CatalogueStore(catalogue_csv).get()
+    assert snapshot.compiled is None and len(snapshot) == 60 and snapshot.load_error is None
+
+
+def test_compiled_copy_serves_without_the_csv(catalogue_csv, compiled):
+    catalogue_csv.unlink()
+    snapshot = CatalogueStore(catalogue_csv).get()
+    assert snapshot.compiled is not None and len(snapshot) == 60
@@ -0,0 +1,74 @@
+# tests/test_eligibility.py
+
+import numpy as np
+import pytest
+
+from actions import eligibility
+from actions.eligibility import EligibilityIndex
+from benchmarks.synthetic import make_catalogue
+
+APPLICANTS = [(0, 0), (579, 14999), (620, 20000), (655, 45000), (700, 60000), (740, 100000),
+              (850, 1e6), (np.nan, 50000), (700, np.nan)]
+
+
+def _frame_ranking(cards, fico, income, p, top_n):
+    """What rank_cards does on the frame when there is no index."""
+    eligible = cards[(fico >= cards["min_credit_score"]) & (income >= cards["min_income"])].copy()
+    eligible["utility"] = p * eligible["rewards_score"] - eligible["annual_fee"] / 100
+    ranked = eligible.sort_values("utility", ascending=False).head(top_n)
+    return ranked.index.to_numpy(), ranked["utility"].to_numpy()
+
+
+def _assert_same_ranking(cards, fico, income, p, top_n):
+    index = EligibilityIndex.build(cards)
+    positions, utility = index.top(fico, income, p, top_n)
+    expected_pos, expected_util = _frame_ranking(cards, fico, income, p, top_n)
+    assert positions.tolist() == expected_pos.tolist()
+    np.testing.assert_array_equal(utility, expected_util)
+
+
+@pytest.mark.parametrize("fico,income", APPLICANTS)
+@pytest.mark.parametrize("top_n", [1, 3, 50])
+def test_top_matches_the_sorted_frame(fico, income, top_n):
+    cards = make_catalogue(400, seed=11)
+    _assert_same_ranking(cards, fico, income, 0.73, top_n)
+
+
+def test_ties_and_missing_values_keep_the_frame_order():
+    cards = make_catalogue(300, seed=12)
+    # Coarse rewards and fees give many equal utilities; some thresholds and
+    # rewards are missing.
+    cards["rewards_score"] = cards["rewards_score"].round(0)
+    cards.loc[cards.index % 7 == 0, "rewards_score"] = np.nan
+    cards.loc[cards.index % 11 == 0, "min_income"] = np.nan
+    cards.loc[cards.index % 13 == 0, "min_credit_score"] = np.nan
+    for fico, income in APPLICANTS:
+        for top_n in (3, 40, 300):
+            _assert_same_ranking(cards, fico, income, 0.5, top_n)
+
+
+@pytest.mark.parametrize("scan_limit", [0, 1000])
+def test_block_walk_and_prefix_scan_agree(monkeypatch, scan_limit):
+    monkeypatch.setattr(eligibility, "BLOCK_SCAN_LIMIT", scan_limit)
+    cards = make_catalogue(200, seed=13)
+    cards["min_credit_score"] = np.random.default_rng(0).integers(550, 800, len(cards))
+    index = EligibilityIndex.build(cards)
+    for fico, income in APPLICANTS:
+        offsets = index.eligible(fico, income)
+        expected = cards.index[(fico >= cards["min_credit_score"]) & (income >= cards["min_income"])]
+        assert sorted(index.positions[offsets].tolist()) == expected.tolist()
+
+
+def test_catalogue_without_numeric_columns_has_no_index():
+    cards = make_catalogue(20, seed=1)
+    assert EligibilityIndex.build(cards.drop(columns="annual_fee")) is None
+    cards["min_income"] = cards["min_income"].astype(object)
+    cards.loc[3, "min_income"] = "call us"
+    assert EligibilityIndex.build(cards) is None
+
+
+def test_empty_catalogue():
+    index = EligibilityIndex.build(make_catalogue(0))
+    assert len(index) == 0
+    positions, utility = index.top(800, 1e6, 0.9, 3)
+    assert positions.size == 0 and utility.size == 0
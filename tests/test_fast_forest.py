@@ -0,0 +1,90 @@
+# tests/test_fast_forest.py
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from actions.fast_forest import CompiledForest, compile_forest
+from benchmarks.synthetic import make_applicants, make_model
+
+
+@pytest.fixture(scope="module")
+def clf():
+    return make_model(12, max_depth=10, n_rows=4000, seed=2)
+
+
+def test_batch_and_single_row_match_sklearn(clf):
+    engine = CompiledForest.from_sklearn(clf)
+    X = np.vstack([make_applicants(300, seed=9), engine.parity_sample(200)])
+    expected = clf.predict_proba(X)[:, 1]
+    assert np.max(np.abs(engine.predict_batch(X) - expected)) <= 1e-9
+    for row, p in zip(X[:50], expected[:50]):
+        assert engine.predict_one(row) == pytest.approx(p, abs=1e-9)
+
+
+def test_split_points_go_left_like_sklearn(clf):
+    engine = CompiledForest.from_sklearn(clf)
+    split = ~engine.is_leaf
+    X = make_applicants(64, seed=1)
+    # Put one feature of every row exactly on a threshold.
+    cols = engine.feature[split][:64]
+    X[np.arange(len(cols)), cols] = engine.threshold[split][:64]
+    assert np.max(np.abs(engine.predict_batch(X) - clf.predict_proba(X)[:, 1])) <= 1e-9
+
+
+def test_saved_copy_is_memory_mapped_and_identical(clf, tmp_path):
+    engine = CompiledForest.from_sklearn(clf)
+    engine.save(tmp_path / "forest", meta={"version": "t"})
+    loaded = CompiledForest.load(tmp_path / "forest")
+    assert isinstance(loaded.threshold, np.memmap)
+    X = make_applicants(100, seed=5)
+    assert np.array_equal(loaded.predict_batch(X), engine.predict_batch(X))
+
+
+def test_compile_forest_falls_back_on_schema_mismatch(clf):
+    assert compile_forest(clf, n_input_cols=clf.n_features_in_ + 1) is None
+
+
+def test_multiclass_models_are_not_compiled():
+    X = make_applicants(300, seed=0)
+    y = np.arange(300) % 3
+    clf = RandomForestClassifier(n_estimators=3, random_state=0).fit(X, y)
+    with pytest.raises(ValueError):
+        CompiledForest.from_sklearn(clf)
+
+
+def _with_missing(X, seed):
+    X = X.copy()
+    rng = np.random.default_rng(seed)
+    X[rng.random(X.shape) < 0.2] = np.nan
+    return X
+
+
+@pytest.mark.parametrize("trained_with_missing", [False, True])
+def test_missing_values_follow_sklearn(trained_with_missing):
+    X = make_applicants(3000, seed=3)
+    y = (X[:, 1] + X[:, 0] / 2000 + np.random.default_rng(3).normal(0, 40, len(X))) > 720
+    if trained_with_missing:
+        X = _with_missing(X, seed=4)
+    clf = RandomForestClassifier(n_estimators=8, max_depth=9, random_state=0).fit(X, y)
+    engine = CompiledForest.from_sklearn(clf)
+    # Even without missing values in training, sklearn sends them somewhere.
+    assert engine.missing_left.any()
+
+    X = _with_missing(make_applicants(400, seed=5), seed=6)
+    expected = clf.predict_proba(X)[:, 1]
+    assert np.max(np.abs(engine.predict_batch(X) - expected)) <= 1e-9
+    for row, p in zip(X[:80], expected[:80]):
+        assert engine.predict_one(row) == pytest.approx(p, abs=1e-9)
+
+
+def test_parity_check_covers_missing_values(clf):
+    engine = CompiledForest.from_sklearn(clf)
+    sample = engine.parity_sample()
+    used = np.unique(engine.feature[~engine.is_leaf])
+    assert np.isnan(sample[:, used]).any(axis=0).all()
+    engine.check_parity(clf, sample)
+    # Sending every missing value right is caught by the check.
+    engine.missing_left = np.zeros_like(engine.missing_left)
+    with pytest.raises(ValueError, match="disagrees"):
+        engine.check_parity(clf, sample)
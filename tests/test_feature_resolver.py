@@ -0,0 +1,34 @@
+# tests/test_feature_resolver.py
+
+from thefuzz import fuzz, process
+
+from actions import feature_resolver as resolver_module
+from actions.feature_resolver import FEATURE_COLUMNS, MATCH_THRESHOLD, FeatureResolver
+from benchmarks.synthetic import FEATURE_PHRASES
+
+
+def _reference(phrase):
+    best = process.extractOne(phrase.lower().strip(), list(FEATURE_COLUMNS), scorer=fuzz.token_sort_ratio)
+    return FEATURE_COLUMNS[best[0]] if best and best[1] >= MATCH_THRESHOLD else None
+
+
+def test_resolve_matches_thefuzz_extract_one():
+    resolver = FeatureResolver(FEATURE_COLUMNS)
+    for phrase in FEATURE_PHRASES + ["", "   ", "APR!!", "annual  FEE"]:
+        expected = _reference(phrase) if phrase.strip() else None
+        assert resolver.resolve(phrase) == expected, phrase
+
+
+def test_resolve_many_matches_resolve():
+    phrases = FEATURE_PHRASES + [None, "", "Fee Annual", "travel insurance"]
+    expected = [FeatureResolver(FEATURE_COLUMNS).resolve(p) for p in phrases]
+    assert FeatureResolver(FEATURE_COLUMNS).resolve_many(phrases) == expected
+
+
+def test_resolve_many_keeps_the_memo_bounded(monkeypatch):
+    monkeypatch.setattr(resolver_module, "MEMO_SIZE", 8)
+    resolver = FeatureResolver(FEATURE_COLUMNS)
+    phrases = [f"rewards rate {i}" for i in range(100)] + list(FEATURE_COLUMNS)
+    results = resolver.resolve_many(phrases)
+    assert len(resolver._memo) <= 8
+    assert results[-len(FEATURE_COLUMNS):] == list(FEATURE_COLUMNS.values())
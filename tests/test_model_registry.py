@@ -0,0 +1,133 @@
+# tests/test_model_registry.py
+
+import json
+import time
+
+import joblib
+import pytest
+
+from actions import model_registry as registry_module
+from actions import predict
+from actions.model_registry import ModelRegistry
+from benchmarks.synthetic import INPUT_COLS, make_model
+
+FEATURES = (72000.0, 705.0, 14.0, 6.0, 0.0, 0.0)
+
+
+def _publish(registry_dir, version, seed, input_cols=INPUT_COLS):
+    directory = registry_dir / version
+    directory.mkdir(parents=True)
+    joblib.dump(make_model(5, max_depth=6, n_rows=2000, seed=seed), directory / "eligibility_clf.pkl")
+    (directory / "schema.json").write_text(json.dumps({"input_cols": input_cols}))
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry_dir = tmp_path / "registry"
+    _publish(registry_dir, "v1", seed=1)
+    _publish(registry_dir, "v2", seed=2)
+    (registry_dir / "LIVE").write_text("v1\n")
+    schema_path = tmp_path / "schema.json"
+    schema_path.write_text(json.dumps({"input_cols": INPUT_COLS}))
+    return ModelRegistry(registry_dir, check_interval=float("inf"), compiled_dir=tmp_path / ".compiled",
+                         schema_path=schema_path)
+
+
+def test_compiled_copies_stay_in_the_registry_compiled_dir(registry, tmp_path):
+    bundle = registry.live()
+    compiled_dir = tmp_path / ".compiled"
+    assert [p.name for p in compiled_dir.iterdir()] == [bundle._compiled_dir().name]
+
+    # Republishing v1 replaces its compiled copy rather than adding one.
+    model_path, _ = registry.bundle_paths("v1")
+    joblib.dump(make_model(5, max_depth=6, n_rows=2000, seed=7), model_path)
+    registry.stage("v1", promote=True, wait=True)
+    assert [p.name for p in compiled_dir.iterdir()] == [registry.live()._compiled_dir().name]
+    assert registry.live()._compiled_dir() != bundle._compiled_dir()
+
+
+def _drain_shadow(registry):
+    # One worker, first in first out: once this runs, earlier scores are recorded.
+    registry._shadow_pool.submit(lambda: None).result(10)
+
+
+def test_serves_the_version_named_by_live(registry):
+    bundle = registry.live()
+    assert bundle.version == "v1" and bundle.engine is not None
+    assert registry.live() is bundle
+
+
+def test_promote_swaps_without_touching_bundles_in_use(registry):
+    in_use = registry.live()
+    p_before = in_use.predict_one(FEATURES)
+    registry.stage("v2", wait=True)
+    assert registry.status()["candidate_state"] == "ready"
+    assert registry.promote()
+    assert registry.live().version == "v2"
+    assert registry.pointed_version() == "v2"
+    assert in_use.version == "v1" and in_use.predict_one(FEATURES) == p_before
+
+
+def test_schema_mismatch_is_rejected(registry):
+    _publish(registry.registry_dir, "v3", seed=3, input_cols=INPUT_COLS[:-1])
+    registry.stage("v3", promote=True, wait=True)
+    status = registry.status()
+    assert status["candidate_state"] == "failed" and "input columns" in status["candidate_error"]
+    assert registry.live().version == "v1"
+
+
+def test_edited_schema_changes_the_expected_columns(registry):
+    registry.stage("v2", wait=True)
+    assert registry.status()["candidate_state"] == "ready"
+
+    registry.schema_path.write_text(json.dumps({"input_cols": INPUT_COLS[:-1]}))
+    assert registry.expected_input_cols() == INPUT_COLS[:-1]
+    registry.stage("v2", wait=True)
+    status = registry.status()
+    assert status["candidate_state"] == "failed" and "input columns" in status["candidate_error"]
+
+
+def test_edited_pointer_is_picked_up_in_the_background(registry):
+    registry.live()
+    registry.live_pointer.write_text("v2\n")
+    registry._next_check = 0.0
+    # The request that notices the change is still served by v1.
+    assert registry.live().version == "v1"
+    deadline = time.monotonic() + 10
+    while registry._live.version != "v2" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert registry.live().version == "v2"
+
+
+def test_shadow_scores_every_request_including_cache_hits(registry, monkeypatch):
+    monkeypatch.setattr(predict, "model_registry", registry)
+    predict.probability_cache.clear()
+    live = registry.live()
+    registry.stage("v2", shadow=True, wait=True)
+
+    p_first = predict.approval_probability(live, FEATURES)
+    p_again = predict.approval_probability(live, FEATURES)
+    predict.approval_probability(live, FEATURES, shadow=False)
+    _drain_shadow(registry)
+
+    stats = registry.status()["shadow"]
+    assert p_first == p_again
+    assert predict.probability_cache.stats()["hits"] >= 2
+    assert stats["version"] == "v2" and stats["count"] == 2
+    expected = registry._candidate.predict_one(FEATURES) - p_first
+    assert stats["p_drift_mean"] == pytest.approx(expected)
+    predict.probability_cache.clear()
+
+
+def test_shadow_counts_dropped_and_failed_requests(registry, monkeypatch):
+    live = registry.live()
+    registry.stage("v2", shadow=True, wait=True)
+    monkeypatch.setattr(registry._candidate, "predict_one", lambda features: 1 / 0)
+    for _ in range(3):
+        registry.shadow_score(live, FEATURES, 0.5)
+    _drain_shadow(registry)
+    monkeypatch.setattr(registry_module, "SHADOW_QUEUE_LIMIT", 0)
+    registry.shadow_score(live, FEATURES, 0.5)
+
+    stats = registry.status()["shadow"]
+    assert (stats["count"], stats["failures"], stats["dropped"]) == (0, 3, 1)
@@ -0,0 +1,58 @@
+# tests/test_numeric_entities.py
+
+import pytest
+
+from benchmarks.numeric_entities import NLU_PATH, SPEC_PATH, entity_key, load_messages, score
+from nlu_components.numeric_entities import DIMENSIONS, NumericEntityParser, to_rasa_entities
+
+MESSAGES, SPEC = load_messages(NLU_PATH, SPEC_PATH)
+
+
+def _entities(text, dimensions=None):
+    return to_rasa_entities(NumericEntityParser(dimensions).parse(text))
+
+
+@pytest.mark.parametrize("text", MESSAGES)
+def test_messages_meet_the_spec(text):
+    assert [entity_key(e) for e in _entities(text)] == SPEC[text]
+
+
+def test_score_reports_every_disagreement():
+    def no_money(text):
+        return [e for e in _entities(text) if e["entity"] != "amount-of-money"]
+
+    result = score(MESSAGES, SPEC, no_money, DIMENSIONS)
+    n_money = sum(e[0] == "amount-of-money" for entities in SPEC.values() for e in entities)
+    assert result["dimensions"]["amount-of-money"]["fn"] == n_money
+    assert result["messages"] - result["exact"] == len(result["disagreements"]) > 0
+
+
+def test_entities_carry_duckling_fields():
+    [entity] = _entities("about 5 years")
+    assert entity["entity"] == "duration" and entity["value"] == 5 and entity["text"] == "5 years"
+    assert entity["additional_info"]["normalized"] == {"value": 5 * 365 * 24 * 3600, "unit": "second"}
+    assert (entity["start"], entity["end"], entity["confidence"]) == (6, 13, 1.0)
+
+
+def test_numbers_inside_longer_matches_are_not_repeated():
+    assert [entity_key(e) for e in _entities("$85k and 12%")] == [
+        ("amount-of-money", "$85k", 85000), ("percentage", "12%", 12)]
+
+
+def test_dimensions_limit_what_is_extracted():
+    assert [e["entity"] for e in _entities("$85k and 12%", ["percentage"])] == ["percentage"]
+    with pytest.raises(ValueError):
+        NumericEntityParser(["time"])
+
+
+def test_component_adds_entities_to_the_message():
+    pytest.importorskip("rasa")
+    from rasa.shared.nlu.constants import ENTITIES, TEXT
+    from rasa.shared.nlu.training_data.message import Message
+
+    from nlu_components.numeric_extractor import NumericEntityExtractor
+
+    extractor = NumericEntityExtractor(NumericEntityExtractor.get_default_config())
+    [message] = extractor.process([Message({TEXT: "my score is 720"})])
+    [entity] = message.get(ENTITIES)
+    assert entity["extractor"] == "NumericEntityExtractor" and entity["value"] == 720
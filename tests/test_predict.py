@@ -0,0 +1,68 @@
+# tests/test_predict.py
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from actions import predict
+from actions.catalogue import get_catalogue
+from actions.model_registry import ModelBundle, model_registry
+from benchmarks.synthetic import INPUT_COLS
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_import_loads_no_artifacts():
+    script = ("import json, sys\n"
+              "from actions import predict\n"
+              "print(json.dumps({'modules': [m for m in ('sklearn', 'joblib') if m in sys.modules],\n"
+              "                  'model': predict.model_registry._live is not None,\n"
+              "                  'catalogue': predict.catalogue_store._snapshot is not None}))\n")
+    env = {k: v for k, v in os.environ.items() if k != "CARD_EAGER_LOAD"}
+    out = subprocess.run([sys.executable, "-c", script], cwd=PROJECT_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert json.loads(out.splitlines()[-1]) == {"modules": [], "model": False, "catalogue": False}
+
+
+@pytest.fixture
+def fresh_bundle(environment, monkeypatch):
+    """A newly loaded copy of the environment's bundle, served from its compiled copy."""
+    bundle = ModelBundle(environment.version, environment.model_path, environment.schema_path,
+                         environment.compiled_dir).load()
+    monkeypatch.setattr(model_registry, "_live", bundle)
+    return bundle
+
+
+def test_old_module_globals_resolve_lazily(fresh_bundle):
+    assert fresh_bundle.engine is not None and not fresh_bundle._clf_loaded
+    assert predict.INPUT_COLS == INPUT_COLS
+    assert predict.engine is fresh_bundle.engine
+    assert not fresh_bundle._clf_loaded
+    assert predict.clf is fresh_bundle.clf is not None
+    assert predict.cards is get_catalogue().cards and len(predict.cards) == 300
+    with pytest.raises(AttributeError):
+        predict.no_such_global
+
+
+def test_warm_up_loads_and_times_everything(fresh_bundle, monkeypatch):
+    monkeypatch.setattr(predict, "LOAD_TIMINGS", {"import": 0.25})
+    timings = predict.warm_up()
+    assert set(timings) == {"import", "first_prediction", "total"}
+    assert 0 <= timings["first_prediction"] <= timings["total"]
+    assert predict.LOAD_TIMINGS == timings
+
+
+def test_startup_report_lines_up_every_label(fresh_bundle, monkeypatch):
+    monkeypatch.setattr(predict, "LOAD_TIMINGS", {"import": 0.25, "a much longer artifact label": 0.002,
+                                                  "total": 1.5})
+    lines = predict.startup_report().splitlines()
+    assert lines[0] == "Action server artifact load times:"
+    labels = [line.rsplit(None, 2)[0].strip() for line in lines[1:]]
+    assert labels[0] == "import" and labels[-1] == "total"
+    assert f"schema ({fresh_bundle.version})" in labels and "a much longer artifact label" in labels
+    assert len({len(line) for line in lines[1:]}) == 1
+    assert lines[1].endswith("250.0 ms") and lines[-1].endswith("1500.0 ms")
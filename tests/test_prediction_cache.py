@@ -0,0 +1,92 @@
+# tests/test_prediction_cache.py
+
+import pytest
+
+from actions import predict, prediction_cache
+from actions.catalogue import get_catalogue
+from actions.prediction_cache import PredictionCache, parse_quantization, quantize_features
+
+INPUT_COLS = ["annual_inc", "fico_high", "dti", "emp_length_num", "inc_missing", "fico_missing"]
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache("t", max_size=2, ttl=60)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 1) == "A"      # "a" is now the most recent
+    cache.put("c", 1, "C")
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == "A" and cache.get("c", 1) == "C"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (3, 1, 1, 2)
+
+
+def test_other_generation_is_a_miss_and_drops_the_entry():
+    cache = PredictionCache("t", max_size=8, ttl=60)
+    cache.put("k", ("model-1", "cat-1"), 0.5)
+    assert cache.get("k", ("model-2", "cat-1")) is None
+    assert cache.get("k", ("model-1", "cat-1")) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = PredictionCache("t", max_size=8, ttl=-1)
+    cache.put("k", 1, 0.5)
+    assert cache.get("k", 1, default="gone") == "gone"
+    assert cache.stats()["expirations"] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache("t", max_size=0)
+    cache.put("k", 1, 0.5)
+    assert cache.get("k", 1) is None and cache.stats()["size"] == 0
+
+
+def test_quantization_spec_and_rounding():
+    steps = parse_quantization("annual_inc=1000, fico_high=10,bad,dti=-1")
+    assert steps == {"annual_inc": 1000.0, "fico_high": 10.0}
+    user = dict(annual_inc=59600, fico_high=666, dti=17.3, emp_length_num=4, inc_missing=0, fico_missing=0)
+    assert quantize_features(user, INPUT_COLS, steps) == (60000.0, 670.0, 17.3, 4.0, 0.0, 0.0)
+
+
+@pytest.fixture
+def quantized(monkeypatch, environment):
+    monkeypatch.setattr(prediction_cache, "DEFAULT_QUANTIZATION", {"annual_inc": 1000.0, "fico_high": 10.0})
+    return environment
+
+
+def _user(income, fico):
+    return dict(annual_inc=income, fico_high=fico, dti=12.0, emp_length_num=5.0, inc_missing=0.0, fico_missing=0.0)
+
+
+def _assert_eligible(ranked, income, fico):
+    assert not ranked.empty
+    assert (ranked["min_credit_score"] <= fico).all()
+    assert (ranked["min_income"] <= income).all()
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_quantization_never_changes_eligibility(quantized, monkeypatch, use_index):
+    catalogue = get_catalogue()
+    if not use_index:
+        monkeypatch.setattr(catalogue, "eligibility", None)
+    # Rounds up to 60,000 / 670, the thresholds of some cards it does not meet.
+    ranked = predict.rank_cards(_user(59600, 666), top_n=50)
+    _assert_eligible(ranked, 59600, 666)
+
+
+def test_rankings_are_not_shared_across_raw_thresholds(quantized):
+    qualifying = predict.rank_cards(_user(60000, 670), top_n=50)
+    assert ((qualifying["min_credit_score"] == 670) | (qualifying["min_income"] == 60000)).any()
+    # Same quantized vector, so the probability is shared, but not the ranking.
+    ranked = predict.rank_cards(_user(59600, 666), top_n=50)
+    _assert_eligible(ranked, 59600, 666)
+    assert predict.probability_cache.stats()["hits"] >= 1
+
+
+def test_repeat_request_is_served_from_the_ranking_cache(environment):
+    first = predict.rank_cards(_user(82000, 720), top_n=3)
+    hits = predict.ranking_cache.stats()["hits"]
+    again = predict.rank_cards(_user(82000, 720), top_n=3)
+    assert predict.ranking_cache.stats()["hits"] == hits + 1
+    assert again.equals(first) and again is not first
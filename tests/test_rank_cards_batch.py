@@ -0,0 +1,73 @@
+# tests/test_rank_cards_batch.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from actions import predict, prediction_cache
+from benchmarks.synthetic import INPUT_COLS, make_applicants
+
+
+def _assert_matches_rank_cards(ranking, X, top_n):
+    for i, row in enumerate(X):
+        expected = predict.rank_cards(dict(zip(INPUT_COLS, row)), top_n=top_n)
+        n = len(expected)
+        assert ranking.card_index[i, :n].tolist() == expected.index.tolist(), f"applicant {i}"
+        assert (ranking.card_index[i, n:] == -1).all()
+        assert np.isnan(ranking.utility[i, n:]).all()
+        if n:
+            np.testing.assert_allclose(ranking.utility[i, :n], expected["utility"].to_numpy(), rtol=0, atol=1e-12)
+            assert ranking.p_approve[i] == pytest.approx(expected["p_approve"].iloc[0], abs=1e-12)
+
+
+@pytest.mark.parametrize("top_n", [1, 3, 10])
+def test_rows_match_rank_cards(environment, top_n):
+    X = make_applicants(60, seed=4)
+    _assert_matches_rank_cards(predict.rank_cards_batch(X, top_n=top_n), X, top_n)
+
+
+@pytest.mark.parametrize("top_n", [3, 10, 300])
+def test_tied_utilities_follow_rank_cards(tied_catalogue, top_n):
+    X = make_applicants(80, seed=5)
+    _assert_matches_rank_cards(predict.rank_cards_batch(X, top_n=top_n), X, top_n)
+
+
+def test_frame_and_dict_input(environment):
+    X = make_applicants(20, seed=6)
+    frame = pd.DataFrame(X, columns=INPUT_COLS)
+    by_array = predict.rank_cards_batch(X)
+    by_frame = predict.rank_cards_batch(frame[INPUT_COLS[::-1]].assign(extra=1))
+    by_dicts = predict.rank_cards_batch(frame.to_dict("records"))
+    one = predict.rank_cards_batch(frame.iloc[3].to_dict())
+    for ranking in (by_frame, by_dicts):
+        assert np.array_equal(ranking.card_index, by_array.card_index)
+        np.testing.assert_array_equal(ranking.utility, by_array.utility)
+    assert one.card_index.tolist() == by_array.card_index[3:4].tolist()
+    with pytest.raises(ValueError):
+        predict.rank_cards_batch(frame.drop(columns="dti"))
+
+
+def test_short_lists_are_padded(environment):
+    X = make_applicants(30, seed=7)
+    X[:, 0], X[:, 1] = 16000, 600     # qualifies for few cards
+    X[0, 0], X[0, 1] = -1, -1         # qualifies for none
+    ranking = predict.rank_cards_batch(X, top_n=50)
+    assert (ranking.card_index[0] == -1).all() and np.isnan(ranking.utility[0]).all()
+    assert (ranking.card_index[1:] == -1).any(axis=1).all()
+    _assert_matches_rank_cards(ranking, X, 50)
+
+
+def test_chunks_give_the_same_ranking(tied_catalogue, monkeypatch):
+    X = make_applicants(50, seed=8)
+    whole = predict.rank_cards_batch(X, top_n=5)
+    monkeypatch.setattr(predict, "BATCH_CELL_LIMIT", 7 * 300)
+    chunked = predict.rank_cards_batch(X, top_n=5)
+    assert np.array_equal(chunked.card_index, whole.card_index)
+    np.testing.assert_array_equal(chunked.utility, whole.utility)
+
+
+def test_quantized_probability_and_raw_eligibility(environment, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "DEFAULT_QUANTIZATION", {"annual_inc": 1000.0, "fico_high": 10.0})
+    X = make_applicants(40, seed=9)
+    X[:5, 0], X[:5, 1] = 59600, 666
+    _assert_matches_rank_cards(predict.rank_cards_batch(X, top_n=10), X, 10)
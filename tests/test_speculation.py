@@ -0,0 +1,121 @@
+# tests/test_speculation.py
+
+import asyncio
+
+import numpy as np
+import pytest
+import yaml
+from rasa_sdk.executor import ActionExecutor
+
+from actions import predict, prediction_cache, speculation
+from actions.action_pool import action_pool
+from actions.actions import ActionRecommendCard, ValidateCardRequestForm
+from benchmarks.replay_load import DOMAIN_FILE, Conversation, FeatureMatcher, Phrasings, load_stories
+
+SLOTS = {"annual_inc": 82000.0, "fico_high": 720.0, "dti": 14.0, "emp_length_num": 6.0}
+
+
+@pytest.fixture
+def clean(environment):
+    speculation.speculations.clear()
+    return environment
+
+
+def _user(slots):
+    return speculation.model_features(dict(slots))
+
+
+def _fresh_ranking(slots):
+    predict.ranking_cache.clear()
+    return predict.rank_cards(_user(slots), top_n=speculation.TOP_N)
+
+
+def _ranked_through_speculation(sender_id, slots):
+    """Fill the form slot by slot, then rank as action_recommend_card does."""
+    predict.ranking_cache.clear()
+    partial = {}
+    for name in speculation.FORM_SLOTS:
+        partial[name] = slots[name]
+        speculation.advance(sender_id, partial)
+    hits = predict.ranking_cache.stats()["hits"]
+    ranked = predict.rank_cards(_user(slots), top_n=speculation.TOP_N)
+    return ranked, predict.ranking_cache.stats()["hits"] - hits
+
+
+def test_pruning_then_ranking_serves_the_final_call(clean):
+    before = speculation.stats()
+    speculation.advance("s1", {"annual_inc": 82000.0, "fico_high": 720.0})
+    state = speculation.speculations.get("s1", predict.get_catalogue().version)
+    assert state.candidates is not None and state.candidates.dtype == np.int32
+    assert state.model_token is None
+
+    ranked, hits = _ranked_through_speculation("s1", SLOTS)
+    assert hits == 1
+    assert ranked.equals(_fresh_ranking(SLOTS))
+    after = speculation.stats()
+    assert after["pruned"] == before["pruned"] + 2 and after["ranked"] == before["ranked"] + 1
+
+
+def test_correction_drops_the_old_candidates(clean):
+    speculation.advance("s2", {"annual_inc": 82000.0, "fico_high": 790.0})
+    dropped = speculation.stats()["dropped"]
+    corrected = dict(SLOTS, fico_high=610.0)
+    ranked, hits = _ranked_through_speculation("s2", corrected)
+    assert speculation.stats()["dropped"] == dropped + 1
+    assert hits == 1 and ranked.equals(_fresh_ranking(corrected))
+    assert (ranked["min_credit_score"] <= 610).all()
+
+
+def test_eligibility_uses_the_raw_slot_values(clean, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "DEFAULT_QUANTIZATION", {"annual_inc": 1000.0, "fico_high": 10.0})
+    # Rounds up to 60,000 / 670, the thresholds of some cards it does not meet.
+    slots = dict(SLOTS, annual_inc=59600.0, fico_high=666.0)
+    ranked, hits = _ranked_through_speculation("s3", slots)
+    catalogue = predict.get_catalogue()
+    state = speculation.speculations.get("s3", catalogue.version)
+    assert state.candidates.tolist() == catalogue.eligibility.eligible(666.0, 59600.0).tolist()
+    assert hits == 1 and not ranked.empty
+    assert (ranked["min_credit_score"] <= 666).all() and (ranked["min_income"] <= 59600).all()
+    assert ranked.equals(_fresh_ranking(slots))
+
+
+def test_no_eligible_cards_is_cached_too(clean):
+    # The catalogue has cards with no minimums, so only a negative answer qualifies for none.
+    slots = dict(SLOTS, annual_inc=-1.0, fico_high=-1.0)
+    ranked, hits = _ranked_through_speculation("s4", slots)
+    assert hits == 1 and ranked.empty
+
+
+def test_off_with_the_process_pool(clean, monkeypatch):
+    monkeypatch.setattr(action_pool, "kind", "process")
+    assert not speculation.enabled()
+    speculation.schedule("s5", SLOTS)
+    assert speculation.speculations.stats()["size"] == 0
+
+
+def test_replayed_form_sends_each_answer_for_validation(clean):
+    domain = yaml.safe_load(DOMAIN_FILE.read_text(encoding="utf-8"))
+    story = next(s for s in load_stories() if any(step.get("action") == "card_request_form" for step in s["steps"]))
+    conversation = Conversation(story, "replay-1", domain, {"validate_card_request_form", "action_recommend_card"},
+                                Phrasings.load(), FeatureMatcher.load(), np.random.default_rng(0))
+    executor = ActionExecutor()
+    executor.register_action(ValidateCardRequestForm())
+    executor.register_action(ActionRecommendCard())
+    ranked = speculation.stats()["ranked"]
+
+    async def replay():
+        actions = []
+        for action, payload in conversation.turns():
+            actions.append(action)
+            hits = predict.ranking_cache.stats()["hits"]
+            result = await executor.run(payload)
+            conversation.apply(result.model_dump())
+            await asyncio.gather(*list(speculation._tasks))
+            if action == "action_recommend_card":
+                assert predict.ranking_cache.stats()["hits"] == hits + 1
+        return actions
+
+    actions = asyncio.run(replay())
+    assert actions == ["validate_card_request_form"] * 4 + ["action_recommend_card"]
+    assert speculation.stats()["ranked"] == ranked + 1
+    assert conversation.slots["recommended_cards_list"]
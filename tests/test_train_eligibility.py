@@ -0,0 +1,70 @@
+# tests/test_train_eligibility.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from training.train_eligibility import FEATURES, Reservoir, build_training_set, read_australian
+
+
+def _australian(path, classes):
+    n = len(classes)
+    rows = {f"A{i}": np.arange(n, dtype=float) + i for i in range(1, 15)}
+    rows["Class"] = classes
+    pd.DataFrame(rows).to_csv(path, header=False, index=False)
+
+
+def _chunk(start, n, int_dti=False):
+    return pd.DataFrame({
+        "annual_inc": np.arange(start, start + n, dtype="float32"),
+        "fico_high": np.full(n, 700, dtype="float32"),
+        "dti": np.arange(n) if int_dti else np.arange(n, dtype="float32") / 2,
+        "inc_missing": np.zeros(n, dtype="int8"),
+    })
+
+
+def test_reservoir_keeps_column_dtypes_across_mixed_chunks():
+    reservoir = Reservoir(50, seed=1)
+    reservoir.update(_chunk(0, 40))
+    reservoir.update(_chunk(40, 200, int_dti=True))
+    reservoir.update(_chunk(240, 300))
+    rows = reservoir.rows
+    assert len(rows) == 50 and reservoir.seen == 540
+    assert rows["annual_inc"].dtype == np.float32 and rows["inc_missing"].dtype == np.int8
+    assert rows["annual_inc"].is_unique and rows["annual_inc"].between(0, 539).all()
+
+
+def test_reservoir_samples_uniformly():
+    counts = np.zeros(400)
+    for seed in range(300):
+        reservoir = Reservoir(40, seed=seed)
+        for start in range(0, 400, 70):
+            reservoir.update(_chunk(start, min(70, 400 - start)))
+        counts[reservoir.rows["annual_inc"].to_numpy(dtype=int)] += 1
+    # Each row is kept with probability 40/400; compare early and late rows.
+    expected = 300 * 40 / 400
+    assert abs(counts[:200].mean() - expected) < 3 and abs(counts[200:].mean() - expected) < 3
+
+
+def test_australian_labels_follow_the_notebook(tmp_path):
+    path = tmp_path / "australian.csv"
+    _australian(path, ["+", "-", "+", "1", "0"])
+    frame, labels = read_australian(path)
+    assert len(frame) == 5
+    assert labels[:3].tolist() == [1.0, 0.0, 1.0] and np.isnan(labels[3:]).all()
+
+
+def test_unlabelled_australian_rows_only_feed_the_medians(tmp_path):
+    data_dir = tmp_path / "ml_data"
+    data_dir.mkdir()
+    pd.DataFrame({"annual_inc": [50000.0, np.nan, 70000.0], "fico_range_high": [700, 720, np.nan],
+                  "dti": ["10%", "20%", "30%"], "emp_length": ["2 years", "10+ years", None]}
+                 ).to_csv(data_dir / "accepted_2007_to_2018Q4.csv", index=False)
+    _australian(data_dir / "australian.csv", [1, 0, 1, 0])
+
+    data = build_training_set(data_dir, negatives=10, use_cache=False)
+    assert len(data) == 3 and (data["approved"] == 1).all()
+    # Australian incomes are A14 = 14..17: the median of all seven known values.
+    expected_median = float(np.median([50000.0, 70000.0, 14, 15, 16, 17]))
+    assert data.loc[data["inc_missing"] == 1, "annual_inc"].iloc[0] == pytest.approx(expected_median)
+    assert list(data.columns[:len(FEATURES)]) == FEATURES
@@ -0,0 +1,333 @@
+# training/train_eligibility.py
+"""
+Reproducible, out-of-core version of notebooks/creditcard.ipynb.
+
+    python -m training.train_eligibility --data-dir ml_data
+
+The raw LendingClub files are streamed in chunks, reading only the columns
+that feed the model, with float32 numerics. Every accepted application is
+kept as a positive, and so is every "+" row of the Australian set.
+Negatives (rejected plus the Australian "-" rows) are reservoir-sampled in
+the same pass, so nothing close to the full files is ever in memory. The
+cleaned training set is cached as Parquet keyed on the input files, so
+re-training with different model settings skips the CSVs.
+
+The output is eligibility_clf.pkl plus schema.json with the feature contract
+actions/predict.py expects, written to ml_models/ or, with
+--registry-version, to a new ml_models/registry/<version>/ bundle.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import cross_val_score, train_test_split
+
+logger = logging.getLogger(__name__)
+
+TRAINING_DIR = Path(__file__).parent
+PROJECT_DIR = TRAINING_DIR.parent
+DATA_DIR = PROJECT_DIR / "ml_data"
+MODELDIR = PROJECT_DIR / "ml_models"
+
+ACCEPTED_FILE = "accepted_2007_to_2018Q4.csv"
+REJECTED_FILE = "rejected_2007_to_2018Q4 2.csv"
+AUSTRALIAN_FILE = "australian.csv"
+
+# The model's input contract; must match ml_models/schema.json.
+FEATURES = ["annual_inc", "fico_high", "dti", "emp_length_num", "inc_missing", "fico_missing"]
+
+# Raw column names accepted for each cleaned field. The accepted file uses
+# the LendingClub loan names; the published rejected file uses the second set.
+# A field with no matching column is read as missing, which is exactly what
+# the inc_missing / fico_missing indicators are for.
+COLUMN_ALIASES = {
+    "annual_inc": ["annual_inc"],
+    "fico_high": ["fico_range_high", "fico_high", "Risk_Score"],
+    "dti": ["dti", "Debt-To-Income Ratio"],
+    "emp_length": ["emp_length", "Employment Length"],
+}
+NUMERIC_FIELDS = ["annual_inc", "fico_high"]
+
+AUSTRALIAN_COLS = [f"A{i}" for i in range(1, 15)] + ["Class"]
+
+DEFAULT_NEGATIVES = 100_000
+DEFAULT_SEED = 42
+DEFAULT_CHUNK_SIZE = 500_000
+CACHE_VERSION = 2
+
+
+def clean(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Raw fields (annual_inc, fico_high, dti, emp_length) -> model columns,
+    with the notebook's parsing rules. Income/score imputation happens later,
+    once the medians over all rows are known.
+    """
+    out = pd.DataFrame(index=frame.index)
+    out["annual_inc"] = pd.to_numeric(frame["annual_inc"], errors="coerce").astype("float32")
+    out["fico_high"] = pd.to_numeric(frame["fico_high"], errors="coerce").astype("float32")
+    out["dti"] = pd.to_numeric(
+        frame["dti"].astype(str).str.rstrip("%").replace("", np.nan), errors="coerce"
+    ).astype("float32")
+    out["emp_length_num"] = (
+        frame["emp_length"].astype(str)
+                           .str.extract(r"(\d+)")
+                           .iloc[:, 0]
+                           .astype("float32")
+                           .fillna(0)
+    )
+    out["inc_missing"] = out["annual_inc"].isna().astype("int8")
+    out["fico_missing"] = out["fico_high"].isna().astype("int8")
+    return out
+
+
+def read_lending_club(path: Path, chunk_size: int) -> Iterable[pd.DataFrame]:
+    """Stream a LendingClub CSV as cleaned chunks, reading only the aliased columns."""
+    header = pd.read_csv(path, nrows=0).columns
+    rename = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        found = next((name for name in aliases if name in header), None)
+        if found is not None:
+            rename[found] = field
+    missing = [field for field in COLUMN_ALIASES if field not in rename.values()]
+    if missing:
+        logger.warning(f"{path.name}: no column for {missing}; treating them as missing.")
+
+    dtypes = {raw: "float32" for raw, field in rename.items() if field in NUMERIC_FIELDS}
+    for chunk in pd.read_csv(path, usecols=list(rename), dtype=dtypes, chunksize=chunk_size, low_memory=False):
+        chunk = chunk.rename(columns=rename)
+        for field in missing:
+            chunk[field] = np.nan
+        yield clean(chunk)
+
+
+def read_australian(path: Path) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Every row of the Australian set, cleaned, with its label: 1.0 for "+",
+    0.0 for "-", NaN for anything else. The notebook maps only "+"/"-", so
+    with the 0/1-coded copy of the file none of its rows are trained on;
+    unlabelled rows still count towards the income and score medians, as
+    they do in the notebook.
+    """
+    raw = pd.read_csv(path, header=None, names=AUSTRALIAN_COLS)
+    frame = pd.DataFrame({
+        "annual_inc": raw["A14"],
+        "fico_high": raw["A2"] * 12 + 300,
+        "dti": raw["A9"],
+        "emp_length": raw["A8"],
+    })
+    labels = raw["Class"].map({"+": 1.0, "-": 0.0})
+    return clean(frame), labels.to_numpy(dtype=float)
+
+
+class StreamingMedian:
+    """Exact median over a stream, from merged value counts (values here repeat heavily)."""
+
+    def __init__(self):
+        self.counts = pd.Series(dtype="int64")
+
+    def update(self, values: pd.Series) -> None:
+        counts = values.dropna().value_counts()
+        self.counts = self.counts.add(counts, fill_value=0)
+
+    def median(self) -> float:
+        counts = self.counts.sort_index()
+        total = counts.sum()
+        if total == 0:
+            return float("nan")
+        cumulative = counts.cumsum().to_numpy()
+        values = counts.index.to_numpy(dtype=float)
+        lo = values[np.searchsorted(cumulative, (total + 1) // 2)]
+        hi = values[np.searchsorted(cumulative, total // 2 + 1)]
+        return float((lo + hi) / 2)
+
+
+class Reservoir:
+    """Uniform sample of fixed size from a stream of frames (Algorithm R, vectorised per chunk)."""
+
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.seen = 0
+        self.rows: Optional[pd.DataFrame] = None
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        chunk = chunk.reset_index(drop=True)
+        if self.rows is None:
+            self.rows = chunk.iloc[:0].copy()
+        fill = min(max(self.size - len(self.rows), 0), len(chunk))
+        if fill:
+            self.rows = pd.concat([self.rows, chunk.iloc[:fill]], ignore_index=True)
+        rest = chunk.iloc[fill:]
+        if len(rest):
+            positions = self.seen + fill + np.arange(len(rest))
+            slots = (self.rng.random(len(rest)) * (positions + 1)).astype(np.int64)
+            take = np.flatnonzero(slots < self.size)
+            if take.size:
+                # When two rows land in the same slot the later one wins, as
+                # in the sequential algorithm.
+                order = take[::-1]
+                _, first = np.unique(slots[order], return_index=True)
+                chosen = order[first]
+                # Column by column: a row-wise to_numpy() would mix the
+                # float and int columns into one object array.
+                for name in self.rows.columns:
+                    values = self.rows[name].to_numpy(copy=True)
+                    values[slots[chosen]] = rest[name].to_numpy()[chosen]
+                    self.rows[name] = values
+        self.seen += len(chunk)
+
+
+def _file_key(paths: List[Path], settings: Dict[str, object]) -> str:
+    digest = hashlib.sha1(json.dumps(settings, sort_keys=True).encode())
+    for path in paths:
+        st = os.stat(path)
+        digest.update(f"{path.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def build_training_set(data_dir: Path, negatives: int = DEFAULT_NEGATIVES, seed: int = DEFAULT_SEED,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, use_cache: bool = True) -> pd.DataFrame:
+    """Cleaned, imputed and shuffled positives + sampled negatives, with an `approved` column."""
+    accepted = data_dir / ACCEPTED_FILE
+    rejected = data_dir / REJECTED_FILE
+    australian = data_dir / AUSTRALIAN_FILE
+    sources = [p for p in (accepted, rejected, australian) if p.exists()]
+    if accepted not in sources:
+        raise FileNotFoundError(f"Accepted applications not found at {accepted}")
+
+    cache_dir = data_dir / ".cache"
+    key = _file_key(sources, {"negatives": negatives, "seed": seed, "version": CACHE_VERSION})
+    cache_path = cache_dir / f"eligibility_features-{key}.parquet"
+    if use_cache and cache_path.exists():
+        logger.info(f"Using cached training set {cache_path}")
+        return pd.read_parquet(cache_path)
+
+    start = time.perf_counter()
+    medians = {field: StreamingMedian() for field in NUMERIC_FIELDS}
+    reservoir = Reservoir(negatives, seed)
+    positives = []
+
+    for chunk in read_lending_club(accepted, chunk_size):
+        for field in NUMERIC_FIELDS:
+            medians[field].update(chunk[field])
+        positives.append(chunk)
+    logger.info(f"Read {sum(len(c) for c in positives)} accepted rows in {time.perf_counter() - start:.1f}s")
+
+    if australian in sources:
+        aus, labels = read_australian(australian)
+        for field in NUMERIC_FIELDS:
+            medians[field].update(aus[field])
+        if np.isnan(labels).all():
+            logger.warning(f"{australian.name}: no '+'/'-' class labels; like the notebook, none of its rows are used.")
+        positives.append(aus[labels == 1])
+        reservoir.update(aus[labels == 0])
+
+    if rejected in sources:
+        for chunk in read_lending_club(rejected, chunk_size):
+            for field in NUMERIC_FIELDS:
+                medians[field].update(chunk[field])
+            reservoir.update(chunk)
+        logger.info(f"Sampled {len(reservoir.rows)} of {reservoir.seen} negatives in {time.perf_counter() - start:.1f}s")
+
+    pos = pd.concat(positives, ignore_index=True).assign(approved=np.int8(1))
+    neg = reservoir.rows.assign(approved=np.int8(0))
+    data = pd.concat([pos, neg], ignore_index=True).sample(frac=1, random_state=seed).reset_index(drop=True)
+    for field in NUMERIC_FIELDS:
+        data[field] = data[field].fillna(medians[field].median()).astype("float32")
+
+    if use_cache:
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            data.to_parquet(cache_path, index=False)
+            logger.info(f"Cached training set to {cache_path}")
+        except (ImportError, OSError) as e:
+            logger.warning(f"Could not cache training set to {cache_path}: {e}")
+    return data
+
+
+def train(data: pd.DataFrame, seed: int = DEFAULT_SEED, cv_folds: int = 5,
+          n_jobs: int = -1) -> Tuple[RandomForestClassifier, Dict[str, object]]:
+    X = data[FEATURES]
+    y = data["approved"].astype(int)
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, stratify=y, test_size=0.2, random_state=seed
+    )
+
+    clf = RandomForestClassifier(n_estimators=50, n_jobs=n_jobs, random_state=seed)
+    clf.fit(X_train, y_train)
+    auc = roc_auc_score(y_test, clf.predict_proba(X_test)[:, 1])
+
+    metrics: Dict[str, object] = {"holdout_auc": float(auc), "rows": int(len(data)),
+                                  "positives": int(y.sum()), "negatives": int(len(y) - y.sum())}
+    if cv_folds > 1:
+        # Folds run side by side, each fitting single-threaded; the forest's
+        # random_state makes the scores identical to fitting them in turn.
+        fold_clf = clone(clf).set_params(n_jobs=1)
+        cv_scores = cross_val_score(fold_clf, X, y, cv=cv_folds, scoring="roc_auc", n_jobs=n_jobs)
+        metrics["cv_auc"] = [float(s) for s in cv_scores]
+        metrics["cv_auc_mean"] = float(np.mean(cv_scores))
+    metrics["feature_importances"] = dict(zip(FEATURES, map(float, clf.feature_importances_)))
+    return clf, metrics
+
+
+def save(clf: RandomForestClassifier, output_dir: Path) -> None:
+    """Write the model and schema side by side, each replaced atomically."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model_tmp = output_dir / ".eligibility_clf.pkl.tmp"
+    schema_tmp = output_dir / ".schema.json.tmp"
+    joblib.dump(clf, model_tmp)
+    with open(schema_tmp, "w") as f:
+        json.dump({"input_cols": FEATURES}, f)
+    os.replace(schema_tmp, output_dir / "schema.json")
+    os.replace(model_tmp, output_dir / "eligibility_clf.pkl")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Train the card eligibility classifier.")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--output-dir", type=Path, default=MODELDIR)
+    parser.add_argument("--registry-version", default=None,
+                        help="write to ml_models/registry/<version>/ instead of replacing ml_models/")
+    parser.add_argument("--negatives", type=int, default=DEFAULT_NEGATIVES)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--cv-folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--no-cache", action="store_true", help="ignore and don't write the Parquet cache")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    data = build_training_set(args.data_dir, negatives=args.negatives, seed=args.seed,
+                              chunk_size=args.chunk_size, use_cache=not args.no_cache)
+    clf, metrics = train(data, seed=args.seed, cv_folds=args.cv_folds, n_jobs=args.jobs)
+
+    output_dir = args.output_dir
+    if args.registry_version:
+        output_dir = MODELDIR / "registry" / args.registry_version
+    save(clf, output_dir)
+
+    print(f"Hold-out AUC: {metrics['holdout_auc']:.3f}")
+    if "cv_auc" in metrics:
+        print(f"{args.cv_folds}-fold CV AUC: {np.round(metrics['cv_auc'], 3)} mean: {metrics['cv_auc_mean']:.3f}")
+    print("Feature importances:")
+    print(pd.Series(metrics["feature_importances"]).sort_values(ascending=False).to_string())
+    print(f"Wrote model and schema to {output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())